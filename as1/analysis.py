@@ -2,38 +2,156 @@
 """
 analysis_full.py — full analysis for OWD assignment.
 
-Each log CSV has a header like:
+Each log is either a columnar .owd file (see capture.py) or a CSV with a header like:
   seq,time_sent,time_received,delay(offset=XYZ),payload_bytes
+when both exist for a run the .owd one is used
 
 Filename encodes config:
-  client_<iface>_p<payload>_i<interval>_c<count>.csv
+  client_<iface>_p<payload>_i<interval>_c<count>.owd / .csv
 
 Outputs:
-  - logs/summary_full.csv with mean/std/p95/jitter/loss
+  - logs/summary_full.csv with mean/std/p95/jitter/loss/reordering/duplicates/pacing error,
+    and the packet train capacity estimate of udp burst runs
   - logs/plots/*: individual plots per log + combined wifi vs eth
+  - logs/summary_groups.csv with OWD percentiles per (iface, payload, interval) over every run,
+    merged from per-log sketches (see sketch.py)
+  - logs/summary_cache.json: cached per-log rows and sketches, only new or changed logs are parsed again
 """
 
-import argparse, re
+import argparse, json, re
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from capture import read_columnar, delay_header
+from sketch import OwdSketch
 
 FNAME_RE = re.compile(
     r"""client_
         (?P<iface>[A-Za-z0-9_-]+)
         _p(?P<payload>\d+)
-        _i(?P<interval>\d+)
+        _i(?P<interval>\d+(?:\.\d+)?)
         _c(?P<count>\d+)
-        .*\.csv$""",
+        .*\.(csv|owd)$""",
     re.VERBOSE,
 )
 
+# per-log summary rows, keyed on file name and invalidated by size/mtime changes
+CACHE_NAME = "summary_cache.json"
+CACHE_VERSION = 2
+
 def parse_args():
     ap = argparse.ArgumentParser()
     ap.add_argument("--logs-dir", default="./logs")
     ap.add_argument("--plots", action="store_true")
+    ap.add_argument("--rebuild", action="store_true", help="ignore the summary cache and re-parse every log")
     return ap.parse_args()
 
+def discover_logs(logs_dir: Path):
+    """client logs by stem, the columnar .owd wins over a .csv export of the same run"""
+    logs = {}
+    for path in sorted(logs_dir.glob("client_*.csv")) + sorted(logs_dir.glob("client_*.owd")):
+        logs[path.stem] = path
+    return [logs[k] for k in sorted(logs)]
+
+def load_log(path: Path):
+    """(DataFrame, meta), same columns for both formats, the .owd columns are mapped straight into numpy"""
+    if path.suffix == ".owd":
+        cols, meta = read_columnar(path)
+        return pd.DataFrame({
+            (delay_header(meta) if name == "delay" else name): np.frombuffer(col, dtype=np.int64)
+            for name, col in cols.items()
+        }), meta
+    return pd.read_csv(path), {}
+
+def analyze_log(path: Path, meta: dict):
+    """summary row, OWD series (ms) and OWD sketch (ns) of one log"""
+    payload = int(meta["payload"])
+    interval= float(meta["interval"])
+    expected= int(meta["count"])
+
+    df, log_meta = load_log(path)
+    delay_col = [c for c in df.columns if c.startswith("delay(")][0]
+
+    # rows are in arrival order, udp runs can contain duplicates and reordering
+    first = df.drop_duplicates("seq", keep="first")
+    duplicates = len(df) - len(first)
+    reordered = int((first["seq"] < first["seq"].cummax().shift(fill_value=-1)).sum())
+    owd_ms = pd.to_numeric(first[delay_col]) / 1e6
+
+    # packet loss (seq should go 0..expected-1)
+    received = len(first)
+    loss_pct = 100 * (1 - received/expected)
+
+    row = {
+        "file": path.name,
+        "iface": meta["iface"],
+        "payload_B": payload,
+        "interval_ms": interval,
+        "count_expected": expected,
+        "count_received": received,
+        "loss_pct": loss_pct,
+        "count_reordered": reordered,
+        "count_duplicates": duplicates,
+        "owd_ms_mean": float(owd_ms.mean()),
+        "owd_ms_std": float(owd_ms.std(ddof=1)),
+        "owd_ms_p50": float(owd_ms.median()),
+        "owd_ms_p95": float(owd_ms.quantile(0.95)),
+        "owd_ms_min": float(owd_ms.min()),
+        "owd_ms_max": float(owd_ms.max()),
+    }
+    # older logs have no pacing column
+    if "pacing_error" in first.columns:
+        pace_us = pd.to_numeric(first["pacing_error"]) / 1e3
+        row["pacing_err_us_p50"] = float(pace_us.median())
+        row["pacing_err_us_p99"] = float(pace_us.quantile(0.99))
+
+    # udp burst runs carry a packet train capacity estimate (see capacity.py)
+    if "capacity_mbps" in log_meta:
+        row["capacity_mbps"] = log_meta["capacity_mbps"]
+        row["capacity_trains"] = log_meta["capacity_trains"]
+
+    # the client stores its sketch in the .owd meta, csv logs get one built here
+    if "owd_sketch" in log_meta:
+        sketch = OwdSketch.from_dict(log_meta["owd_sketch"])
+    else:
+        sketch = OwdSketch()
+        for v in pd.to_numeric(first[delay_col]):
+            sketch.add(v)
+    return row, owd_ms, sketch
+
+def load_cache(path: Path) -> dict:
+    """file name -> {size, mtime_ns, row, sketch}, empty if missing, unreadable or from another version"""
+    try:
+        cache = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return cache["files"] if cache.get("version") == CACHE_VERSION else {}
+
+def save_cache(path: Path, files: dict):
+    # written to a temp file first so an interrupted run never leaves a broken cache
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": CACHE_VERSION, "files": files}))
+    tmp.replace(path)
+
+def merge_sketch(sketches: dict, row: dict, sketch: OwdSketch):
+    key = (row["iface"], row["payload_B"], row["interval_ms"])
+    if key in sketches:
+        merged, runs = sketches[key]
+        sketches[key] = (merged.merge(sketch), runs + 1)
+    else:
+        sketches[key] = (sketch, 1)
+
+def plot_owd(plots_dir: Path, path: Path, owd_ms):
+    plt.figure()
+    plt.plot(range(len(owd_ms)), owd_ms.values)
+    plt.xlabel("packet seq")
+    plt.ylabel("OWD (ms)")
+    plt.title(path.name)
+    plt.tight_layout()
+    plt.savefig(plots_dir / f"{path.stem}_owd.png")
+    plt.close()
+
 def main():
     args = parse_args()
     logs_dir = Path(args.logs_dir)
@@ -41,82 +159,84 @@ def main():
     if args.plots:
         plots_dir.mkdir(parents=True, exist_ok=True)
 
+    cache_path = logs_dir / CACHE_NAME
+    cache = {} if args.rebuild else load_cache(cache_path)
+    files = {}   # the new cache, only logs that still exist
     rows = []
-    grouped = {}  # key = (payload, interval) → {iface: df}
+    grouped = {}  # key = (payload, interval) → {iface: (path, meta)}
+    changed = set()  # groups with a new or modified log
+    sketches = {}  # (iface, payload, interval) → merged OWD sketch of every run
+    parsed = 0
 
-    for path in sorted(logs_dir.glob("client_*.csv")):
+    for path in discover_logs(logs_dir):
         m = FNAME_RE.search(path.name)
         if not m: 
             continue
         meta = m.groupdict()
-        iface   = meta["iface"]
-        payload = int(meta["payload"])
-        interval= int(meta["interval"])
-        expected= int(meta["count"])
-
-        df = pd.read_csv(path)
-        delay_col = [c for c in df.columns if c.startswith("delay(")][0]
-        owd_ms = pd.to_numeric(df[delay_col]) / 1e6
-
-        # packet loss (seq should go 0..expected-1)
-        received = len(df)
-        loss_pct = 100 * (1 - received/expected)
-
-        row = {
-            "file": path.name,
-            "iface": iface,
-            "payload_B": payload,
-            "interval_ms": interval,
-            "count_expected": expected,
-            "count_received": received,
-            "loss_pct": loss_pct,
-            "owd_ms_mean": float(owd_ms.mean()),
-            "owd_ms_std": float(owd_ms.std(ddof=1)),
-            "owd_ms_p50": float(owd_ms.median()),
-            "owd_ms_p95": float(owd_ms.quantile(0.95)),
-            "owd_ms_min": float(owd_ms.min()),
-            "owd_ms_max": float(owd_ms.max()),
-        }
-        rows.append(row)
+        key = (int(meta["payload"]), float(meta["interval"]))
+        grouped.setdefault(key, {})[meta["iface"]] = (path, meta)
+
+        # unchanged logs (same size and mtime) reuse their cached row
+        st = path.stat()
+        entry = cache.get(path.name)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            files[path.name] = entry
+            rows.append(entry["row"])
+            merge_sketch(sketches, entry["row"], OwdSketch.from_dict(entry["sketch"]))
+            # the cache has no samples, a plot that is missing (first --plots run) needs the log again
+            if args.plots and not (plots_dir / f"{path.stem}_owd.png").exists():
+                plot_owd(plots_dir, path, analyze_log(path, meta)[1])
+            continue
 
-        # group for combined plots
-        key = (payload, interval)
-        grouped.setdefault(key, {})[iface] = owd_ms
+        row, owd_ms, sketch = analyze_log(path, meta)
+        parsed += 1
+        files[path.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "row": row,
+                            "sketch": sketch.to_dict()}
+        rows.append(row)
+        merge_sketch(sketches, row, sketch)
+        changed.add(key)
 
         # individual plot
         if args.plots:
-            plt.figure()
-            plt.plot(range(len(owd_ms)), owd_ms.values)
-            plt.xlabel("packet seq")
-            plt.ylabel("OWD (ms)")
-            plt.title(path.name)
-            plt.tight_layout()
-            plt.savefig(plots_dir / f"{path.stem}_owd.png")
-            plt.close()
+            plot_owd(plots_dir, path, owd_ms)
+
+    save_cache(cache_path, files)
+    print(f"[OK] {parsed} new or changed logs parsed, {len(rows) - parsed} from cache")
 
     # summary table
     summary = pd.DataFrame(rows).sort_values(["payload_B","interval_ms","iface"])
     out_csv = logs_dir / "summary_full.csv"
     summary.to_csv(out_csv, index=False)
     print(f"[OK] Wrote {out_csv}\n")
-    print(summary[["iface","payload_B","interval_ms","owd_ms_mean","owd_ms_std","owd_ms_p95","loss_pct"]].to_string(index=False))
-
-    # combined plots wifi vs eth
+    print(summary[["iface","payload_B","interval_ms","owd_ms_mean","owd_ms_std","owd_ms_p95","loss_pct","count_reordered","count_duplicates"]].to_string(index=False))
+
+    # per-group percentiles over every run of a config, merged from the sketches, no raw samples
+    groups = pd.DataFrame([
+        {"iface": iface, "payload_B": payload, "interval_ms": interval, "runs": runs, "samples": sk.n,
+         **{f"owd_ms_p{q}": sk.quantile(q / 100) / 1e6 for q in (50, 90, 95, 99)}}
+        for (iface, payload, interval), (sk, runs) in sketches.items() if sk.n
+    ]).sort_values(["payload_B","interval_ms","iface"])
+    out_groups = logs_dir / "summary_groups.csv"
+    groups.to_csv(out_groups, index=False)
+    print(f"\n[OK] Wrote {out_groups}")
+
+    # combined plots wifi vs eth, only redrawn for groups that changed
     if args.plots:
         for (payload, interval), data in grouped.items():
-            if len(data) < 2: 
+            fname = f"compare_p{payload}_i{interval:g}.png"
+            if len(data) < 2 or ((payload, interval) not in changed and (plots_dir / fname).exists()):
                 continue
             plt.figure()
-            for iface, owd_ms in data.items():
+            for iface, (path, meta) in data.items():
+                owd_ms = analyze_log(path, meta)[1]
                 plt.plot(range(len(owd_ms)), owd_ms.values, label=iface)
             plt.xlabel("packet seq")
             plt.ylabel("OWD (ms)")
-            plt.title(f"OWD over time (payload={payload}B, interval={interval}ms)")
+            plt.title(f"OWD over time (payload={payload}B, interval={interval:g}ms)")
             plt.legend()
             plt.tight_layout()
-            fname = f"compare_p{payload}_i{interval}.png"
             plt.savefig(plots_dir / fname)
             plt.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
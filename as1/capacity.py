@@ -0,0 +1,57 @@
+"""
+bottleneck capacity from packet trains (packet pair / train dispersion)
+
+a train of back-to-back packets leaves the bottleneck link spaced by its transmission time,
+so the spread of the server's receive stamps over a train gives the link rate:
+  capacity = bits of every packet after the first / (t1 of the last - t1 of the first)
+the per-train estimates are noisy (cross traffic stretches trains, interrupt coalescing squeezes
+them), the median over many trains is reported. needs udp (tcp coalesces the sends) and kernel
+receive stamps on the server for anything above a few hundred Mbit/s
+
+the receive spread only measures the link when the link is what spread the train: a train that
+left the client no faster than it arrived (python, the scheduler, a busy cpu) measures the sender.
+such trains are dropped, a train counts only if its receive dispersion is at least MIN_STRETCH
+times its send dispersion (from the kernel tx stamps with --tx-ts, user space t0 otherwise)
+"""
+
+UDP_OVERHEAD = 28  # IPv4 + UDP headers, the link layer framing is not counted
+MIN_STRETCH = 1.1  # receive / send dispersion of a train the bottleneck has actually spread
+
+
+def train_capacity(seqs, t0s, t1s, sizes, burst, overhead=UDP_OVERHEAD, min_stretch=MIN_STRETCH):
+    """
+    seqs/t0s/t1s/sizes: replies in arrival order (client send time, server receive time, datagram size)
+    burst: probes per train, train k is seqs k*burst .. (k+1)*burst - 1
+    returns {capacity_mbps, capacity_mbps_p25, capacity_mbps_p75, capacity_trains, capacity_trains_sender_limited},
+    None without a usable train
+    """
+    trains = {}
+    for seq, t0, t1, size in zip(seqs, t0s, t1s, sizes):
+        train = trains.setdefault(seq // burst, {})
+        train.setdefault(seq, (t0, t1, size))  # first copy only
+
+    estimates, sender_limited = [], 0
+    for train in trains.values():
+        if len(train) < 2:
+            continue
+        pkts = [train[s] for s in sorted(train)]
+        # reordered trains say nothing about the bottleneck spacing
+        if any(b[1] < a[1] for a, b in zip(pkts, pkts[1:])):
+            continue
+        dispersion = pkts[-1][1] - pkts[0][1]
+        if dispersion <= 0:
+            continue
+        # both ends of a difference come from the same clock, the offset cancels
+        if dispersion < min_stretch * (pkts[-1][0] - pkts[0][0]):
+            sender_limited += 1
+            continue
+        bits = sum(size + overhead for _, _, size in pkts[1:]) * 8
+        estimates.append(bits / dispersion * 1e3)  # bits/ns -> Mbit/s
+
+    if not estimates:
+        return None
+    estimates.sort()
+    pick = lambda q: estimates[min(len(estimates) - 1, int(q * len(estimates)))]
+    return {"capacity_mbps": pick(0.5), "capacity_mbps_p25": pick(0.25),
+            "capacity_mbps_p75": pick(0.75), "capacity_trains": len(estimates),
+            "capacity_trains_sender_limited": sender_limited}
@@ -0,0 +1,155 @@
+"""
+in-memory columnar capture of probe results + the compact binary log format
+
+the probe loops only store integers into preallocated typed arrays, nothing is formatted or
+written until the run is over. the log is then written in one go as a columnar file:
+
+  b"OWDCAP1\n"
+  u32 little endian header length, then a JSON header:
+    {"rows": n, "columns": ["seq", "time_sent", ...], "meta": {...}}
+  every column as n little endian int64 values, one column after the other
+
+numpy can map each column directly (np.frombuffer), so analysis.py never parses text.
+CSV export on demand:
+  python3 capture.py logs/client_wifi_p64_i100_c50.owd [more.owd ...]
+"""
+import csv, json, struct, sys
+from array import array
+from sketch import OwdSketch
+
+MAGIC = b"OWDCAP1\n"
+HEADER_LEN = struct.Struct("<I")
+LITTLE = sys.byteorder == "little"
+
+
+def zeros(n):
+    return array("q", bytes(8 * n))
+
+
+class ProbeCapture:
+    """
+    per-probe results of one run, t0/size indexed by seq, replies in arrival order
+    with a clock, every reply also goes into `live`, an OWD sketch corrected with the clock's current fit
+    """
+    def __init__(self, count, clock=None):
+        self.count = count
+        self.clock = clock
+        self.live = OwdSketch()
+        self.t0 = zeros(count)
+        self.size = zeros(count)
+        self.pace_err = zeros(count)  # actual - scheduled send time, ns
+        # arrival order, udp duplicates can make this longer than count (then it grows)
+        self.rx_seq = zeros(count)
+        self.rx_t1 = zeros(count)
+        self.n = 0
+
+    def sent(self, seq, t0, size):
+        self.t0[seq] = t0
+        self.size[seq] = size
+
+    def received(self, seq, t1):
+        n = self.n
+        if n < len(self.rx_seq):
+            self.rx_seq[n] = seq
+            self.rx_t1[n] = t1
+        else:
+            self.rx_seq.append(seq)
+            self.rx_t1.append(t1)
+        self.n = n + 1
+        if self.clock:
+            t0 = self.t0[seq]
+            self.live.add((t1 - t0) - self.clock.offset_at(t0))
+
+    def columns(self, clock, stamper=None):
+        """
+        the log columns, one row per reply in arrival order
+        time_sent is the kernel tx stamp when the stamper has one, user space t0 otherwise
+        """
+        n = self.n
+        seq, t0, t1, owd, size, pace = zeros(n), zeros(n), zeros(n), zeros(n), zeros(n), zeros(n)
+        t0_user = zeros(n) if stamper else None
+        for i in range(n):
+            s = self.rx_seq[i]
+            sent = self.t0[s]
+            if stamper:
+                t0_user[i] = sent
+                sent = stamper.t0(s) or sent
+            seq[i] = s
+            t0[i] = sent
+            t1[i] = self.rx_t1[i]
+            # OWD = time_recieved - (time_sent + time_desync)
+            # integer difference first, epoch nanoseconds do not fit in a float exactly
+            owd[i] = round((self.rx_t1[i] - sent) - clock.offset_at(sent))
+            size[i] = self.size[s]
+            pace[i] = self.pace_err[s]
+
+        cols = {"seq": seq, "time_sent": t0, "time_received": t1, "delay": owd, "payload_bytes": size,
+                "pacing_error": pace}
+        if stamper:
+            cols["time_sent_user"] = t0_user
+        return cols
+
+    def sketch(self, cols):
+        """OWD sketch of the final columns, first copy of every seq only"""
+        sk = OwdSketch()
+        seen = bytearray(self.count)
+        for s, d in zip(cols["seq"], cols["delay"]):
+            if not seen[s]:
+                seen[s] = 1
+                sk.add(d)
+        return sk
+
+
+def write_columnar(path, cols, meta):
+    names = list(cols)
+    rows = len(cols[names[0]]) if names else 0
+    header = json.dumps({"rows": rows, "columns": names, "meta": meta}).encode()
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER_LEN.pack(len(header)))
+        f.write(header)
+        for name in names:
+            col = cols[name]
+            if not LITTLE:
+                col = array("q", col)
+                col.byteswap()
+            col.tofile(f)
+
+
+def read_columnar(path):
+    """returns (columns as int64 arrays, meta)"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar probe log")
+        (hlen,) = HEADER_LEN.unpack(f.read(HEADER_LEN.size))
+        header = json.loads(f.read(hlen))
+        cols = {}
+        for name in header["columns"]:
+            col = array("q")
+            col.fromfile(f, header["rows"])
+            if not LITTLE:
+                col.byteswap()
+            cols[name] = col
+    return cols, header["meta"]
+
+
+def delay_header(meta):
+    """the CSV name of the delay column, analysis.py finds it by the delay( prefix"""
+    return f"delay(offset={meta['offset']:.0f};drift_ppm={meta['drift_ppm']:.3f})"
+
+
+def export_csv(path, cols, meta):
+    names = list(cols)
+    header = [delay_header(meta) if n == "delay" else n for n in names]
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(zip(*(cols[n] for n in names)))
+
+
+if __name__ == "__main__":
+    for p in sys.argv[1:]:
+        cols, meta = read_columnar(p)
+        out = p.rsplit(".", 1)[0] + ".csv"
+        export_csv(out, cols, meta)
+        print(f"wrote {out}")
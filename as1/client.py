@@ -1,4 +1,16 @@
-import socket, time, argparse, csv, os
+import socket, sys, time, argparse, os, random, threading
+from wire import BOOP, ACK, SYNC, SYNC_ACK, DatagramWire, delivery_stats, open_wire
+from timestamps import TxStamper
+from clock import ClockEstimator, Resync
+from capture import ProbeCapture, write_columnar, export_csv
+from pacer import Pacer, SCHEDULES, summarize
+import shared_path  # ../shared on sys.path
+from metrics import Metrics
+from capacity import train_capacity
+
+
+def number_list(kind):
+    return lambda text: [kind(x) for x in text.split(",") if x]
 
 
 def parse_args():
@@ -6,111 +18,480 @@ def parse_args():
     ap.add_argument("--host", required=True, help="server IP (Wi-Fi or Ethernet)")
     ap.add_argument("--port", type=int, default=5001)    
     ap.add_argument("--label", default="wifi", help="run label: wifi or eth") 
+    ap.add_argument("--path", action="append", default=[], metavar="LABEL:SRC[:HOST]",
+                    help="probe several paths at once, repeatable: SRC is a local address or an interface name, "
+                         "HOST overrides --host for this path, every path gets its own client_<LABEL>_... log")
     ap.add_argument("--payload", type=int, default=0, help="extra bytes to append")
-    ap.add_argument("--interval", type=int, default=100)
+    ap.add_argument("--interval", type=float, default=100, help="ms between probes (mean), fractions allowed")
     ap.add_argument("--count", type=int, default=10)
+    ap.add_argument("--payloads", type=number_list(int), default=None, metavar="P1,P2,..",
+                    help="sweep: run every payload x interval x count over one connection and one clock sync")
+    ap.add_argument("--intervals", type=number_list(float), default=None, metavar="I1,I2,..",
+                    help="sweep: intervals in ms, see --payloads")
+    ap.add_argument("--counts", type=number_list(int), default=None, metavar="C1,C2,..",
+                    help="sweep: probe counts, see --payloads")
+    ap.add_argument("--schedule", choices=SCHEDULES, default="constant",
+                    help="constant, poisson (exponential gaps) or burst (packet trains of --burst probes)")
+    ap.add_argument("--burst", type=int, default=8, help="burst schedule only: probes per train")
+    ap.add_argument("--spin-us", type=float, default=200,
+                    help="busy-wait this long before each send instead of sleeping (pacing precision vs CPU)")
+    ap.add_argument("--seed", type=int, default=None, help="poisson schedule only: RNG seed")
+    ap.add_argument("--capacity", action="store_true",
+                    help="estimate bottleneck capacity from the server side dispersion of back-to-back trains "
+                         "(udp, implies --schedule burst; use a large --payload)")
+    ap.add_argument("--wire", choices=["text", "binary"], default="text",
+                    help="text: original line protocol, binary: fixed struct frames (negotiated with the server)")
+    ap.add_argument("--window", type=int, default=1,
+                    help="max probes in flight, 1 = stop-and-wait, >1 sends without waiting for each ACK")
+    ap.add_argument("--transport", choices=["tcp", "udp"], default="tcp",
+                    help="udp: binary frames over datagrams, open-loop sending with loss/reorder/duplicate accounting")
+    ap.add_argument("--timeout", type=float, default=1.0,
+                    help="udp only: seconds to wait for a reply before counting it lost")
+    ap.add_argument("--tx-ts", action="store_true",
+                    help="use kernel software tx timestamps (SO_TIMESTAMPING) as time_sent, user space t0 is kept in time_sent_user")
+    ap.add_argument("--report", type=float, default=0,
+                    help="seconds between live OWD percentile reports during a run (streaming sketch), 0 = off")
+    ap.add_argument("--switch-interval", type=float, default=0,
+                    help="multiple --path only: interpreter thread switch interval in ms while probing, e.g. 0.2 "
+                         "(the default 5ms shows up as pacing error of the paths sharing the GIL), 0 = leave it")
+    ap.add_argument("--metrics-port", type=int, default=0,
+                    help="serve live Prometheus metrics on http://127.0.0.1:PORT/metrics while probing, 0 = off")
+    ap.add_argument("--csv", action="store_true",
+                    help="also export the log as CSV (the columnar .owd log is always written)")
+    ap.add_argument("--sync-rounds", type=int, default=8, help="SYNC exchanges before the first probe")
+    ap.add_argument("--sync-interval", type=float, default=200,
+                    help="ms between SYNC exchanges interleaved with the probes, 0 = only sync at connect")
+    ap.add_argument("--sync-window", type=float, default=5000,
+                    help="ms per min-RTT window when fitting clock offset + drift")
 
-    return ap.parse_args()
+    args = ap.parse_args()
+    if args.capacity:
+        if args.transport != "udp":
+            ap.error("--capacity needs --transport udp, tcp merges back-to-back sends")
+        args.schedule = "burst"
+    return args
 
-# this estimates clock offset
-def sync(s, seq=20):
+# this estimates clock offset, back-to-back rounds, the estimate keeps improving during the run
+def sync(wire, clock, seq=8):
 
     print("------------------- SYNC PHASE -------------------")
-    offsets = []
 
     for i in range(seq):
 
         # t0: client time before send
         t0 = time.time_ns()
-        msg = f"SYNC,{i},t0={t0}"
-        s.sendall((msg + "\n").encode())
+        wire.send(SYNC, i, t0)
 
-        # read one full reply line
-        reply = s.recv(1024).decode().strip()
+        # t1: server time when recieved
+        # skip stale replies from earlier rounds (only possible over udp)
+        reply = wire.recv()
+        while reply is not None and (reply[0] != SYNC_ACK or reply[1] != i):
+            reply = wire.recv()
 
         # t2: client time right after recive
         t2 = time.time_ns()
-        # expect "SYNC_ACK,{i},t1={t1}"
-        parts = reply.split(",")
+        if reply is None:
+            continue  # lost round (udp) or connection closed
+        clock.add(t0, reply[2], t2)
 
-        # t1: server time when recieved
-        t1 = int(parts[2].split("t1=", 1)[1])
+    if not clock.samples:
+        raise SystemExit("[CLIENT] no SYNC_ACK received, is the server running with the same --transport?")
+    offset, _, _ = clock.fit()
 
-        roundtrip = t2 - t0
-        offsets.append(t1 - (t0 + roundtrip // 2))
+    print(f"------------------- SYNC DONE offset={offset:.0f} -------------------")
 
-        # just to control pacing 
-        time.sleep(0.005)
 
-    offsets.sort()
-    median = offsets[len(offsets) // 2]
 
-    print(f"------------------- SYNC DONE offset={median} -------------------")
+def wait_for(wire, kind, seq=None):
+    """
+    reads replies until one of `kind` (and `seq`, if given) arrives, stray replies are dropped
+    returns (kind, seq, t1, t2) or None if the server closed (or the udp timeout ran out)
+    """
+    while True:
+        reply = wire.recv()
+        t2 = time.time_ns()
+        if reply is None:
+            return None
+        if reply[0] == kind and (seq is None or reply[1] == seq):
+            return (*reply, t2)
 
-    return median
 
+# the original probing: send one BOOP, wait for its ACK, sleep until the next slot
+def probe_stop_and_wait(wire, cap, pacer, resync, stamper=None):
+    for seq in range(cap.count):  # 0 to COUNT-1
+        # to avoid loop running faster than its supposed to
+        cap.pace_err[seq] = pacer.wait()
 
+        t0 = time.time_ns()
 
-def run():
-    args = parse_args()
-    HOST = args.host
+        # SEND
+        cap.sent(seq, t0, wire.send(BOOP, seq, t0))
+        if stamper:
+            stamper.sent(seq)
+
+        # RECIEVE, only the ACK of this BOOP counts
+        reply = wait_for(wire, ACK, seq)
+        if reply is None:
+            print("[CLIENT] server closed the connection")
+            break
+        cap.received(seq, reply[2])
+
+        # clock sync exchange in the idle time before the next probe
+        if resync.maybe_send():
+            reply = wait_for(wire, SYNC_ACK)
+            if reply is None:
+                print("[CLIENT] server closed the connection")
+                break
+            resync.on_reply(reply[1], reply[2], reply[3])
+
+
+# pipelined probing: sending and receiving are decoupled, at most `window` probes in flight
+def probe_windowed(wire, cap, pacer, window, resync, stamper=None):
+    count = cap.count
+    slots = threading.Semaphore(window)
+    closed = threading.Event()
+
+    def receiver():
+        while cap.n < count:
+            reply = wire.recv()
+            t2 = time.time_ns()
+            if reply is None:
+                print("[CLIENT] server closed the connection")
+                break
+            kind, seq, t1 = reply
+            if kind == SYNC_ACK:
+                resync.on_reply(seq, t1, t2)
+                continue
+            cap.received(seq, t1)
+            slots.release()
+        closed.set()
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+
+    start = time.time()
+    for seq in range(count):
+        # wait for a free slot in the window (or give up if the receiver stopped)
+        while not slots.acquire(timeout=0.1):
+            if closed.is_set():
+                break
+        if closed.is_set():
+            break
+
+        # a full window shows up as pacing error
+        cap.pace_err[seq] = pacer.wait()
+
+        # t0 is stored before the send so the receiver can never see an ACK without it
+        t0 = time.time_ns()
+        cap.t0[seq] = t0
+        cap.sent(seq, t0, wire.send(BOOP, seq, t0))
+        if stamper:
+            stamper.sent(seq)
+        resync.maybe_send()
+
+    rx.join()
+    elapsed = time.time() - start
+    print(f"[CLIENT] {cap.n} ACKs in {elapsed:.3f}s ({cap.n / elapsed:.0f} probes/s, window={window})")
+
+
+# udp probing: send on schedule no matter what comes back, replies are matched by seq
+# and can be lost, reordered or duplicated
+def probe_open_loop(wire, cap, pacer, resync, stamper=None):
+    count = cap.count
+    seen = bytearray(count)
+    stale = wire.stale
+    done_sending = threading.Event()
+
+    def receiver():
+        unique = 0
+        while unique < count:
+            reply = wire.recv()
+            t2 = time.time_ns()
+            if reply is None:
+                # a whole timeout without replies after the last send: the rest is lost
+                if done_sending.is_set():
+                    break
+                continue
+            kind, seq, t1 = reply
+            if kind == SYNC_ACK:
+                resync.on_reply(seq, t1, t2)
+                continue
+            if kind != ACK or seq >= count:
+                continue
+            cap.received(seq, t1)
+            if not seen[seq]:
+                seen[seq] = 1
+                unique += 1
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+
+    start = time.time()
+    for seq in range(count):
+        cap.pace_err[seq] = pacer.wait()
+
+        t0 = time.time_ns()
+        cap.t0[seq] = t0
+        cap.sent(seq, t0, wire.send(BOOP, seq, t0))
+        if stamper:
+            stamper.sent(seq)
+        resync.maybe_send()
+
+    done_sending.set()
+    rx.join()
+    elapsed = time.time() - start
+
+    stats = delivery_stats(cap.rx_seq[:cap.n], count)
+    print(f"[CLIENT] {stats['received']}/{count} probes answered in {elapsed:.3f}s: "
+          f"lost={stats['lost']} reordered={stats['reordered']} duplicates={stats['duplicates']} "
+          f"(dropped {wire.stale - stale} late replies of earlier runs)")
+
+
+def parse_path(spec, default_host):
+    """LABEL:SRC[:HOST] -> (label, host, src)"""
+    parts = spec.split(":")
+    if len(parts) not in (2, 3) or not all(parts):
+        raise SystemExit(f"[CLIENT] bad --path {spec!r}, expected LABEL:SRC[:HOST]")
+    return parts[0], parts[2] if len(parts) == 3 else default_host, parts[1]
+
+
+def bind_source(s, src):
+    """pins the socket to a local address, or to an interface (SO_BINDTODEVICE, needs CAP_NET_RAW)"""
+    try:
+        socket.inet_aton(src)
+    except OSError:
+        s.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_BINDTODEVICE", 25), src.encode())
+        return
+    s.bind((src, 0))
+
+
+def sweep_grid(args):
+    """(payload, interval, count) of every run, a single run unless --payloads/--intervals/--counts are given"""
+    payloads = args.payloads or [args.payload]
+    intervals = args.intervals or [args.interval]
+    counts = args.counts or [args.count]
+    return [(p, i, c) for p in payloads for i in intervals for c in counts]
+
+
+def run_path(args, LABEL, HOST, src=None, seed=None, barrier=None, start=None, metrics=None):
+    """every run of the sweep over one path: connect and sync once, then probe each configuration"""
     PORT = args.port
-    COUNT = args.count
-    INTERVAL = args.interval
-    PAYLOAD = args.payload
-    PADDING= "A" * PAYLOAD if PAYLOAD > 0 else ""
-    LABEL = args.label
+    grid = sweep_grid(args)
 
+    UDP = args.transport == "udp"
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM if UDP else socket.SOCK_STREAM) as s:
+        if src:
+            bind_source(s, src)
         s.connect((HOST, PORT))
-        print(f"client connected. host:{HOST} port:{PORT}")
-
-        # SYNC HERE
-        offset = sync(s)
-
-        # initialize log
-        os.makedirs("logs", exist_ok=True)
-        LOG = f"logs/client_{LABEL}_p{PAYLOAD}_i{INTERVAL}_c{COUNT}.csv"
-        f = open(LOG, "w", newline="")
-        w = csv.writer(f)
-        w.writerow(["seq","time_sent","time_received",f"delay(offset={offset})","payload_bytes"])
-
-        next_send = time.time()
-        for seq in range(COUNT):  # 0 to COUNT-1
-            now = time.time()
-
-            # to avoid loop running faster than its supposed to
-            if now < next_send:
-                time.sleep(next_send - now)
-
-            t0 = time.time_ns()
-
-            msg = f"BOOP,{seq},time_sent={t0},{PADDING}"
-            
-            # SEND
-            s.sendall((msg + "\n").encode())
-            # print(f"[CLIENT] sent: {msg}")
-            payload_bytes = len(msg.encode())
-            
-            # RECIEVE
-            reply = s.recv(1024).decode().strip()
-            # print(f"[CLIENT] recv: {reply}")
-
-            # parse time_receieved from reply and compute OWD = time_recieved - (time_sent + time_desync)
-            parts = reply.split(",", 2)
-            seq = int(parts[1])
-            t1 = float(parts[2].split("t1=", 1)[1])
-            OWD = (t1 - offset) - t0
-
-            # append a CSV row here for analysis
-            w.writerow([seq, f"{t0}", f"{t1}", f"{OWD}", f"{payload_bytes}"])
-            # print(f"[CLIENT] seq={seq} OWD={OWD:.3f} ns")
-
-            next_send += INTERVAL/ 1000.0
-
-        print("[CLIENT] done")
-        f.close()
+        if not UDP:
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print(f"client connected. label:{LABEL} host:{HOST} port:{PORT} transport:{args.transport} "
+              f"source:{s.getsockname()[0]}")
+
+        # padding is built once here for the largest payload, not per send or per run
+        PAYLOAD = max(g[0] for g in grid)
+        if UDP:
+            wire = DatagramWire(s, PAYLOAD, args.timeout)
+        else:
+            wire = open_wire(s, args.wire, PAYLOAD)
+        print(f"wire format: {wire.name}")
+
+        # SYNC HERE, the estimate then keeps improving across the whole sweep
+        clock = ClockEstimator(args.sync_window)
+        sync(wire, clock, args.sync_rounds)
+        resync = Resync(wire, clock, args.sync_interval, args.sync_rounds)
+
+        # enabled after the sync phase so the kernel's send ids start at the first BOOP
+        stamper = None
+        if args.tx_ts:
+            stamper = TxStamper(s, wire, UDP, args.burst if args.schedule == "burst" else 1)
+            print(f"t0 source: {'kernel tx timestamps (SO_TIMESTAMPING)' if stamper.enabled else 'user space (tx timestamps unavailable)'}")
+            if not stamper.enabled:
+                stamper = None
+
+        t_sweep = time.time()
+        for n, (payload, interval, count) in enumerate(grid, 1):
+            if len(grid) > 1:
+                print(f"------------------- RUN {n}/{len(grid)} payload={payload} interval={interval:g} count={count} -------------------")
+            wire.set_payload(payload)
+            # every path starts probing on the same slot
+            if barrier:
+                barrier.wait()
+            probe_run(args, LABEL, HOST, src, wire, clock, resync, stamper,
+                      payload, interval, count, seed, start.get("t") if start else None, metrics)
+        if len(grid) > 1:
+            print(f"[CLIENT] {LABEL} sweep of {len(grid)} runs took {time.time() - t_sweep:.1f}s")
+
+        if stamper:
+            stamper.close()
+        print(f"[CLIENT] {LABEL} done")
+
+
+def owd_percentiles(sk):
+    if not sk.n:
+        return "n=0"
+    return " ".join([f"n={sk.n}"] + [f"p{q}={sk.quantile(q / 100) / 1e6:.3f}ms" for q in (50, 95, 99)])
+
+
+def report_live(label, cap, every, stop):
+    """prints the live OWD sketch every `every` seconds until stop is set"""
+    while not stop.wait(every):
+        print(f"[CLIENT] {label} live OWD {owd_percentiles(cap.live)}")
+
+
+def describe_metrics(metrics):
+    metrics.describe("owd_probes_sent_total", "counter", "BOOPs sent in the current run")
+    metrics.describe("owd_replies_total", "counter", "ACKs received in the current run")
+    metrics.describe("owd_ms", "summary", "OWD percentiles of the current run so far (streaming sketch)")
+    metrics.describe("owd_last_reply_age_seconds", "gauge", "time since the server stamped the last ACK, grows when replies stop")
+    metrics.describe("owd_pacing_error_us", "gauge", "pacing error of the last probe sent")
+    metrics.describe("owd_clock_offset_ns", "gauge", "current server - client clock offset estimate")
+    metrics.describe("owd_run_payload_bytes", "gauge", "--payload of the current run")
+    metrics.describe("owd_run_interval_ms", "gauge", "--interval of the current run")
+    metrics.describe("owd_run_count", "gauge", "--count of the current run")
+    metrics.describe("owd_runs_completed_total", "counter", "runs finished and written to logs")
+
+
+def probe_metrics(metrics, label, cap, pacer, clock, payload, interval, count):
+    """scrape time collector for one running probe run"""
+    n = cap.n
+    metrics.set("owd_run_payload_bytes", payload, path=label)
+    metrics.set("owd_run_interval_ms", interval, path=label)
+    metrics.set("owd_run_count", count, path=label)
+    metrics.set("owd_probes_sent_total", pacer.i, path=label)
+    metrics.set("owd_replies_total", n, path=label)
+    for q in (0.5, 0.95, 0.99):
+        v = cap.live.quantile(q)
+        metrics.set("owd_ms", None if v is None else v / 1e6, path=label, quantile=q)
+    if pacer.i:
+        metrics.set("owd_pacing_error_us", cap.pace_err[pacer.i - 1] / 1e3, path=label)
+    offset = clock.offset_at(time.time_ns())
+    metrics.set("owd_clock_offset_ns", round(offset), path=label)
+    if n:
+        age = (time.time_ns() - (cap.rx_t1[n - 1] - offset)) / 1e9
+        metrics.set("owd_last_reply_age_seconds", round(age, 3), path=label)
+
+
+def probe_run(args, LABEL, HOST, src, wire, clock, resync, stamper, PAYLOAD, INTERVAL, COUNT, seed, start,
+              metrics=None):
+    """one configuration on an already synced connection, writes its client_<label>_p.._i.._c.. log"""
+    UDP = args.transport == "udp"
+
+    # results go into preallocated arrays, nothing is written until the run is over
+    cap = ProbeCapture(COUNT, clock)
+    pacer = Pacer(INTERVAL, args.schedule, args.burst, args.spin_us, seed, start)
+    if metrics:
+        metrics.collector(LABEL, lambda m: probe_metrics(m, LABEL, cap, pacer, clock, PAYLOAD, INTERVAL, COUNT))
+    stop = threading.Event()
+    if args.report > 0:
+        threading.Thread(target=report_live, args=(LABEL, cap, args.report, stop), daemon=True).start()
+    if UDP:
+        wire.new_run()
+        probe_open_loop(wire, cap, pacer, resync, stamper)
+    elif args.window > 1:
+        probe_windowed(wire, cap, pacer, args.window, resync, stamper)
+    else:
+        probe_stop_and_wait(wire, cap, pacer, resync, stamper)
+    stop.set()
+
+    p50, p99, worst = summarize(cap.pace_err[:pacer.i])
+    print(f"[CLIENT] {LABEL} pacing error ({args.schedule}): p50={p50:.1f}us p99={p99:.1f}us max={worst:.1f}us")
+
+    if stamper:
+        stamper.finish()
+
+    # offset + drift from every min-RTT SYNC sample so far, applied retroactively
+    offset, drift, _ = clock.fit()
+    print(f"[CLIENT] clock offset={offset:.0f}ns drift={drift * 1e6:.3f}ppm "
+          f"from {len(clock.best())} min-RTT samples of {len(clock.samples)} SYNC exchanges")
+
+    cols = cap.columns(clock, stamper)
+    if stamper:
+        stamped = sum(1 for a, b in zip(cols["time_sent"], cols["time_sent_user"]) if a != b)
+        print(f"[CLIENT] {stamped}/{cap.n} probes have a kernel tx timestamp")
+        stamper.reset()
+    sketch = cap.sketch(cols)
+    print(f"[CLIENT] {LABEL} OWD {owd_percentiles(sketch)}")
+
+    # every udp burst run doubles as a packet train capacity measurement
+    capacity = None
+    if UDP and args.schedule == "burst":
+        capacity = train_capacity(cols["seq"], cols["time_sent"], cols["time_received"], cols["payload_bytes"],
+                                  args.burst)
+        if capacity:
+            print(f"[CLIENT] {LABEL} bottleneck capacity ~{capacity['capacity_mbps']:.1f} Mbit/s "
+                  f"(p25={capacity['capacity_mbps_p25']:.1f} p75={capacity['capacity_mbps_p75']:.1f}, "
+                  f"{capacity['capacity_trains']} trains of {args.burst}, "
+                  f"{capacity['capacity_trains_sender_limited']} sender limited trains dropped)")
+        else:
+            print(f"[CLIENT] {LABEL} no packet train was spread by the path (sender limited or reordered), "
+                  f"no capacity estimate")
+
+    # write the log in one go
+    os.makedirs("logs", exist_ok=True)
+    LOG = f"logs/client_{LABEL}_p{PAYLOAD}_i{INTERVAL:g}_c{COUNT}"
+    meta = {"offset": offset, "drift_ppm": drift * 1e6, "host": HOST, "port": args.port, "source": src,
+            "transport": args.transport, "wire": wire.name,
+            "schedule": args.schedule, "interval_ms": INTERVAL}
+    if args.schedule == "burst":
+        meta["burst"] = args.burst
+    if capacity:
+        meta.update(capacity)
+    meta["owd_sketch"] = sketch.to_dict()
+    write_columnar(LOG + ".owd", cols, meta)
+    print(f"[CLIENT] wrote {LOG}.owd")
+    if args.csv:
+        export_csv(LOG + ".csv", cols, meta)
+        print(f"[CLIENT] wrote {LOG}.csv")
+    if metrics:
+        metrics.inc("owd_runs_completed_total", path=LABEL)
+
+
+def run():
+    args = parse_args()
+    metrics = None
+    if args.metrics_port:
+        metrics = Metrics()
+        describe_metrics(metrics)
+        metrics.serve(args.metrics_port)
+        print(f"[CLIENT] metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    if not args.path:
+        run_path(args, args.label, args.host, seed=args.seed, metrics=metrics)
+        return
+
+    # one thread per path, they sync independently and then share one schedule:
+    # the same first slot and (poisson) the same seed
+    paths = [parse_path(spec, args.host) for spec in args.path]
+    # the senders share the GIL, the default 5ms switch interval shows up directly as pacing error
+    old_switch = sys.getswitchinterval()
+    if args.switch_interval > 0:
+        sys.setswitchinterval(args.switch_interval / 1e3)
+    seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    start = {}
+    # the action runs once per run of the sweep, before any path is released
+    barrier = threading.Barrier(len(paths), action=lambda: start.update(t=time.monotonic_ns() + 10_000_000))
+    failed = []
+
+    def worker(label, host, src):
+        try:
+            run_path(args, label, host, src, seed, barrier, start, metrics)
+        except BaseException as e:
+            barrier.abort()  # the other paths must not wait for this one
+            failed.append(label)
+            if not isinstance(e, threading.BrokenBarrierError):
+                print(f"[CLIENT] {label} failed: {e!r}")
+
+    threads = [threading.Thread(target=worker, args=p, name=p[0]) for p in paths]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(old_switch)
+    if failed:
+        raise SystemExit(f"[CLIENT] paths failed: {', '.join(failed)}")
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+client/server clock offset + drift estimate from SYNC exchanges (NTP style)
+
+every exchange gives t0 (client send), t1 (server receive), t2 (client receive):
+  offset sample = t1 - (t0 + t2) / 2     error bound = rtt / 2
+queueing only ever adds delay, so the sample with the smallest rtt is the most trustworthy.
+samples are grouped into windows of `window_ms`, the min-rtt sample of each window is kept,
+and a least squares line offset(t) = offset + drift * (t - t_ref) is fit through them.
+with a single window (short runs) drift is 0 and this is just the min-rtt offset
+"""
+import time
+from wire import SYNC
+
+
+class ClockEstimator:
+    def __init__(self, window_ms=5000):
+        self.window_ns = int(window_ms * 1e6)
+        self.samples = []  # (client midpoint, offset, rtt)
+        self.model = (0.0, 0.0, 0)
+
+    def add(self, t0, t1, t2):
+        rtt = t2 - t0
+        if rtt < 0:
+            return
+        mid = t0 + rtt // 2
+        self.samples.append((mid, t1 - mid, rtt))
+
+    def best(self):
+        """the min-rtt sample of every window, in time order"""
+        if not self.samples:
+            return []
+        start = self.samples[0][0]
+        best = {}
+        for sample in self.samples:
+            k = (sample[0] - start) // self.window_ns
+            if k not in best or sample[2] < best[k][2]:
+                best[k] = sample
+        return [best[k] for k in sorted(best)]
+
+    def fit(self):
+        """refits the line, returns (offset at t_ref in ns, drift in ns/ns, t_ref)"""
+        pts = self.best()
+        if not pts:
+            raise ValueError("no SYNC samples")
+        t_ref = pts[0][0]
+        if len(pts) < 2:
+            self.model = (float(pts[0][1]), 0.0, t_ref)
+            return self.model
+
+        xs = [p[0] - t_ref for p in pts]
+        ys = [p[1] for p in pts]
+        x_mean = sum(xs) / len(xs)
+        y_mean = sum(ys) / len(ys)
+        var = sum((x - x_mean) ** 2 for x in xs)
+        cov = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+        drift = cov / var if var else 0.0
+        self.model = (y_mean - drift * x_mean, drift, t_ref)
+        return self.model
+
+    def offset_at(self, t):
+        """estimated server - client clock difference at client time t (ns), uses the last fit"""
+        offset, drift, t_ref = self.model
+        return offset + drift * (t - t_ref)
+
+
+class Resync:
+    """
+    interleaves SYNC exchanges with the probes: the sender calls maybe_send() between probes,
+    whoever reads the replies hands every SYNC_ACK to on_reply()
+    """
+    def __init__(self, wire, clock, interval_ms, first_round):
+        self.wire = wire
+        self.clock = clock
+        self.interval_ns = int(interval_ms * 1e6)
+        self.round = first_round
+        self.sent = {}  # round -> t0
+        self.next_due = time.time_ns() + self.interval_ns
+
+    def maybe_send(self) -> bool:
+        if self.interval_ns <= 0:
+            return False
+        t0 = time.time_ns()
+        if t0 < self.next_due:
+            return False
+        # stored before the send so the receiver can never see a SYNC_ACK without it
+        self.sent[self.round] = t0
+        self.wire.send(SYNC, self.round, t0)
+        self.round += 1
+        self.next_due = t0 + self.interval_ns
+        return True
+
+    def on_reply(self, seq, t1, t2):
+        t0 = self.sent.pop(seq, None)
+        if t0 is not None:
+            self.clock.add(t0, t1, t2)
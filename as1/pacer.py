@@ -0,0 +1,69 @@
+"""
+send scheduling for the probe loops
+
+every slot is an absolute time on the monotonic clock (immune to wall-clock steps), the pacer
+sleeps until `spin_us` before the slot and then spins the rest of the way, because
+time.sleep alone overshoots by tens of microseconds or more. like the original loop it never
+skips slots: if the sender falls behind, the late probes go out back to back to catch up
+
+schedules (mean rate is always one probe per interval):
+  constant: one probe every interval
+  poisson:  exponentially distributed gaps (PASTA: samples see the time-average queue)
+  burst:    trains of `burst` back-to-back probes, one train every burst * interval
+"""
+import random, time
+
+SCHEDULES = ("constant", "poisson", "burst")
+YIELD_NS = 100_000
+
+
+class Pacer:
+    def __init__(self, interval_ms, schedule="constant", burst=8, spin_us=200, seed=None, start=None):
+        if schedule not in SCHEDULES:
+            raise ValueError(f"unknown schedule {schedule}")
+        self.gap_ns = interval_ms * 1e6
+        self.schedule = schedule
+        self.burst = max(1, burst)
+        self.spin_ns = int(spin_us * 1000)
+        self.rng = random.Random(seed)
+        self.i = 0
+        # monotonic ns of the first slot, pacers given the same start and seed send in lockstep
+        self.next = start  # None: the schedule starts at the first wait()
+
+    def _gap(self):
+        if self.schedule == "poisson":
+            return self.rng.expovariate(1.0 / self.gap_ns) if self.gap_ns > 0 else 0.0
+        if self.schedule == "burst":
+            # the gap after the last probe of a train covers the whole train
+            return self.gap_ns * self.burst if self.i % self.burst == 0 else 0.0
+        return self.gap_ns
+
+    def wait(self) -> int:
+        """blocks until the next slot, returns the pacing error (actual - scheduled) in ns"""
+        if self.next is None:
+            self.next = time.monotonic_ns()
+        target = self.next
+        remaining = target - time.monotonic_ns()
+        if remaining > self.spin_ns:
+            time.sleep((remaining - self.spin_ns) / 1e9)
+        # sleep(0) releases the GIL so the receiver thread is not starved, but it is a syscall
+        # (tens of us on some VMs), so the last YIELD_NS are a pure spin
+        now = time.monotonic_ns()
+        while target - now > YIELD_NS:
+            time.sleep(0)
+            now = time.monotonic_ns()
+        while now < target:
+            now = time.monotonic_ns()
+
+        self.i += 1
+        self.next = target + int(self._gap())
+        return now - target
+
+
+def summarize(errors):
+    """p50 / p99 / max pacing error in microseconds"""
+    if not errors:
+        return 0.0, 0.0, 0.0
+    s = sorted(errors)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] / 1000
+    return pick(0.50), pick(0.99), s[-1] / 1000
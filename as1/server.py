@@ -1,19 +1,188 @@
-import socket, time, datetime, argparse
+import socket, time, datetime, argparse, asyncio, multiprocessing, threading
+from array import array
+from wire import HEADER, MAX_DATAGRAM, HELLO, HELLO_ACK, BOOP, SYNC, SYNC_ACK, ACK, KIND_NAMES, text_reply, binary_reply
+from timestamps import ANC_SIZE, enable_rx_timestamps, rx_timestamp
 
 # I will need to use 2 different connection types to compare their delays
 # "both wired and wireless interfaces (e.g., eth0 vs wlan0)"
 def parse_args():
     ap = argparse.ArgumentParser()
     ap.add_argument("--host", required=True, help="server IP")
-    ap.add_argument("--port", type=int, default=5001)   
+    ap.add_argument("--port", type=int, default=5001)
+    ap.add_argument("--mode", choices=["blocking", "asyncio"], default="blocking",
+                    help="blocking: one client at a time, asyncio: many concurrent clients")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="asyncio mode only: worker processes sharing the port with SO_REUSEPORT")
+    ap.add_argument("--backlog", type=int, default=1024, help="asyncio mode only: listen backlog")
+    ap.add_argument("--transport", choices=["tcp", "udp"], default="tcp",
+                    help="udp: binary frames, one per datagram (--mode is ignored, --workers still applies)")
+    ap.add_argument("--batch", type=int, default=64, help="udp only: max datagrams drained per wakeup")
+    ap.add_argument("--log", default=None,
+                    help="write every server record (kind,seq,t1) to this CSV, one file per worker")
+    ap.add_argument("--no-kernel-ts", action="store_true",
+                    help="always stamp t1 in user space, even when SO_TIMESTAMPNS is available")
     return ap.parse_args()
 
 
-def run():
-    args = parse_args()
-    HOST = args.host
-    PORT = args.port
+class RecordRing:
+    """
+    server records (reply kind, seq, t1, kernel stamped) kept in preallocated arrays used as a ring
+    the reply path only stores four numbers, a background thread formats them and does the
+    terminal / file I/O. if the writer falls a whole ring behind, new records are dropped
+    (and counted) instead of blocking replies
+    one producer (the serving thread) and one consumer (the writer), so no locks needed
+    """
+    def __init__(self, capacity=1 << 16, echo=False, path=None, flush=0.1):
+        self.capacity = capacity
+        self.kind = array("B", bytes(capacity))
+        self.seq = array("Q", bytes(8 * capacity))
+        self.t1 = array("q", bytes(8 * capacity))
+        self.kernel = array("B", bytes(capacity))
+        self.head = 0  # next slot the producer writes
+        self.tail = 0  # next slot the writer reads
+        self.dropped = 0
+        self.echo = echo
+        self.flush = flush
+
+        self.f = open(path, "w") if path else None
+        if self.f:
+            self.f.write("kind,seq,t1_ns,t1_source\n")
+        self.stop = threading.Event()
+        self.writer = threading.Thread(target=self._run, daemon=True)
+        self.writer.start()
+
+    def push(self, kind, seq, t1, kernel):
+        head = self.head
+        if head - self.tail >= self.capacity:
+            self.dropped += 1
+            return
+        i = head % self.capacity
+        self.kind[i] = kind
+        self.seq[i] = seq
+        self.t1[i] = t1
+        self.kernel[i] = kernel
+        self.head = head + 1
+
+    def _drain(self):
+        head = self.head
+        if head == self.tail:
+            return
+        echo_lines, csv_lines = [], []
+        for n in range(self.tail, head):
+            i = n % self.capacity
+            name = KIND_NAMES[self.kind[i]]
+            if self.echo:
+                echo_lines.append(f"{name},{self.seq[i]},t1={self.t1[i]}\n")
+            if self.f:
+                csv_lines.append(f"{name},{self.seq[i]},{self.t1[i]},{'kernel' if self.kernel[i] else 'user'}\n")
+        self.tail = head
+        if echo_lines:
+            print("".join(echo_lines), end="", flush=True)
+        if csv_lines:
+            self.f.write("".join(csv_lines))
+            self.f.flush()
+
+    def _run(self):
+        while not self.stop.wait(self.flush):
+            self._drain()
+        self._drain()
+
+    def close(self):
+        self.stop.set()
+        self.writer.join()
+        if self.f:
+            self.f.close()
+        if self.dropped:
+            print(f"[SERVER] log writer fell behind, dropped {self.dropped} records")
+
+
+def worker_log_path(path, worker):
+    """one log per worker process, logs/server.csv -> logs/server.w1.csv"""
+    if not path:
+        return path
+    stem, dot, ext = path.rpartition(".")
+    return f"{stem}.w{worker}.{ext}" if dot else f"{path}.w{worker}"
+
+
+class Session:
+    """
+    per connection parser shared by the blocking and asyncio modes
+    bytes are received straight into a preallocated buffer (recv_into / get_buffer),
+    text lines are answered until the client sends HELLO,bin, binary frames after that
+    """
+    def __init__(self, size=1 << 17, ring=None):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.filled = 0
+        self.binary = False
+        self.ring = ring
+
+    def free_view(self):
+        """the part of the buffer the next recv_into should write to"""
+        if self.filled == len(self.buf):
+            # one message bigger than the buffer (huge text padding), grow it
+            bigger = bytearray(2 * len(self.buf))
+            bigger[:self.filled] = self.buf
+            self.buf = bigger
+            self.view = memoryview(self.buf)
+        return self.view[self.filled:]
 
+    def consume(self, nbytes, t_kernel=None) -> bytes:
+        """
+        parse everything complete after nbytes more were received, returns the replies to send
+        t_kernel: kernel receive time of this chunk, used as t1 for every message it completes
+        """
+        self.filled += nbytes
+        buf = self.buf
+        replies = []
+        start = 0
+        while start < self.filled:
+            if self.binary:
+                if self.filled - start < HEADER.size:
+                    break
+                kind, tag, pad_len, seq, _ = HEADER.unpack_from(buf, start)
+                end = start + HEADER.size + pad_len
+                if end > self.filled:
+                    break
+                t1 = t_kernel or time.time_ns()  # server receive time
+                replies.append(binary_reply(kind, seq, t1, tag))
+                if self.ring:
+                    self.ring.push(SYNC_ACK if kind == SYNC else ACK, seq, t1, t_kernel is not None)
+                start = end
+                continue
+
+            # since TCP is a data stream, we gotta listen for whole line
+            end = buf.find(b"\n", start, self.filled)
+            if end < 0:
+                break
+            line = buf[start:end].decode().strip()
+            start = end + 1
+            if not line:
+                continue
+            if line == HELLO.decode().strip():
+                replies.append(HELLO_ACK)
+                self.binary = True
+                continue
+
+            # client should send BOOP,{seq},t0={t0},{padding}
+            # or SYNC,{round},t0={t0}
+            parts = line.split(",", 2)
+            t1 = t_kernel or time.time_ns()  # server receive time
+            kind = SYNC if parts[0] == "SYNC" else BOOP
+            seq = int(parts[1])
+            replies.append(text_reply(kind, seq, t1))
+            if self.ring:
+                self.ring.push(SYNC_ACK if kind == SYNC else ACK, seq, t1, t_kernel is not None)
+
+        # keep the incomplete tail at the front of the buffer
+        rest = self.filled - start
+        if start and rest:
+            buf[:rest] = buf[start:self.filled]
+        self.filled = rest
+        return b"".join(replies)
+
+
+def run_blocking(HOST, PORT, log_path, kernel_ts):
     # AF_INET: address family for IPv4, SOCK_STREAM: TCP
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
 
@@ -26,36 +195,197 @@ def run():
         print("[SERVER] connection accepted from:", addr)
         conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-        # since TCP is a data stream, we gotta listen for whole line
-        buffer = ""
-        while True:
-            data = conn.recv(1024)
-            if not data:
-                break  # connection closed
-            buffer += data.decode()
-
-            # process all complete lines
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                line = line.strip()
-                if not line:
-                    continue
-
-                # client should send BOOP,{seq},t0={t0},{padding}
-                # or SYNC,{round},t0={t0}
-                parts = line.split(",", 2)
-                t1 = time.time_ns()  # server receive time
-                seq = parts[1]
-
-                if parts[0] == "SYNC":
-                    reply = f"SYNC_ACK,{seq},t1={t1}"
-                    
+        # kernel receive timestamps: t1 is when the segment reached the stack,
+        # not when python got around to parsing it
+        kernel_ts = kernel_ts and enable_rx_timestamps(conn)
+        print(f"[SERVER] t1 source: {'kernel (SO_TIMESTAMPNS)' if kernel_ts else 'user space'}")
+
+        # replies are echoed by the ring's writer thread, not from this loop
+        ring = RecordRing(echo=True, path=log_path)
+        session = Session(ring=ring)
+        try:
+            while True:
+                if kernel_ts:
+                    n, anc, _, _ = conn.recvmsg_into([session.free_view()], ANC_SIZE)
+                    t_kernel = rx_timestamp(anc)
                 else:
-                    
-                    reply = f"ACK,{seq},t1={t1}"
-                conn.sendall((reply+"\n").encode())
-                print(reply)
+                    n = conn.recv_into(session.free_view())
+                    t_kernel = None
+                if not n:
+                    break  # connection closed
+                out = session.consume(n, t_kernel)
+                if out:
+                    conn.sendall(out)
+        finally:
+            ring.close()
+
+
+# ---------- asyncio mode ----------
+class ReflectorProtocol(asyncio.BufferedProtocol):
+    """
+    one instance per client connection, answers every BOOP/SYNC with ACK/SYNC_ACK
+    replies are not printed here, with thousands of streams the terminal would be the bottleneck
+    the event loop does the reads, so t1 is always stamped in user space in this mode
+    """
+    def __init__(self, ring=None):
+        self.ring = ring
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.session = Session(ring=self.ring)
+        self.peer = transport.get_extra_info("peername")
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print("[SERVER] connection accepted from:", self.peer)
+
+    def get_buffer(self, sizehint):
+        return self.session.free_view()
+
+    def buffer_updated(self, nbytes):
+        # one write per chunk instead of one per message
+        out = self.session.consume(nbytes)
+        if out:
+            self.transport.write(out)
+
+    def connection_lost(self, exc):
+        print("[SERVER] connection closed:", self.peer)
+
+
+def listen_socket(HOST, PORT, backlog, reuseport):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuseport:
+        # every worker binds its own socket, the kernel spreads new connections across them
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind((HOST, PORT))
+    s.listen(backlog)
+    s.setblocking(False)
+    return s
+
+
+async def serve_asyncio(HOST, PORT, backlog, ring, reuseport, worker):
+    sock = listen_socket(HOST, PORT, backlog, reuseport)
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: ReflectorProtocol(ring), sock=sock)
+    print(f"[SERVER] worker {worker} bound host:{HOST} port:{PORT}")
+    async with server:
+        await server.serve_forever()
+
+
+def worker_main(HOST, PORT, backlog, reuseport, worker, log_path):
+    # only log when asked, the asyncio mode does not echo replies
+    ring = RecordRing(path=log_path) if log_path else None
+    try:
+        asyncio.run(serve_asyncio(HOST, PORT, backlog, ring, reuseport, worker))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if ring:
+            ring.close()
+
+
+# ---------- udp ----------
+def serve_udp(HOST, PORT, batch, ring, kernel_ts, reuseport, worker):
+    """
+    one socket answers every client, no accept needed
+    block for the first datagram, then drain up to `batch` more without blocking
+    and send all their replies together
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuseport:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # bursts of probes queue here while we are busy replying
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        s.bind((HOST, PORT))
+        kernel_ts = kernel_ts and enable_rx_timestamps(s)
+        print(f"[SERVER] udp worker {worker} bound host:{HOST} port:{PORT} "
+              f"t1 source: {'kernel (SO_TIMESTAMPNS)' if kernel_ts else 'user space'}")
+
+        buf = bytearray(MAX_DATAGRAM)
+        bufs = [buf]
+        replies = []
+        dontwait = getattr(socket, "MSG_DONTWAIT", 0)
+        if not dontwait:
+            batch = 1  # no non-blocking flag on this platform, one datagram per wakeup
+
+        while True:
+            # block for the first datagram, then drain whatever else is queued without blocking
+            flags = 0
+            while len(replies) < batch:
+                try:
+                    if kernel_ts:
+                        # every datagram carries its own kernel receive time
+                        n, anc, _, addr = s.recvmsg_into(bufs, ANC_SIZE, flags)
+                        t_kernel = rx_timestamp(anc)
+                    else:
+                        n, addr = s.recvfrom_into(buf, 0, flags)
+                        t_kernel = None
+                except BlockingIOError:
+                    break
+                flags = dontwait
+
+                if n < HEADER.size:
+                    continue  # runt datagram, not ours
+                t1 = t_kernel or time.time_ns()  # server receive time
+                kind, tag, _, seq, _ = HEADER.unpack_from(buf)
+                replies.append((binary_reply(kind, seq, t1, tag), addr))
+                if ring:
+                    ring.push(SYNC_ACK if kind == SYNC else ACK, seq, t1, t_kernel is not None)
+
+            for data, addr in replies:
+                s.sendto(data, addr)
+            replies.clear()
+
+
+def udp_worker_main(HOST, PORT, batch, kernel_ts, reuseport, worker, log_path):
+    ring = RecordRing(path=log_path) if log_path else None
+    try:
+        serve_udp(HOST, PORT, batch, ring, kernel_ts, reuseport, worker)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if ring:
+            ring.close()
+
+
+def run_workers(target, args, workers, log_path):
+    """runs target(*args, reuseport, worker, log_path) here, or in `workers` processes sharing the port"""
+    if workers <= 1:
+        target(*args, False, 0, log_path)
+        return
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("[SERVER] SO_REUSEPORT is not available on this platform, use --workers 1")
+
+    procs = []
+    for i in range(workers):
+        p = multiprocessing.Process(target=target, args=(*args, True, i, worker_log_path(log_path, i)), daemon=True)
+        p.start()
+        procs.append(p)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+def run():
+    args = parse_args()
+    HOST = args.host
+    PORT = args.port
+
+    kernel_ts = not args.no_kernel_ts
+
+    if args.transport == "udp":
+        run_workers(udp_worker_main, (HOST, PORT, args.batch, kernel_ts), args.workers, args.log)
+    elif args.mode == "asyncio":
+        run_workers(worker_main, (HOST, PORT, args.backlog), args.workers, args.log)
+    else:
+        run_blocking(HOST, PORT, args.log, kernel_ts)
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
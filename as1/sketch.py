@@ -0,0 +1,102 @@
+"""
+streaming quantiles for OWD samples in constant memory
+
+log-bucketed histogram (HDR histogram / DDSketch style): a value v lands in bucket
+ceil(log_gamma(|v|)) with gamma = (1 + alpha) / (1 - alpha), so every quantile is off by at most
+`alpha` relative error. the buckets are fixed size arrays (one per sign, values under 1ns go to a
+zero bucket), so memory does not grow with the number of samples and two sketches with the same
+alpha merge by adding counts. serialized sparse (only non-empty buckets) into the .owd meta
+"""
+import math
+from array import array
+
+
+class OwdSketch:
+    def __init__(self, alpha=0.01, max_value=1e11):
+        self.alpha = alpha
+        self.max_value = max_value  # ns, larger values are clamped into the last bucket
+        gamma = (1 + alpha) / (1 - alpha)
+        self.gamma = gamma
+        self.log_gamma = math.log(gamma)
+        self.buckets = int(math.ceil(math.log(max_value) / self.log_gamma)) + 1
+        self.pos = array("q", bytes(8 * self.buckets))
+        self.neg = array("q", bytes(8 * self.buckets))
+        self.zero = 0
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, v):
+        return min(self.buckets - 1, int(math.ceil(math.log(v) / self.log_gamma)))
+
+    def _value(self, i):
+        # midpoint of bucket i in the relative error sense
+        return 2 * self.gamma ** i / (self.gamma + 1)
+
+    def add(self, v):
+        if v >= 1:
+            self.pos[self._index(v)] += 1
+        elif v <= -1:
+            self.neg[self._index(-v)] += 1
+        else:
+            self.zero += 1
+        self.n += 1
+        if v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q):
+        """value at quantile q (0..1), None while empty"""
+        if not self.n:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.n - 1)
+        seen = 0
+        # most negative first
+        for i in range(self.buckets - 1, -1, -1):
+            seen += self.neg[i]
+            if seen > rank:
+                return max(self.min, -self._value(i))
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for i in range(self.buckets):
+            seen += self.pos[i]
+            if seen > rank:
+                return min(self.max, self._value(i))
+        return self.max
+
+    def merge(self, other):
+        if (other.alpha, other.buckets) != (self.alpha, self.buckets):
+            raise ValueError("can only merge sketches with the same alpha and range")
+        for i in range(self.buckets):
+            self.pos[i] += other.pos[i]
+            self.neg[i] += other.neg[i]
+        self.zero += other.zero
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_dict(self):
+        sparse = lambda counts: {str(i): c for i, c in enumerate(counts) if c}
+        return {"alpha": self.alpha, "max_value": self.max_value, "n": self.n,
+                "min": self.min if self.n else None, "max": self.max if self.n else None,
+                "zero": self.zero, "pos": sparse(self.pos), "neg": sparse(self.neg)}
+
+    @classmethod
+    def from_dict(cls, d):
+        sk = cls(d["alpha"], d["max_value"])
+        for i, c in d["pos"].items():
+            sk.pos[int(i)] = c
+        for i, c in d["neg"].items():
+            sk.neg[int(i)] = c
+        sk.zero = d["zero"]
+        sk.n = d["n"]
+        if sk.n:
+            sk.min, sk.max = d["min"], d["max"]
+        return sk
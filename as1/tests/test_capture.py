@@ -0,0 +1,82 @@
+import csv
+from capture import ProbeCapture, write_columnar, read_columnar, export_csv
+from clock import ClockEstimator
+
+EPOCH = 1_700_000_000_000_000_000
+OFFSET = 2_500_000
+
+
+def synced_clock():
+    clock = ClockEstimator()
+    clock.add(EPOCH, EPOCH + 50_000 + OFFSET, EPOCH + 100_000)
+    clock.fit()
+    return clock
+
+
+class Stamper:
+    """kernel tx stamps 10us after user space, for even seqs only"""
+    def __init__(self, cap):
+        self.cap = cap
+
+    def t0(self, seq):
+        return self.cap.t0[seq] + 10_000 if seq % 2 == 0 else None
+
+
+def run(clock):
+    cap = ProbeCapture(4, clock)
+    for seq in range(4):
+        cap.pace_err[seq] = seq * 7
+        cap.sent(seq, EPOCH + seq * 1_000_000, 100 + seq)
+    # reordered, lost (2) and duplicated (3), more replies than probes
+    for seq, owd in ((1, 300_000), (0, 200_000), (3, 500_000), (3, 900_000), (1, 400_000)):
+        cap.received(seq, cap.t0[seq] + OFFSET + owd)
+    return cap
+
+
+def test_columns_are_in_arrival_order():
+    clock = synced_clock()
+    cap = run(clock)
+    assert cap.n == 5
+    cols = cap.columns(clock)
+    assert list(cols["seq"]) == [1, 0, 3, 3, 1]
+    assert list(cols["delay"]) == [300_000, 200_000, 500_000, 900_000, 400_000]
+    assert list(cols["payload_bytes"]) == [101, 100, 103, 103, 101]
+    assert list(cols["pacing_error"]) == [7, 0, 21, 21, 7]
+    assert list(cols["time_received"]) == [cols["time_sent"][i] + OFFSET + cols["delay"][i] for i in range(5)]
+    assert "time_sent_user" not in cols
+
+
+def test_kernel_tx_stamps_replace_t0():
+    clock = synced_clock()
+    cap = run(clock)
+    cols = cap.columns(clock, Stamper(cap))
+    assert list(cols["time_sent_user"]) == [cap.t0[s] for s in cols["seq"]]
+    assert [a - b for a, b in zip(cols["time_sent"], cols["time_sent_user"])] == [0, 10_000, 0, 0, 0]
+    assert cols["delay"][1] == 200_000 - 10_000  # measured from the later kernel stamp
+
+
+def test_live_and_final_sketch():
+    clock = synced_clock()
+    cap = run(clock)
+    assert cap.live.n == 5  # every reply, duplicates too
+    sk = cap.sketch(cap.columns(clock))
+    assert sk.n == 3  # first copy of 0, 1, 3
+    assert sk.max == 500_000
+
+
+def test_columnar_log_round_trip(tmp_path):
+    clock = synced_clock()
+    cols = run(clock).columns(clock)
+    meta = {"offset": OFFSET, "drift_ppm": 0.0, "label": "wifi"}
+    path = str(tmp_path / "run.owd")
+    write_columnar(path, cols, meta)
+    back, back_meta = read_columnar(path)
+    assert back_meta == meta
+    assert list(back) == list(cols)
+    assert all(list(back[c]) == list(cols[c]) for c in cols)
+
+    export_csv(str(tmp_path / "run.csv"), back, back_meta)
+    with open(tmp_path / "run.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][3] == f"delay(offset={OFFSET};drift_ppm=0.000)"
+    assert [int(r[0]) for r in rows[1:]] == [1, 0, 3, 3, 1]
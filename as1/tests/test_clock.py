@@ -0,0 +1,47 @@
+import random
+import pytest
+from clock import ClockEstimator
+
+OFFSET = 3_000_000   # server ahead of the client by 3 ms
+DRIFT = 40e-6        # and gaining 40 ppm
+
+
+def exchange(t0, rtt, skew=0.5):
+    """t0, t1, t2 of one SYNC whose forward leg takes skew * rtt"""
+    t1 = t0 + int(rtt * skew) + OFFSET + int(DRIFT * t0)
+    return t0, t1, t0 + rtt
+
+
+def test_offset_and_drift_from_skewed_samples():
+    rng = random.Random(1)
+    est = ClockEstimator(window_ms=1000)
+    for i in range(600):  # 60 s, one exchange every 100 ms
+        # mostly queued exchanges with lopsided legs, a few clean symmetric ones
+        if i % 10 == 0:
+            est.add(*exchange(i * 100_000_000, 200_000))
+        else:
+            est.add(*exchange(i * 100_000_000, rng.randint(2_000_000, 20_000_000), rng.uniform(0.6, 0.95)))
+    offset, drift, t_ref = est.fit()
+    assert len(est.best()) == 60
+    assert all(rtt == 200_000 for _, _, rtt in est.best())  # the min-rtt sample of every window
+    assert drift == pytest.approx(DRIFT, rel=1e-3)
+    for t in (0, 30_000_000_000, 59_000_000_000):
+        assert est.offset_at(t) == pytest.approx(OFFSET + DRIFT * t, abs=1_000)
+
+
+def test_single_window_is_the_min_rtt_offset():
+    est = ClockEstimator(window_ms=5000)
+    est.add(*exchange(0, 9_000_000, 0.9))
+    est.add(*exchange(10_000_000, 100_000))
+    est.add(*exchange(20_000_000, 5_000_000, 0.2))
+    offset, drift, _ = est.fit()
+    assert drift == 0.0
+    assert offset == pytest.approx(OFFSET + DRIFT * 10_000_000, abs=1)
+
+
+def test_negative_rtt_is_ignored_and_empty_fit_raises():
+    est = ClockEstimator()
+    est.add(100, 50, 90)
+    assert est.samples == []
+    with pytest.raises(ValueError):
+        est.fit()
@@ -0,0 +1,58 @@
+import json, math, random
+import pytest
+from sketch import OwdSketch
+
+QS = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999)
+
+
+def samples(seed, n=20_000):
+    """OWD-like ns values: lognormal around 2ms, plus some negative ones (a clock offset off by a bit)"""
+    rng = random.Random(seed)
+    return [rng.lognormvariate(math.log(2e6), 0.8) * (-1 if rng.random() < 0.05 else 1) for _ in range(n)]
+
+
+def exact(xs, q):
+    """the sample the sketch's rank rule points at"""
+    return sorted(xs)[int(q * (len(xs) - 1))]
+
+
+def sketch_of(xs, alpha=0.01):
+    sk = OwdSketch(alpha)
+    for x in xs:
+        sk.add(x)
+    return sk
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_quantiles_within_relative_error(alpha):
+    xs = samples(0)
+    sk = sketch_of(xs, alpha)
+    for q in QS:
+        want = exact(xs, q)
+        assert abs(sk.quantile(q) - want) <= alpha * abs(want) * (1 + 1e-9), q
+    assert (sk.quantile(0), sk.quantile(1)) == (min(xs), max(xs))
+
+
+def test_zero_bucket_and_empty():
+    assert OwdSketch().quantile(0.5) is None
+    sk = sketch_of([0.2, -0.4, 0.0, 5.0])
+    assert sk.quantile(0.5) == 0.0
+
+
+def test_merge_is_the_sketch_of_the_union():
+    a, b = samples(1), samples(2, 5_000)
+    merged = sketch_of(a).merge(sketch_of(b))
+    whole = sketch_of(a + b)
+    assert (merged.n, merged.min, merged.max, merged.zero) == (whole.n, whole.min, whole.max, whole.zero)
+    assert list(merged.pos) == list(whole.pos) and list(merged.neg) == list(whole.neg)
+    for q in QS:
+        assert merged.quantile(q) == whole.quantile(q)
+    with pytest.raises(ValueError):
+        merged.merge(OwdSketch(alpha=0.02))
+
+
+def test_serialized_sketch_round_trips():
+    sk = sketch_of(samples(3, 2_000))
+    back = OwdSketch.from_dict(json.loads(json.dumps(sk.to_dict())))
+    assert [back.quantile(q) for q in QS] == [sk.quantile(q) for q in QS]
+    assert back.n == sk.n
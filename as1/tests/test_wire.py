@@ -0,0 +1,80 @@
+import socket, threading
+import pytest
+from wire import (HEADER, MAX_PAD, BOOP, ACK, SYNC, SYNC_ACK, BinaryWire, TextWire,
+                  binary_reply, text_reply)
+from server import Session
+
+T1 = 1_700_000_000_123_456_789
+
+
+def serve(sess, sock):
+    """one server read: everything that arrived is parsed and answered, t1 fixed to T1"""
+    n = sock.recv_into(sess.free_view())
+    sock.sendall(sess.consume(n, T1))
+
+
+@pytest.fixture
+def pair():
+    cli, srv = socket.socketpair()
+    yield cli, srv
+    cli.close()
+    srv.close()
+
+
+def test_binary_round_trip(pair):
+    cli, srv = pair
+    sess = Session()
+    server = threading.Thread(target=serve, args=(sess, srv))  # negotiate blocks on HELLO_ACK
+    server.start()
+    BinaryWire.negotiate(cli)
+    server.join()
+    assert sess.binary
+
+    w = BinaryWire(cli, 100)
+    assert w.send(BOOP, 7, 123) == HEADER.size + 100
+    assert w.send(SYNC, 2, 456) == HEADER.size
+    serve(sess, srv)
+    assert w.recv() == (ACK, 7, T1)
+    assert w.recv() == (SYNC_ACK, 2, T1)
+
+
+def test_binary_frames_split_across_reads():
+    sess = Session()
+    sess.binary = True
+    frame = HEADER.pack(BOOP, 0, 3, 0xFFFFFFFF, -5) + b"AAA" + HEADER.pack(SYNC, 0, 0, 1, 9)
+    out = b""
+    for i in range(len(frame)):
+        sess.free_view()[0] = frame[i]
+        out += sess.consume(1, T1)
+        if i < HEADER.size + 2:
+            assert out == b""  # the first frame is not complete yet
+    assert out == binary_reply(BOOP, 0xFFFFFFFF, T1) + binary_reply(SYNC, 1, T1)
+
+
+def test_binary_payload_limit():
+    with pytest.raises(ValueError):
+        BinaryWire(None, 10).set_payload(MAX_PAD + 1)
+
+
+def test_binary_payload_grows_and_shrinks():
+    w = BinaryWire(None, 10)
+    for payload in (50, 4, 200):
+        w.set_payload(payload)
+        assert len(w.frame_view) == HEADER.size + payload
+        assert bytes(w.frame_view[HEADER.size:]) == b"A" * payload
+
+
+def test_text_round_trip(pair):
+    cli, srv = pair
+    w = TextWire(cli, 20)
+    w.send(BOOP, 41, 5)
+    w.send(SYNC, 3, 6)
+    serve(Session(), srv)
+    assert w.recv() == (ACK, 41, T1)
+    assert w.recv() == (SYNC_ACK, 3, T1)
+
+
+def test_replies_decode_to_what_was_encoded():
+    kind, tag, pad, seq, t = HEADER.unpack(binary_reply(SYNC, 12, -1, tag=9))
+    assert (kind, tag, pad, seq, t) == (SYNC_ACK, 9, 0, 12, -1)
+    assert text_reply(BOOP, 12, 34) == b"ACK,12,t1=34\n"
@@ -0,0 +1,152 @@
+"""
+kernel socket timestamps (linux only), everything here falls back to None/False elsewhere
+
+rx: SO_TIMESTAMPNS makes the kernel attach the receive time of every packet
+    as SCM_TIMESTAMPNS ancillary data, read it with recvmsg / recvmsg_into
+tx: SO_TIMESTAMPING with TX_SOFTWARE makes the kernel queue the time each send left
+    the stack (handed to the device) on the socket error queue, read with MSG_ERRQUEUE
+"""
+import os, socket, struct, sys, time
+
+LINUX = sys.platform.startswith("linux")
+
+# not exported by the python socket module, values from <asm-generic/socket.h>
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+
+TIMESPEC = struct.Struct("@qq")  # struct timespec { time_t tv_sec; long tv_nsec; } on 64 bit
+ANC_SIZE = socket.CMSG_SPACE(TIMESPEC.size)
+
+# <linux/net_tstamp.h>
+SO_TIMESTAMPING = getattr(socket, "SO_TIMESTAMPING", 37)
+SCM_TIMESTAMPING = SO_TIMESTAMPING
+SOF_TIMESTAMPING_TX_SOFTWARE = 1 << 1
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+SOF_TIMESTAMPING_OPT_ID = 1 << 7
+SOF_TIMESTAMPING_OPT_TSONLY = 1 << 11
+
+# struct sock_extended_err from <linux/errqueue.h>, ee_data carries the OPT_ID of the send
+EXTENDED_ERR = struct.Struct("=IBBBBII")
+SO_EE_ORIGIN_TIMESTAMPING = 4
+TX_ANC_SIZE = socket.CMSG_SPACE(3 * TIMESPEC.size) + socket.CMSG_SPACE(EXTENDED_ERR.size)
+
+
+def enable_rx_timestamps(sock) -> bool:
+    """asks the kernel for nanosecond receive timestamps, returns False if unsupported"""
+    if not LINUX:
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        return True
+    except OSError:
+        return False
+
+
+def rx_timestamp(ancdata):
+    """receive time in ns since the epoch from recvmsg ancillary data, None if not present"""
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPNS and len(data) >= TIMESPEC.size:
+            sec, nsec = TIMESPEC.unpack_from(data)
+            return sec * 1_000_000_000 + nsec
+    return None
+
+
+def enable_tx_timestamps(sock) -> bool:
+    """asks the kernel for software tx timestamps tagged with a per-send id, False if unsupported"""
+    if not LINUX:
+        return False
+    flags = SOF_TIMESTAMPING_TX_SOFTWARE | SOF_TIMESTAMPING_SOFTWARE | SOF_TIMESTAMPING_OPT_ID
+    for extra in (SOF_TIMESTAMPING_OPT_TSONLY, 0):  # TSONLY: do not loop the payload back
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, flags | extra)
+            return True
+        except OSError:
+            continue
+    return False
+
+
+class TxStamper:
+    """
+    tx timestamps for the probes sent on one socket
+    the kernel tags every stamp with an id (OPT_ID): the datagram index for udp and
+    the byte offset of the last byte of the send for tcp, counted from when stamping was enabled
+    tcp may merge back-to-back sends into one segment, only the last of them gets a stamp,
+    probes without a stamp keep their user space t0
+    the error queue is read after every `train` probes (one burst), not between the probes of a train
+    """
+    def __init__(self, sock, wire, datagram, train=1):
+        self.wire = wire
+        self.datagram = datagram
+        self.train = max(1, train)
+        self.enabled = enable_tx_timestamps(sock)
+        # the error queue is read through a dup so the probe socket's blocking/timeout mode is untouched
+        self.errq = socket.socket(fileno=os.dup(sock.fileno())) if self.enabled else None
+        self.base = self._sent()
+        self.pending = {}  # tx id -> seq
+        self.stamps = {}   # seq -> ns
+
+    def _sent(self):
+        return self.wire.tx_msgs if self.datagram else self.wire.tx_bytes
+
+    def sent(self, seq):
+        """call right after each probe is sent"""
+        if not self.enabled:
+            return
+        key = (self._sent() - self.base - 1) & 0xFFFFFFFF
+        self.pending[key] = seq
+        if (seq + 1) % self.train == 0:
+            self.drain()
+
+    def drain(self):
+        """reads every stamp already queued, never blocks"""
+        flags = socket.MSG_ERRQUEUE | socket.MSG_DONTWAIT
+        while True:
+            try:
+                _, anc, _, _ = self.errq.recvmsg(1, TX_ANC_SIZE, flags)
+            except (BlockingIOError, InterruptedError):
+                return
+            ts = key = None
+            for level, kind, data in anc:
+                if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPING:
+                    sec, nsec = TIMESPEC.unpack_from(data)  # ts[0] is the software stamp
+                    ts = sec * 1_000_000_000 + nsec
+                elif len(data) >= EXTENDED_ERR.size:
+                    _, origin, _, _, _, _, ee_data = EXTENDED_ERR.unpack_from(data)
+                    if origin == SO_EE_ORIGIN_TIMESTAMPING:
+                        key = ee_data
+            if key not in self.pending:
+                continue
+            if not self.datagram:
+                # older tcp sends merged into this segment will never get their own stamp
+                for k in list(self.pending):
+                    if k == key:
+                        break
+                    del self.pending[k]
+            seq = self.pending.pop(key)
+            if ts:
+                self.stamps[seq] = ts
+
+    def finish(self, timeout=0.2):
+        """waits a little for the last stamps, stamps that arrive later are ignored"""
+        if not self.enabled:
+            return
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            self.drain()
+            time.sleep(0.001)
+        self.pending.clear()
+
+    def reset(self):
+        """forgets the stamps of the last run, seqs start over at 0 in the next one"""
+        self.pending.clear()
+        self.stamps.clear()
+
+    def close(self):
+        """stops reading the error queue"""
+        if self.errq:
+            self.errq.close()
+            self.errq = None
+
+    def t0(self, seq):
+        """kernel send time of this probe, None if it has no stamp"""
+        return self.stamps.get(seq)
@@ -0,0 +1,219 @@
+"""
+wire formats shared by client.py and server.py
+
+text (default, the original protocol), one line per message:
+  BOOP,{seq},time_sent={t0},{padding}     -> ACK,{seq},t1={t1}
+  SYNC,{round},t0={t0}                    -> SYNC_ACK,{round},t1={t1}
+
+binary (negotiated per connection):
+  client sends the text line HELLO,bin and waits for HELLO_ACK,bin,
+  after that both sides only exchange fixed size frames:
+    header: type (u8), flags (u8), pad_len (u16), seq (u32), t_ns (i64)  = 16 bytes
+    followed by pad_len bytes of padding (only BOOP carries padding)
+  for BOOP/SYNC t_ns is the client send time, for ACK/SYNC_ACK it is the server receive time
+  flags is the client's run tag, the server copies it into the reply
+
+udp: the same binary frames, one per datagram, no HELLO needed. every run of a sweep gets a new
+tag (new_run), so a late reply to an earlier run is dropped instead of counted in the current one
+"""
+import struct, socket
+
+HEADER = struct.Struct("!BBHIq")
+BOOP, ACK, SYNC, SYNC_ACK = 1, 2, 3, 4
+MAX_PAD = 0xFFFF
+MAX_DATAGRAM = 65507  # largest IPv4 UDP payload
+
+HELLO = b"HELLO,bin\n"
+HELLO_ACK = b"HELLO_ACK,bin\n"
+
+KIND_NAMES = {BOOP: "BOOP", ACK: "ACK", SYNC: "SYNC", SYNC_ACK: "SYNC_ACK"}
+KIND_CODES = {v: k for k, v in KIND_NAMES.items()}
+
+
+def recv_exact_into(sock, view) -> bool:
+    """fill the whole memoryview from the socket, returns False if the peer closed first"""
+    got = 0
+    n = len(view)
+    while got < n:
+        r = sock.recv_into(view[got:])
+        if r == 0:
+            return False
+        got += r
+    return True
+
+
+class TextWire:
+    """the original line protocol, kept as the fallback"""
+    name = "text"
+
+    def __init__(self, s, payload):
+        self.s = s
+        self.pad = "A" * max(payload, 0)
+        self.set_payload(payload)
+        self.buffer = b""
+        self.tx_bytes = self.tx_msgs = 0
+
+    def set_payload(self, payload):
+        """padding of the following BOOPs, sliced from the longest padding built so far"""
+        if payload > len(self.pad):
+            self.pad = "A" * payload
+        self.padding = self.pad[:max(payload, 0)]
+
+    def send(self, kind, seq, t0):
+        """sends one BOOP or SYNC, returns the message size in bytes"""
+        if kind == BOOP:
+            msg = f"BOOP,{seq},time_sent={t0},{self.padding}"
+        else:
+            msg = f"SYNC,{seq},t0={t0}"
+        data = msg.encode()
+        self.s.sendall(data + b"\n")
+        self.tx_bytes += len(data) + 1
+        self.tx_msgs += 1
+        return len(data)
+
+    def recv(self):
+        """reads one reply line, returns (kind, seq, t1) or None if the server closed"""
+        while b"\n" not in self.buffer:
+            data = self.s.recv(4096)
+            if not data:
+                return None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+
+        # expect "ACK,{seq},t1={t1}" or "SYNC_ACK,{seq},t1={t1}"
+        parts = line.decode().strip().split(",", 2)
+        return KIND_CODES[parts[0]], int(parts[1]), int(parts[2].split("t1=", 1)[1])
+
+
+class BinaryWire:
+    """fixed struct frames, sent from and received into preallocated buffers"""
+    name = "binary"
+
+    def __init__(self, s, payload):
+        self.s = s
+        # padding is written once, every BOOP only rewrites the header in place
+        self.frame = bytearray(HEADER.size + payload)
+        self.frame[HEADER.size:] = b"A" * payload
+        self.header_view = memoryview(self.frame)[:HEADER.size]
+        self.set_payload(payload)
+        self.reply = bytearray(HEADER.size)
+        self.reply_view = memoryview(self.reply)
+        self.tx_bytes = self.tx_msgs = 0
+        self.tag = 0
+        self.stale = 0  # replies dropped for carrying another run's tag
+
+    def new_run(self):
+        """next run tag (1..255, 0 is the sync phase before the first run)"""
+        self.tag = self.tag % 255 + 1
+
+    def set_payload(self, payload):
+        """padding of the following BOOPs, a smaller payload just sends a shorter view of the frame"""
+        if payload > MAX_PAD:
+            raise ValueError(f"binary wire supports at most {MAX_PAD} bytes of padding")
+        if HEADER.size + payload > len(self.frame):
+            # a bytearray can't grow while views of it are alive
+            self.header_view.release()
+            if hasattr(self, "frame_view"):
+                self.frame_view.release()
+            self.frame.extend(b"A" * (HEADER.size + payload - len(self.frame)))
+            self.header_view = memoryview(self.frame)[:HEADER.size]
+        self.payload = payload
+        self.frame_view = memoryview(self.frame)[:HEADER.size + payload]
+
+    @staticmethod
+    def negotiate(s):
+        """asks the server to switch this connection to binary frames"""
+        s.sendall(HELLO)
+        reply = bytearray(len(HELLO_ACK))
+        if not recv_exact_into(s, memoryview(reply)) or bytes(reply) != HELLO_ACK:
+            raise RuntimeError(f"server did not accept binary wire: {bytes(reply)!r}")
+
+    def send(self, kind, seq, t0):
+        """sends one BOOP or SYNC, returns the frame size in bytes"""
+        self.tx_msgs += 1
+        if kind == BOOP:
+            HEADER.pack_into(self.frame, 0, BOOP, self.tag, self.payload, seq, t0)
+            self.s.sendall(self.frame_view)
+            self.tx_bytes += len(self.frame_view)
+            return len(self.frame_view)
+        HEADER.pack_into(self.frame, 0, kind, self.tag, 0, seq, t0)
+        self.s.sendall(self.header_view)
+        self.tx_bytes += HEADER.size
+        return HEADER.size
+
+    def recv(self):
+        """reads one reply frame, returns (kind, seq, t1) or None if the server closed"""
+        if not recv_exact_into(self.s, self.reply_view):
+            return None
+        kind, _, _, seq, t1 = HEADER.unpack_from(self.reply)
+        return kind, seq, t1
+
+
+class DatagramWire(BinaryWire):
+    """binary frames over a connected UDP socket, recv gives up after `timeout` seconds"""
+    name = "udp"
+
+    def __init__(self, s, payload, timeout=1.0):
+        super().__init__(s, payload)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        s.settimeout(timeout)
+
+    def set_payload(self, payload):
+        if HEADER.size + payload > MAX_DATAGRAM:
+            raise ValueError(f"udp supports at most {MAX_DATAGRAM - HEADER.size} bytes of padding")
+        super().set_payload(payload)
+
+    def recv(self):
+        """reads one reply datagram of the current run, returns (kind, seq, t1) or None on timeout"""
+        while True:
+            try:
+                n = self.s.recv_into(self.reply_view)
+            except socket.timeout:
+                return None
+            if n < HEADER.size:
+                continue  # runt datagram, not ours
+            kind, tag, _, seq, t1 = HEADER.unpack_from(self.reply)
+            if tag != self.tag:
+                self.stale += 1  # late reply to an earlier run
+                continue
+            return kind, seq, t1
+
+
+def delivery_stats(seqs, expected):
+    """
+    per-seq accounting over replies in arrival order
+      received:   distinct seqs that came back
+      lost:       seqs that never came back
+      duplicates: extra copies of a seq already seen
+      reordered:  first copies that arrived after a higher seq
+    """
+    seen = bytearray(expected)
+    received = duplicates = reordered = 0
+    highest = -1
+    for seq in seqs:
+        if seen[seq]:
+            duplicates += 1
+            continue
+        seen[seq] = 1
+        received += 1
+        if seq < highest:
+            reordered += 1
+        else:
+            highest = seq
+    return {"received": received, "lost": expected - received,
+            "duplicates": duplicates, "reordered": reordered}
+
+
+def open_wire(s, name, payload):
+    if name == "binary":
+        BinaryWire.negotiate(s)
+        return BinaryWire(s, payload)
+    return TextWire(s, payload)
+
+
+def text_reply(kind, seq, t1) -> bytes:
+    return f"{'SYNC_ACK' if kind == SYNC else 'ACK'},{seq},t1={t1}\n".encode()
+
+
+def binary_reply(kind, seq, t1, tag=0) -> bytes:
+    return HEADER.pack(SYNC_ACK if kind == SYNC else ACK, tag, 0, seq, t1)
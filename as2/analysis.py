@@ -2,28 +2,50 @@
 convert one run's raw logs to clean CSVs and plots
 inputs (using --run-id prefix):
   <run_id>_iperf.json
-  <run_id>_rtt.txt
-  <run_id>_cwnd.txt
+  <run_id>_rtt.txt          (ping text) or <run_id>_rttprobe.csv (rttprobe.py records, preferred)
+  <run_id>_cwnd.txt         (ss text) or <run_id>_tcpinfo.csv (../shared/tcpinfo.py records, preferred)
+  <run_id>_meta.json        the run's clock epoch, every signal is also aligned on it (timeline.py)
+  <run_id>_background.json  the background load's iperf log, for the per-flow accounting (flows.py)
 
 outputs:
-  <run_id>_throughput.csv  (time_s,throughput_mbps,retrans)
-  <run_id>_rtt.csv         (time_s,rtt_ms)
-  <run_id>_cwnd.csv        (time_s,cwnd_bytes,rtt_ms,bytes_in_flight)
+  results.db               (see store.py) the run's labels, summary row and throughput / rtt / cwnd
+                           series, replaced as a whole in one transaction, plus the size/mtime of the
+                           inputs it came from. the timeline table joins the three on one time axis and
+                           the summary gets the metrics derived from it (RTT inflation, throughput/cwnd
+                           cross-correlation). the flows table has every foreground and background
+                           stream, the summary their fairness (Jain's index, foreground / flavor share)
   <run_id>_throughput.png
   <run_id>_rtt.png
   <run_id>_cwnd.png
-  appends one metadata summary row to results.csv
+  <run_id>_timeline.png    throughput, RTT and cwnd stacked on the common time axis
+  <run_id>_flows.png       throughput of every flow
+  results.csv              (export of the store's results view, one row per run)
+
+plots are written to a temp file and renamed into place, a run whose inputs (and runs.csv row) did
+not change is skipped. runs are analysed in a process pool (--jobs), the parent does the writes
 
 how to use:
-  (only after ensuring that the inputs <run_id>_iperf.json, <run_id>_rtt.txt, <run_id>_cwnd.txt exist)
-  python3 analysis.py --run-id {id}
+  python3 analysis.py                 # every run with an iperf log
+  python3 analysis.py --run-id {id}   # one run
+  python3 analysis.py --force         # redo runs that did not change
 
 
 """
 
-import argparse, json, os, re, statistics, math, csv
+import argparse, os, re, statistics, math, csv
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # pool workers have no display
 import matplotlib.pyplot as plt
+import shared_path  # ../shared on sys.path
+from rttprobe import rtt_stats
+import iperfstream
+import store
+import timeline
+import flows
+
+ANALYSIS_VERSION = 6  # bump when the outputs change, every run is redone once
 
 # ---------- helpers ----------
 def load_run_metadata(run_id: int, runs_csv: str) -> dict:
@@ -41,13 +63,16 @@ def load_run_metadata(run_id: int, runs_csv: str) -> dict:
                 }
     raise ValueError(f"run_id {run_id} not found in {runs_csv}")
 
-def write_csv(path, header, rows):
-    newfile = not os.path.exists(path)
-    with open(path, 'a') as f:
-        if newfile:
-            f.write(','.join(header) + '\n')
-        for r in rows:
-            f.write(','.join('' if v is None else str(v) for v in r) + '\n')
+def replace_file(path, write, mode="w"):
+    """write(f) into a temp file next to path, then rename it over path"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
 def plot_series(x, y, xlabel, ylabel, title, out_png):
     fig = plt.figure()
@@ -56,40 +81,60 @@ def plot_series(x, y, xlabel, ylabel, title, out_png):
     plt.ylabel(ylabel)
     plt.title(title)
     plt.tight_layout()
-    fig.savefig(out_png)
+    replace_file(out_png, lambda f: fig.savefig(f, format="png"), "wb")
+    plt.close(fig)
+
+def plot_timeline(tl, title, out_png):
+    panels = (("throughput_mbps", "throughput (Mbps)"), ("rtt_ms", "RTT (ms)"), ("cwnd_bytes", "cwnd (bytes)"))
+    fig, axes = plt.subplots(len(panels), 1, sharex=True, figsize=(8, 7))
+    for ax, (col, label) in zip(axes, panels):
+        ax.plot(tl["time_s"], tl[col])
+        ax.set_ylabel(label)
+    axes[0].set_title(title)
+    axes[-1].set_xlabel("time since run start (s)")
+    fig.tight_layout()
+    replace_file(out_png, lambda f: fig.savefig(f, format="png"), "wb")
     plt.close(fig)
 
-def percentile(sorted_vals, p):
-    if not sorted_vals:
-        return float('nan')
-    k = (len(sorted_vals)-1) * p
-    f = int(k)
-    c = min(f+1, len(sorted_vals)-1)
-    if f == c:
-        return sorted_vals[f]
-    return sorted_vals[f] + (sorted_vals[c]-sorted_vals[f]) * (k - f)
+def plot_flows(fl, title, out_png):
+    fig = plt.figure()
+    for f in fl["flows"]:
+        # each interval drawn over its whole length, the last one up to its end
+        plt.step(np.append(f["start"], f["end"][-1:]), np.append(f["throughput_mbps"], f["throughput_mbps"][-1:]),
+                 where="post", linewidth=0.8 if f["background"] else 1.6,
+                 label=f"{'bg' if f['background'] else 'fg'} {f['port']} ({f['flavor']})")
+    plt.xlabel("time since run start (s)")
+    plt.ylabel("throughput (Mbps)")
+    plt.title(title)
+    if len(fl["flows"]) <= 10:
+        plt.legend(fontsize="small")
+    plt.tight_layout()
+    replace_file(out_png, lambda f: fig.savefig(f, format="png"), "wb")
+    plt.close(fig)
+
+def percentiles(vals, ps=(90, 95)):
+    """all the percentiles of one series in one numpy pass (linear interpolation), nan when empty"""
+    if len(vals) == 0:
+        return [float("nan")] * len(ps)
+    return [float(v) for v in np.percentile(np.asarray(vals, dtype=float), ps)]
 
 
 # ---------- parsers ----------
 
-def parse_iperf_json(path):
-    with open(path) as f:
-        data = json.load(f)
-    series = []
-    retrans_list = []
-    for itv in data.get("intervals", []):
-        s = itv.get("sum", {})
-        t0 = s.get("start", 0.0)
-        mbps = (s.get("bits_per_second", 0.0) or 0.0)/1e6
-        r = s.get("retransmits", 0) or 0
-        series.append((t0, mbps, r))
-        retrans_list.append(r)
-    tputs = [x[1] for x in series]
+def parse_iperf_json(path, ip=None):
+    """
+    streamed (see ../shared/iperfstream.py), the file is never loaded whole (ip: already loaded)
+    also returns the mean of sum_bidir_reverse (nan for runs without --bidir)
+    """
+    if ip is None:
+        ip = iperfstream.load(path, streams=False)
+    tputs = [bps/1e6 for bps in ip.bps]
+    series = list(zip(ip.start, tputs, ip.retransmits))
     t_mean = statistics.fmean(tputs)
-    t_p90  = percentile(sorted(tputs), 0.90)
-    t_p95  = percentile(sorted(tputs), 0.95) 
-    retrans_total = sum(retrans_list)
-    return series, t_mean, t_p90, t_p95, retrans_total
+    t_p90, t_p95 = percentiles(tputs)
+    retrans_total = sum(ip.retransmits)
+    rev_mean = statistics.fmean(bps/1e6 for bps in ip.rev_bps) if ip.bidir else float("nan")
+    return series, t_mean, t_p90, t_p95, retrans_total, rev_mean
 
 
 def parse_rtt_txt(path):
@@ -127,8 +172,7 @@ def parse_rtt_txt(path):
 
     plain = [v for _, v in rtt_vals]
     r_mean = statistics.fmean(plain) if plain else float("nan")
-    r_p90  = percentile(sorted(plain), 0.90) if plain else float("nan")
-    r_p95  = percentile(sorted(plain), 0.95) if plain else float("nan")
+    r_p90, r_p95 = percentiles(plain)
 
     # build rows with relative time axis
     if rtt_vals and rtt_vals[0][0] is not None:
@@ -148,37 +192,33 @@ def parse_rtt_txt(path):
     return rows, r_mean, r_p90, r_p95, loss_percent
 
 
-def parse_cwnd_txt(cwnd_txt_path):
-    rows = []
-    cur = {"cwnd_bytes": None, "rtt_ms": None}
-
-    def flush_snapshot(t_index):
-        if any(v is not None for v in cur.values()):
-            rows.append([float(t_index), cur["cwnd_bytes"], cur["rtt_ms"]])
-
-    re_cwnd = re.compile(r"\bcwnd:(\d+)\b")
-    re_rtt  = re.compile(r"\brtt:([0-9]+(?:\.[0-9]+)?)")  # first number before slash
-
-    t_index = 0
-    with open(cwnd_txt_path, "r", encoding="utf-8", errors="ignore") as f:
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                flush_snapshot(t_index)
-                cur = {"cwnd_bytes": None, "rtt_ms": None}
-                t_index += 1
-                continue
-
-            m = re_cwnd.search(line)
-            if m:
-                cur["cwnd_bytes"] = int(m.group(1))
+def parse_rttprobe_csv(path):
+    """same return values as parse_rtt_txt, loss counted from the probe sequence"""
+    rows, sent, lost = rtt_stats(path)
+    plain = [v for _, v in rows]
+    r_mean = statistics.fmean(plain) if plain else float("nan")
+    r_p90, r_p95 = percentiles(plain)
+    loss_percent = lost * 100.0 / sent if sent else None
+    return rows, r_mean, r_p90, r_p95, loss_percent
 
-            m = re_rtt.search(line)
-            if m:
-                cur["rtt_ms"] = float(m.group(1))
 
-        # flush last block if file didn’t end with a blank line
-        flush_snapshot(t_index)
+def parse_cwnd_txt(cwnd_txt_path, fg_port=None, data_port=None):
+    """
+    one row per ss snapshot: the foreground data flow, the socket on data_port (the iperf log's
+    local port), not whichever socket happened to be printed last. runs without it in the log fall
+    back to the flow to/from fg_port with the most bytes acked. cwnd in bytes (segments * mss)
+    """
+    snaps = [[fl for fl in snap if "cwnd" in fl] for _, snap in timeline.ss_snapshots(cwnd_txt_path)]
+    by_port = data_port is not None and any(fl["sport"] == data_port for snap in snaps for fl in snap)
+    rows = []
+    for t_index, snap in enumerate(snaps):
+        if by_port:
+            snap = [fl for fl in snap if fl["sport"] == data_port]
+        elif fg_port is not None:
+            snap = [fl for fl in snap if fg_port in (fl["sport"], fl["dport"])]
+        if snap:
+            data = max(snap, key=lambda fl: fl["bytes_acked"])  # the other one is iperf3's control connection
+            rows.append([float(t_index), data["cwnd"] * data["mss"] if data["mss"] else None, data["rtt_ms"]])
 
     cw_vals = [r[1] for r in rows if r[1] is not None]
     cw_med = float(np.median(cw_vals)) if cw_vals else 0.0
@@ -187,72 +227,184 @@ def parse_cwnd_txt(cwnd_txt_path):
     return rows, cw_med, cw_p95
 
 
-def main():
-
-    # changed it to one time run
+def parse_tcpinfo_csv(path, fg_port=None, data_port=None):
+    """same rows as parse_cwnd_txt from tcpinfo.py records: the flow on data_port (else the most bytes acked) per sample"""
+    with open(path, newline="") as f:
+        records = list(csv.DictReader(f))
+    by_port = data_port is not None and any(r["sport"] == str(data_port) for r in records)
+    samples = {}
+    for r in records:
+        if by_port:
+            if r["sport"] != str(data_port):
+                continue  # a background flow, the control connection or the receiving end
+        elif fg_port is not None and str(fg_port) not in (r["sport"], r["dport"]):
+            continue  # a background flow
+        t = int(r["t_ns"])
+        if t not in samples or int(r["bytes_acked"]) > int(samples[t]["bytes_acked"]):
+            samples[t] = r
+    rows = []
+    if samples:
+        t0 = min(samples)
+        for t in sorted(samples):
+            r = samples[t]
+            rows.append([round((t - t0) / 1e9, 3), int(r["cwnd"]) * int(r["snd_mss"]), int(r["srtt_us"]) / 1000.0])
 
-    os.makedirs("logs", exist_ok=True)
-    runs_file = "runs.csv" 
-    results_file = "results.csv"
-    for run in range(1, 57):
-    
-        base = os.path.join("logs",  f"{(run):02d}")
+    cw_vals = [r[1] for r in rows]
+    cw_med = float(np.median(cw_vals)) if cw_vals else 0.0
+    cw_p95 = float(np.percentile(cw_vals, 95)) if cw_vals else 0.0
 
-        iperf_json = base + '_iperf.json'
-        rtt_txt = base + '_rtt.txt'
-        cwnd_txt = base + '_cwnd.txt'
+    return rows, cw_med, cw_p95
 
-        # STEP1: get throughput averages
-        t_series, t_mean, t_p90, t_p95, retrans_total = parse_iperf_json(iperf_json)
-        write_csv(base + '_throughput.csv', ['time_s','throughput_mbps','retrans'], t_series)
 
-        # STEP2: get rtt averages
+def input_signature(base, meta):
+    """what a run's outputs depend on: the raw logs (size, mtime) and its runs.csv row"""
+    inputs = {}
+    for suffix in ("_iperf.json", "_rtt.txt", "_rttprobe.csv", "_cwnd.txt", "_tcpinfo.csv", "_meta.json",
+                   "_background.json"):
+        try:
+            st = os.stat(base + suffix)
+        except OSError:
+            continue
+        inputs[suffix] = [st.st_size, st.st_mtime_ns]
+    return {"version": ANALYSIS_VERSION, "meta": meta, "inputs": inputs}
+
+
+def analyze_run(run, logs_dir="logs", runs_file="runs.csv"):
+    """
+    parses one run's raw logs and draws its plots (safe in a worker process, writes no shared file)
+    returns {meta, summary, series, signature} for store.put_run
+    """
+    base = os.path.join(logs_dir,  f"{(run):02d}")
+
+    iperf_json = base + '_iperf.json'
+    rtt_txt = base + '_rtt.txt'
+    rttprobe_csv = base + '_rttprobe.csv'
+    cwnd_txt = base + '_cwnd.txt'
+    tcpinfo_csv = base + '_tcpinfo.csv'
+
+    # get row info from runs.csv
+    meta = load_run_metadata(run, runs_file)
+    signature = input_signature(base, meta)
+
+    run_meta = timeline.read_meta(base)  # what run_test.py recorded (ports, clock epoch)
+    fg_port = run_meta.get("fg_port")
+
+    # STEP1: get throughput averages (the log is read once, with its streams for the per-flow part)
+    ip = iperfstream.load(iperf_json)
+    t_series, t_mean, t_p90, t_p95, retrans_total, rev_mean = parse_iperf_json(iperf_json, ip)
+    data_port = timeline.data_port(ip, run_meta)  # the foreground data flow's local port
+
+    # STEP2: get rtt averages
+    if os.path.exists(rttprobe_csv):
+        rtt_rows, r_mean, r_p90, r_p95, loss_percent = parse_rttprobe_csv(rttprobe_csv)
+    else:
         rtt_rows, r_mean, r_p90, r_p95, loss_percent= parse_rtt_txt(rtt_txt)
-        write_csv(base + '_rtt.csv', ['time_s','rtt_ms'], rtt_rows)
-
-        # STEP3: get cwnd averages
-        cwnd_rows, cw_med, cw_p95 = parse_cwnd_txt(cwnd_txt)
-        write_csv(base + '_cwnd.csv', ['time_s','cwnd_bytes','rtt_ms'], cwnd_rows)
-
-
-        # STEP4: plot
-        # throughput
-        if t_series:
-            tx = [r[0] for r in t_series]
-            ty = [r[1] for r in t_series]
-            plot_series(tx, ty, 'time (s)', 'throughput (Mbps)', 'Throughput over time', base + '_throughput.png')
-        # rtt
-        if rtt_rows:
-            rx = [r[0] for r in rtt_rows]
-            ry = [r[1] for r in rtt_rows]
-            plot_series(rx, ry, 'time (s)', 'RTT (ms)', 'RTT over time', base + '_rtt.png')
-        # cwnd
-        if cwnd_rows:
-            cx = [r[0] for r in cwnd_rows]
-            cy = [r[1] if r[1] is not None else math.nan for r in cwnd_rows]
-            plot_series(cx, cy, 'time (s)', 'cwnd (bytes)', 'CWND over time', base + '_cwnd.png')
-
-        # get row info from runs.csv
-        meta = load_run_metadata(run, runs_file)
-
-        meta_cols = [
-            "run_id","scenario","link_setup","tcp_flavor","background","bidir","trial",
-            "mean_throughput_mbps","p90_throughput_mbps","p95_throughput_mbps",
-            "mean_rtt_ms","p90_rtt_ms","p95_rtt_ms",
-            "loss_percent","median_cwnd_bytes","p95_cwnd_bytes"
-        ]
-
-        row = [[
-            meta["run_id"], meta["scenario"], meta["link_setup"], meta["tcp_flavor"],
-            meta["background"], meta["bidir"], meta["trial"],
-            f"{t_mean:.3f}", f"{t_p90:.3f}", f"{t_p95:.3f}",
-            f"{r_mean:.3f}", f"{r_p90:.3f}", f"{r_p95:.3f}",
-            f"{loss_percent:.6f}"
-            f"{cw_med:.0f}", f"{cw_p95:.0f}"
-        ]]
-
-        write_csv(results_file, meta_cols, row)
 
+    # STEP3: get cwnd averages
+    if os.path.exists(tcpinfo_csv):
+        cwnd_rows, cw_med, cw_p95 = parse_tcpinfo_csv(tcpinfo_csv, fg_port, data_port)
+    else:
+        cwnd_rows, cw_med, cw_p95 = parse_cwnd_txt(cwnd_txt, fg_port, data_port)
+
+    # the three on the run's common clock
+    src = timeline.load(base, ip)
+    tl = timeline.resample(src)
+    aligned = timeline.derived(tl, src)
+
+    # every foreground and background flow, and how they shared the link
+    fl = flows.load(base, ip, run_meta)
+    fair = flows.fairness(fl, tl["time_s"])
+
+    # STEP4: plot
+    # throughput
+    if t_series:
+        tx = [r[0] for r in t_series]
+        ty = [r[1] for r in t_series]
+        plot_series(tx, ty, 'time (s)', 'throughput (Mbps)', 'Throughput over time', base + '_throughput.png')
+    # rtt
+    if rtt_rows:
+        rx = [r[0] for r in rtt_rows]
+        ry = [r[1] for r in rtt_rows]
+        plot_series(rx, ry, 'time (s)', 'RTT (ms)', 'RTT over time', base + '_rtt.png')
+    # cwnd
+    if cwnd_rows:
+        cx = [r[0] for r in cwnd_rows]
+        cy = [r[1] if r[1] is not None else math.nan for r in cwnd_rows]
+        plot_series(cx, cy, 'time (s)', 'cwnd (bytes)', 'CWND over time', base + '_cwnd.png')
+    # all of them, aligned
+    if len(tl["time_s"]):
+        plot_timeline(tl, 'Throughput, RTT and CWND', base + '_timeline.png')
+    # per flow
+    if fl["flows"]:
+        plot_flows(fl, 'Throughput per flow', base + '_flows.png')
+
+    summary = {
+        "mean_throughput_mbps": round(t_mean, 3), "p90_throughput_mbps": round(t_p90, 3),
+        "p95_throughput_mbps": round(t_p95, 3),
+        "mean_rtt_ms": round(r_mean, 3), "p90_rtt_ms": round(r_p90, 3), "p95_rtt_ms": round(r_p95, 3),
+        "loss_percent": None if loss_percent is None else round(loss_percent, 6),
+        "median_cwnd_bytes": round(cw_med), "p95_cwnd_bytes": round(cw_p95),
+        "mean_reverse_throughput_mbps": None if math.isnan(rev_mean) else round(rev_mean, 3),
+    }
+    summary.update({k: None if math.isnan(v) else round(v, 4) for k, v in {**aligned, **fair}.items()})
+    series = {"throughput": t_series, "rtt": rtt_rows, "cwnd": cwnd_rows, "timeline": timeline.rows(tl),
+              "flows": flows.rows(fl)}
+    return {"meta": meta, "summary": summary, "series": series, "signature": signature}
+
+
+def save_run(db, result):
+    store.put_run(db, result["meta"], result["summary"], result["series"], result["signature"])
+
+
+def is_current(db, run, logs_dir="logs", runs_file="runs.csv"):
+    """True when the store already holds this run from the same inputs"""
+    base = os.path.join(logs_dir, f"{run:02d}")
+    return store.signature(db, run) == input_signature(base, load_run_metadata(run, runs_file))
+
+
+def update_run(db, run, logs_dir="logs", runs_file="runs.csv", force=False):
+    """analyses one run in this process unless it is current, returns whether it was analysed"""
+    if not force and is_current(db, run, logs_dir, runs_file):
+        return False
+    save_run(db, analyze_run(run, logs_dir, runs_file))
+    return True
+
+
+def main():
+    ap = argparse.ArgumentParser(description="per-run plots and the results store from the raw logs")
+    ap.add_argument("--run-id", type=int, default=None, help="only this run (default: every run with an iperf log)")
+    ap.add_argument("--logs", default="logs")
+    ap.add_argument("--runs-file", default="runs.csv")
+    ap.add_argument("--db", default=store.DB, help="results store (sqlite)")
+    ap.add_argument("--results", default="results.csv", help="CSV export of the results view, '' = none")
+    ap.add_argument("--jobs", type=int, default=0, help="worker processes (default: one per cpu)")
+    ap.add_argument("--force", action="store_true", help="redo runs whose inputs did not change")
+    args = ap.parse_args()
+
+    os.makedirs(args.logs, exist_ok=True)
+    if args.run_id is not None:
+        runs = [args.run_id]
+    else:
+        runs = sorted(int(n.split("_")[0]) for n in os.listdir(args.logs)
+                      if n.endswith("_iperf.json") and n.split("_")[0].isdigit())
+
+    db = store.connect(args.db)
+    todo = [run for run in runs if args.force or not is_current(db, run, args.logs, args.runs_file)]
+    failed = 0
+    if todo:
+        # workers parse and plot, the parent is the only writer of the store
+        with ProcessPoolExecutor(max_workers=args.jobs or None) as pool:
+            jobs = {run: pool.submit(analyze_run, run, args.logs, args.runs_file) for run in todo}
+            for run, job in jobs.items():
+                try:
+                    save_run(db, job.result())
+                except Exception as e:
+                    failed += 1
+                    print(f"run {run}: {e!r}")
+
+    if args.results:
+        store.export_csv(db, args.results)
+    print(f"{len(todo) - failed} runs analysed, {len(runs) - len(todo)} unchanged, {failed} failed")
 
 
 if __name__ == '__main__':
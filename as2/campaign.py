@@ -0,0 +1,178 @@
+"""
+runs the whole plan in runs.csv: every pending row through run_test.py, one after the other,
+and analyses each finished run in a background process while the next one is measuring
+
+- a row is done once logs/<run_id>_DONE exists (written after run_test.py exits 0 with an iperf log
+  that has intervals and no "error"),
+  so a crashed or interrupted campaign picks up at the first row without one
+- logs/<run_id>_ANALYZED is written once the row is in results.db (analysis.py update_run()), runs that were
+  measured but not analysed yet (campaign killed in between) are analysed on the next start
+- --warmup / --cooldown seconds of idle link before and after each run
+- every option run_test.py knows can be passed after the campaign ones, it is forwarded as is
+
+how to use:
+  # receiver:
+  iperf3 -s      (or python3 ../shared/trafgen.py -s -p 5201 / -p 5203 with --traffic native)
+
+  # sender:
+  python3 campaign.py --server {ip}
+  python3 campaign.py --server {ip} --runs 1-16,49 --warmup 5 --cooldown 10 --traffic native --sample-hz 100
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import shared_path  # ../shared on sys.path
+import iperfstream
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_runs(spec: str):
+    """'1-16,49' -> {1..16, 49}"""
+    out = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        out.update(range(int(lo), int(hi or lo) + 1))
+    return out
+
+
+def plan_ids(plan_path: str):
+    with open(plan_path, newline="") as f:
+        return [int(row["run_id"]) for row in csv.DictReader(f) if (row.get("run_id") or "").strip()]
+
+
+def marker(outdir: str, run_id: int, kind: str) -> str:
+    return os.path.join(outdir, f"{run_id:02d}_{kind}")
+
+
+def mark(path: str):
+    # written in one go, a crash leaves either no marker or a complete one
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(time.strftime("%Y-%m-%d %H:%M:%S") + "\n")
+    os.replace(tmp, path)
+
+
+def analyze(run_id: int, outdir: str, plan_path: str, db_path: str, results_path: str):
+    """runs in the worker process, numpy/matplotlib are only loaded there"""
+    os.nice(10)  # measurement first
+    import analysis, store
+    db = store.connect(db_path)
+    analysis.update_run(db, run_id, outdir, plan_path)
+    store.export_csv(db, results_path)
+    db.close()
+    mark(marker(outdir, run_id, "ANALYZED"))
+    return run_id
+
+
+def iperf_problem(path: str):
+    """why an iperf log does not count as a finished run, None when it does"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return "no iperf log"
+    try:
+        ip = iperfstream.load(path, streams=False)
+    except ValueError as e:
+        return f"unreadable iperf log ({e})"
+    if "error" in ip.info:
+        return f"iperf error: {ip.info['error']}"
+    if len(ip) == 0:
+        return "no intervals in the iperf log"
+    return None
+
+
+def run_row(args, run_id: int, extra) -> bool:
+    cmd = [sys.executable, os.path.join(HERE, "run_test.py"), "--server", args.server, "--run-id", str(run_id),
+           "--file", args.file, "--outdir", args.outdir, "--duration", str(args.duration)] + extra
+    rc = subprocess.call(cmd)
+    iperf_json = os.path.join(args.outdir, f"{run_id:02d}_iperf.json")
+    problem = f"exit {rc}" if rc != 0 else iperf_problem(iperf_json)
+    if problem:
+        print(f"[campaign] run {run_id} failed ({problem}), it stays pending")
+        return False
+    mark(marker(args.outdir, run_id, "DONE"))
+    return True
+
+
+def main():
+    ap = argparse.ArgumentParser(description="run (and resume) every row of the plan, analysing finished runs in the background",
+                                 allow_abbrev=False)  # unknown options go to run_test.py untouched
+    ap.add_argument("--server", required=True, help="receiver IP")
+    ap.add_argument("--file", default="runs.csv", help="CSV plan file")
+    ap.add_argument("--outdir", default="logs")
+    ap.add_argument("--db", default="results.db", help="results store the analysis writes (see store.py)")
+    ap.add_argument("--results", default="results.csv", help="CSV export of the store, rewritten after every run")
+    ap.add_argument("--duration", type=int, default=60, help="seconds per run")
+    ap.add_argument("--runs", default="", help="only these run IDs, e.g. 1-16,49 (default: the whole plan)")
+    ap.add_argument("--warmup", type=float, default=2, help="idle seconds before each run")
+    ap.add_argument("--cooldown", type=float, default=5, help="idle seconds after each run (queues drain, cwnd caches age)")
+    ap.add_argument("--no-analysis", action="store_true", help="only measure")
+    ap.add_argument("--redo", action="store_true", help="ignore the DONE/ANALYZED markers and run everything again")
+    args, extra = ap.parse_known_args()
+    args.file = os.path.abspath(args.file)
+    args.outdir = os.path.abspath(args.outdir)
+    os.makedirs(args.outdir, exist_ok=True)
+
+    ids = plan_ids(args.file)
+    if args.runs:
+        wanted = parse_runs(args.runs)
+        ids = [i for i in ids if i in wanted]
+    done = lambda i, kind: not args.redo and os.path.exists(marker(args.outdir, i, kind))
+    pending = [i for i in ids if not done(i, "DONE")]
+    backlog = [] if args.no_analysis else [i for i in ids if done(i, "DONE") and not done(i, "ANALYZED")]
+    print(f"[campaign] {len(ids)} rows, {len(ids) - len(pending)} already done, {len(pending)} to run"
+          + (f", {len(backlog)} to analyse" if backlog else ""))
+
+    pool = None if args.no_analysis else ProcessPoolExecutor(max_workers=1)
+    jobs = {}
+
+    def submit(run_id):
+        jobs[run_id] = pool.submit(analyze, run_id, args.outdir, args.file,
+                                    os.path.abspath(args.db), os.path.abspath(args.results))
+
+    def reap(block=False):
+        for run_id, job in list(jobs.items()):
+            if not block and not job.done():
+                continue
+            try:
+                job.result()
+                print(f"[campaign] run {run_id} analysed")
+            except Exception as e:
+                print(f"[campaign] analysis of run {run_id} failed: {e!r}")
+            del jobs[run_id]
+
+    t0 = time.time()
+    failed = []
+    try:
+        for run_id in backlog:
+            submit(run_id)
+        for n, run_id in enumerate(pending, 1):
+            print(f"[campaign] ({n}/{len(pending)}) run {run_id}, warm-up {args.warmup:g}s")
+            time.sleep(args.warmup)
+            if run_row(args, run_id, extra):
+                if pool:
+                    submit(run_id)
+            else:
+                failed.append(run_id)
+            reap()
+            time.sleep(args.cooldown)
+        if pool:
+            reap(block=True)
+    except KeyboardInterrupt:
+        print("\n[campaign] interrupted, start it again to resume")
+        raise SystemExit(130)
+    finally:
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    print(f"[campaign] finished in {time.time() - t0:.0f}s" + (f", failed runs: {failed}" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+per-flow accounting: every sending stream of a run, foreground and background, on the run's clock
+(see timeline.py), and how fairly they shared the bottleneck
+
+sources: <run_id>_iperf.json (foreground) and <run_id>_background.json (the background load's
+iperf3 -J / trafgen log, kept by run_test.py). only the sending streams count (the --bidir reverse
+streams are the other end's), a flow is named by its local port, the sport of its tcpinfo rows
+
+per flow and interval: throughput_mbps, cwnd_bytes (snd_cwnd) and rtt_ms (srtt) as the sender saw
+them at the interval end
+
+fairness, the flows being the columns of one (grid, flow) matrix:
+  flows_count      sending streams, foreground + background
+  jain_index       Jain's index of the flows' mean throughputs, (sum x)^2 / (n * sum x^2), 1 = equal shares
+  jain_index_p10   10th percentile over the grid steps (while the foreground runs) of the index of the
+                   flows active in that step
+  fg_share         foreground bytes / all bytes
+  flavor_share     bytes of the flows running the run's tcp flavor / all bytes (the background can run
+                   another one, e.g. heavy:8/cubic in runs.csv)
+runs with a background load that was not logged (older runs) get none of them
+
+how to use:
+  fl = flows.load("logs/49"); flows.fairness(fl, timeline.resample(timeline.load("logs/49"))["time_s"])
+  python3 flows.py logs/49
+"""
+import argparse, os
+import numpy as np
+import shared_path  # ../shared on sys.path
+import iperfstream
+import timeline
+
+NO_BACKGROUND = ("", "none", "no", "off")
+COLUMNS = ("time_s", "port", "background", "throughput_mbps", "cwnd_bytes", "rtt_ms")
+
+
+def streams(ip, offset: float, background: bool, flavor):
+    """
+    the sending streams of one iperf log as {port, background, flavor, start, end, per interval arrays},
+    each cut to the intervals the stream ran in
+    """
+    ports = {c.get("socket"): c.get("local_port") for c in ip.info.get("start", {}).get("connected", [])}
+    start, end = np.asarray(ip.start) + offset, np.asarray(ip.end) + offset
+    out = []
+    for sock, ss in ip.streams.items():
+        if not ss.sender:
+            continue
+        run = slice(ss.first, ss.last + 1)
+        out.append({"port": ports.get(sock, sock), "background": background, "flavor": flavor,
+                    "start": start[run], "end": end[run], "bytes": np.asarray(ss.bytes[run], dtype=float),
+                    "throughput_mbps": np.asarray(ss.bps[run]) / 1e6,
+                    "cwnd_bytes": np.asarray(ss.snd_cwnd[run], dtype=float),
+                    "rtt_ms": np.asarray(ss.rtt[run]) / 1e3})
+    return out
+
+
+def load(base: str, ip=None, meta=None) -> dict:
+    """
+    every sending flow of the run, foreground first. complete is False when the run had a
+    background load without a log of it
+    """
+    meta = timeline.read_meta(base) if meta is None else meta
+    if ip is None:
+        ip = iperfstream.load(base + "_iperf.json")
+    clock = timeline.run_clock(meta, ip)
+    flavor = (meta.get("tcp_flavor_active") or meta.get("tcp_flavor_claimed") or "").lower()
+    out = streams(ip, timeline.iperf_offset(ip, meta, clock), False, flavor)
+
+    bg_json = base + "_background.json"
+    has_bg = (meta.get("background") or "").strip().lower() not in NO_BACKGROUND
+    if os.path.exists(bg_json) and os.path.getsize(bg_json):
+        bg = iperfstream.load(bg_json)
+        out += streams(bg, timeline.iperf_offset(bg, meta, clock, "bg_start_mono_ns"), True,
+                       (meta.get("bg_congestion") or flavor).lower())
+    return {"flows": out, "complete": not has_bg or os.path.exists(bg_json), "flavor": flavor}
+
+
+def rows(fl: dict):
+    """one row per flow and interval for store.put_run (the flows table)"""
+    out = []
+    for f in fl["flows"]:
+        n = len(f["start"])
+        cols = (np.round(f["start"], 6), np.full(n, f["port"]), np.full(n, int(f["background"])),
+                np.round(f["throughput_mbps"], 6), f["cwnd_bytes"], f["rtt_ms"])
+        out.extend(zip(*(c.tolist() for c in cols)))
+    return out
+
+
+def jain(X, axis=-1):
+    """Jain's fairness index along axis, NaN entries are flows that are not there"""
+    n = np.sum(~np.isnan(X), axis=axis)
+    s = np.nansum(X, axis=axis)
+    q = np.nansum(X * X, axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((n > 0) & (q > 0), s * s / (n * q), np.nan)
+
+
+def fairness(fl: dict, grid) -> dict:
+    nan = float("nan")
+    keys = ("flows_count", "jain_index", "jain_index_p10", "fg_share", "flavor_share")
+    F = fl["flows"]
+    if not fl["complete"] or not F:
+        return dict.fromkeys(keys, nan)
+    # (grid, flow): the throughput of every flow at every grid step, NaN when it is not running
+    fg = [f for f in F if not f["background"] and len(f["start"])]
+    if fg:
+        grid = grid[(grid >= min(f["start"][0] for f in fg)) & (grid < max(f["end"][-1] for f in fg))]
+    X = np.column_stack([timeline.interval_value(f["start"], f["end"], f["throughput_mbps"], grid) for f in F])
+    active = np.sum(~np.isnan(X), axis=1)
+    per_step = jain(X[active >= min(2, len(F))], axis=1)
+    per_step = per_step[~np.isnan(per_step)]
+
+    total = np.array([f["bytes"].sum() for f in F])
+    secs = np.array([f["end"][-1] - f["start"][0] if len(f["start"]) else nan for f in F])
+    bg = np.array([f["background"] for f in F])
+    same = np.array([f["flavor"] == fl["flavor"] for f in F])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_mbps = total * 8 / secs / 1e6
+        return {"flows_count": len(F),
+                "jain_index": float(jain(mean_mbps)),
+                "jain_index_p10": float(np.percentile(per_step, 10)) if len(per_step) else nan,
+                "fg_share": float(total[~bg].sum() / total.sum()),
+                "flavor_share": float(total[same].sum() / total.sum())}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="per-flow throughput and fairness of one run")
+    ap.add_argument("base", help="log prefix, e.g. logs/49")
+    a = ap.parse_args()
+    fl = load(a.base)
+    for f in fl["flows"]:
+        rtts = f["rtt_ms"][f["rtt_ms"] > 0]
+        print(f"  port {f['port']} ({'background' if f['background'] else 'foreground'}, {f['flavor'] or '?'}): "
+              f"{f['bytes'].sum() * 8 / 1e6 / max(f['end'][-1] - f['start'][0], 1e-9):.3f} Mbit/s, "
+              f"max cwnd {f['cwnd_bytes'].max(initial=0):.0f}, "
+              f"mean rtt {rtts.mean() if len(rtts) else float('nan'):.3f} ms")
+    if not fl["complete"]:
+        print("background load without a log, no fairness metrics")
+    grid = timeline.resample(timeline.load(a.base))["time_s"]
+    for name, value in fairness(fl, grid).items():
+        print(f"  {name}: {value:.4g}")
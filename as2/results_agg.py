@@ -1,33 +1,100 @@
+"""
+per group (scenario, link_setup, tcp_flavor, background, bidir) statistics over the trials:
+mean (the old results_agg.csv columns), median, std and a bootstrap confidence interval of the mean
+for every metric, e.g. mean_rtt_ms, mean_rtt_ms_median, mean_rtt_ms_std, mean_rtt_ms_ci_lo, mean_rtt_ms_ci_hi
+
+every group and metric is resampled at once: the runs are laid out as a (group, trial, metric) array
+padded with NaN, each batch of resamples is one fancy-index gather of shape
+(resamples, group, trial, metric) followed by a nanmean, no python loop over groups or metrics
+
+how to use:
+  python3 results_agg.py                        # 5000 resamples, 95% CI
+  python3 results_agg.py --resamples 20000 --ci 99 --seed 1
+"""
+import argparse
+import warnings
+import numpy as np
 import pandas as pd
+import store
 
-IN = "results.csv"
+DB = store.DB
 OUT = "results_agg.csv"
 
-df = pd.read_csv(IN)
+num_cols = list(store.SUMMARY)
 
-num_cols = [
-    "mean_throughput_mbps","p90_throughput_mbps","p95_throughput_mbps",
-    "mean_rtt_ms","p90_rtt_ms","p95_rtt_ms",
-    "loss_percent","median_cwnd_bytes","p95_cwnd_bytes"
-]
+key = ["scenario","link_setup","tcp_flavor","background","bidir"]
 
-# convert numeric fields safely
-for c in num_cols:
-    df[c] = pd.to_numeric(df[c], errors="coerce")
+STATS = ("median", "std", "ci_lo", "ci_hi")
 
-key = ["scenario","link_setup","tcp_flavor","background","bidir"]
 
-def agg_fn(g):
-    out = {"runs_count": g.shape[0]}
-    for c in num_cols:
-        # just take the mean across runs (skip NaN)
-        out[c] = g[c].mean(skipna=True)
-    return pd.Series(out)
+def padded(X, codes, n_groups):
+    """(runs, metrics) -> (groups, max trials, metrics), NaN past each group's own trials"""
+    counts = np.bincount(codes, minlength=n_groups)
+    order = np.argsort(codes, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(len(codes)) - offsets[codes[order]]
+    P = np.full((n_groups, max(1, counts.max()), X.shape[1]), np.nan)
+    P[codes[order], pos] = X[order]
+    return P, counts
+
+
+def bootstrap_means(P, counts, resamples, rng, batch=1000):
+    """(resamples, groups, metrics) means of trials drawn with replacement inside each group"""
+    G, T, M = P.shape
+    valid = np.arange(T)[None, :] < counts[:, None]          # (G, T) real trial slots
+    g = np.arange(G)[None, :, None]
+    out = np.empty((resamples, G, M))
+    for lo in range(0, resamples, batch):
+        b = min(batch, resamples - lo)
+        # trial index inside the group, uniform over that group's own trials
+        idx = (rng.random((b, G, T)) * counts[None, :, None]).astype(np.intp)
+        sample = P[g, idx]                                    # (b, G, T, M)
+        sample[:, ~valid] = np.nan                            # a group draws only as many as it has
+        out[lo:lo + b] = np.nanmean(sample, axis=2)
+    return out
+
+
+def aggregate(df, resamples=5000, ci=95.0, seed=0):
+    grp = df.groupby(key, dropna=False, sort=True)
+    codes = grp.ngroup().to_numpy()
+    labels = grp.size().reset_index(name="runs_count")
+    X = df[num_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    P, counts = padded(X, codes, len(labels))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN metrics (e.g. no reverse flow) stay NaN
+        mean = np.nanmean(P, axis=1)
+        median = np.nanmedian(P, axis=1)
+        std = np.nanstd(P, axis=1, ddof=1)
+        boot = bootstrap_means(P, counts, resamples, np.random.default_rng(seed))
+        lo, hi = np.nanpercentile(boot, [(100 - ci) / 2, 100 - (100 - ci) / 2], axis=0)
+
+    cols = {c: mean[:, j] for j, c in enumerate(num_cols)}
+    for name, arr in zip(STATS, (median, std, lo, hi)):
+        cols.update({f"{c}_{name}": arr[:, j] for j, c in enumerate(num_cols)})
+    return pd.concat([labels, pd.DataFrame(cols)], axis=1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="aggregate the trials of every group with bootstrap CIs")
+    ap.add_argument("--resamples", type=int, default=5000)
+    ap.add_argument("--ci", type=float, default=95.0, help="confidence level in percent")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    db = store.connect(DB)
+    df = store.frame(db, "results")
+    agg = aggregate(df, args.resamples, args.ci, args.seed)
+
+    # kept in the store for the plots, and as a CSV
+    cols = key + ["runs_count"] + num_cols + [f"{c}_{s}" for c in num_cols for s in STATS]
+    with db:
+        db.execute("DROP TABLE IF EXISTS results_agg")
+    agg[cols].to_sql("results_agg", db, index=False)
+    agg[cols].to_csv(OUT, index=False)
 
-agg = df.groupby(key, dropna=False).apply(agg_fn).reset_index()
+    print(f"Wrote {OUT} and the results_agg table in {DB} ({len(agg)} groups, {args.resamples} resamples, {args.ci:g}% CI)")
 
-# reorder columns for clean output
-cols = key + ["runs_count"] + num_cols
-agg[cols].to_csv(OUT, index=False)
 
-print(f"Wrote {OUT}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 """
 — runs one experiment run based on a plan row in runs.csv
 - looks up run parameters by --run-id from a CSV
-- runs the iperf3 client (JSON), parallel ping, and CWND snapshots (ss -ti)
-- saves those three raw logs plus a meta.json with the resolved labels
+- runs the iperf3 client (JSON), parallel RTT probing (in-process at --rtt-hz, see ../shared/rttprobe.py;
+  `ping -D -i 0.2` with --rtt ping), and CWND snapshots
+  (in-process tcp_info sampling at --sample-hz, see ../shared/tcpinfo.py; `ss -ti` once a second with --sampler ss)
+- saves those three raw logs plus a meta.json with the resolved labels; with a background load its
+  iperf3 -J output goes to <run_id>_background.json and its flows are sampled along the foreground ones
+- --traffic native runs the built-in generator (../shared/trafgen.py, same JSON layout) instead of the iperf3 client
+- optional: --metrics-port serves live Prometheus metrics (throughput, RTT, cwnd, collector health)
+  on http://127.0.0.1:PORT/metrics while the run is going
 
 how to use:
   # receiver (Mac):
   iperf3 -s
+  # or, for --traffic native (one sink for the foreground and background ports each):
+  python3 ../shared/trafgen.py -s -p 5201
 
   # sender (Linux Omen):
   python3 run_test.py  --server {ip} --run-id {id}
@@ -14,12 +22,20 @@ how to use:
 import argparse
 import csv
 import json
+import math
 import os
 import shlex
 import subprocess
 import re
+import sys
 import time
+from collections import deque
 from typing import Dict
+import shared_path  # ../shared on sys.path
+from metrics import Metrics
+import tcpinfo
+import rttprobe
+import trafgen
 
 
 def truthy(s: str) -> bool:
@@ -33,19 +49,23 @@ def parse_background(background: str):
       heavy-bidir (alias: bidir-heavy)
       heavy:16        -> 16 flows
       heavy:16@5205   -> 16 flows on port 5205
-    Returns dict(enabled, flows, port, bidir)
+      heavy:16/cubic  -> 16 flows running cubic (default: the run's flavor)
+    Returns dict(enabled, flows, port, bidir, cc)
     """
     bg = (background or "").strip().lower()
     if bg in ("", "none", "no", "off"):
-        return {"enabled": False, "flows": 0, "port": 5203, "bidir": False}
+        return {"enabled": False, "flows": 0, "port": 5203, "bidir": False, "cc": None}
     flows = 8
     port = 5203
+    cc = None
     bidir = ("bidir" in bg)
     m = re.search(r":(\d+)", bg)
     if m: flows = max(1, int(m.group(1)))
     m = re.search(r"@(\d+)", bg)
     if m: port = int(m.group(1))
-    return {"enabled": True, "flows": flows, "port": port, "bidir": bidir}
+    m = re.search(r"/(\w+)", bg)
+    if m: cc = m.group(1)
+    return {"enabled": True, "flows": flows, "port": port, "bidir": bidir, "cc": cc}
 
 def active_cc() -> str:
     try:
@@ -88,33 +108,158 @@ def start_rtt(server: str, duration: int, out_path: str) -> subprocess.Popen:
         return subprocess.Popen(shlex.split(cmd), stdout=f, stderr=subprocess.STDOUT)
 
 
-def start_iperf(server: str, duration: int, bidir: bool, out_path: str, port: int = 5201) -> subprocess.Popen:
+def start_iperf(server: str, duration: int, bidir: bool, out_path: str, port: int = 5201,
+                native: bool = False) -> subprocess.Popen:
+    if native:
+        return trafgen.start_client(server, duration, out_path, port, bidir=bidir)
     base = f"iperf3 -J -c {server} -t {duration} -p {port}"
     if bidir:
         base += " --bidir"
     with open(out_path, "w") as f:
         return subprocess.Popen(shlex.split(base), stdout=f, stderr=subprocess.STDOUT)
 
-def start_background_tcp(server: str, duration: int, port: int, flows: int, bidir: bool) -> subprocess.Popen:
-    cmd = f"iperf3 -c {server} -t {duration} -p {port} -P {flows}"
+def start_background_tcp(server: str, duration: int, port: int, flows: int, bidir: bool,
+                         native: bool = False, out_path: str = None, congestion: str = None) -> subprocess.Popen:
+    """the competing load, its JSON (per stream throughput, cwnd, rtt) goes to out_path"""
+    if native:
+        return trafgen.start_client(server, duration, out_path, port, flows, bidir, congestion=congestion)
+    cmd = f"iperf3 -J -c {server} -t {duration} -p {port} -P {flows}"
     if bidir:
         cmd += " --bidir"
-    return subprocess.Popen(shlex.split(cmd), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if congestion:
+        cmd += f" -C {congestion}"
+    if not out_path:
+        return subprocess.Popen(shlex.split(cmd), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(out_path, "w") as f:
+        return subprocess.Popen(shlex.split(cmd), stdout=f, stderr=subprocess.STDOUT)
 
-def sample_cwnd(dst_ip: str, duration: int, out_path: str, fg_port: int = 5201) -> None:
-    cmd = ["ss","-tin","-f","inet","dst", dst_ip, "and", f"( dport = :{fg_port} or sport = :{fg_port} )"]
+def sample_cwnd(dst_ip: str, duration: int, out_path: str, fg_port: int = 5201, on_sample=None,
+                bg_port: int = None) -> None:
+    ports = " or ".join(f"dport = :{p} or sport = :{p}" for p in (fg_port, bg_port) if p)
+    cmd = ["ss","-tin","-f","inet","dst", dst_ip, "and", f"( {ports} )"]
     end_time = time.time() + duration
     with open(out_path, "w") as f:
         while time.time() < end_time:
-            ts = int(time.time()); f.write(f"{ts}\n")
+            ts = time.time(); f.write(f"{ts:.6f}\n")
             try:
-                subprocess.run(cmd, stdout=f, stderr=subprocess.STDOUT, text=True, check=False)
+                out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, check=False).stdout
             except Exception as e:
-                f.write(f"(error: {e})\n")
+                out = f"(error: {e})\n"
+            f.write(out)
             f.write("\n"); f.flush()
+            if on_sample:
+                on_sample(time.time(), out)
             time.sleep(1)
 
 
+# bytes acked that tell a data stream from iperf3's control connection (a few hundred bytes in a run)
+DATA_FLOW_BYTES = 1 << 20
+
+
+class LiveMetrics:
+    """
+    feeds the metrics endpoint from what the run already produces:
+    every ss sample (throughput from bytes_acked deltas, cwnd), the ping log or rttprobe CSV as
+    it grows (rolling RTT percentiles) and the state of the iperf3/ping processes (or prober thread)
+    only the flows to/from fg_port count, the samples also hold the background ones
+    """
+    def __init__(self, metrics: Metrics, rtt_path: str, fg_port: int = 5201, window: int = 50):
+        self.metrics = metrics
+        self.rtt_path = rtt_path
+        self.fg_port = fg_port
+        self.rtt_pos = 0
+        self.rtts = deque(maxlen=window)
+        self.procs = {}
+        self.last_acked = None
+        self.data_port = None  # local port of the foreground data flow, learned from the samples
+        m = metrics
+        m.describe("run_throughput_mbps", "gauge", "foreground throughput over the last ss interval (bytes_acked delta)")
+        m.describe("run_cwnd_segments", "gauge", "cwnd of the foreground data flow")
+        m.describe("run_ss_flows", "gauge", "flows in the last tcp_info/ss sample, 0 means no foreground connection is seen")
+        m.describe("run_ss_samples_total", "counter", "tcp_info/ss samples taken")
+        m.describe("run_rtt_ms", "summary", "RTT over the last samples")
+        m.describe("run_rtt_samples_total", "counter", "echo replies seen so far")
+        m.describe("run_rtt_lost_total", "counter", "echo probes that timed out (rttprobe only)")
+        m.describe("run_process_up", "gauge", "1 while the collector process is running")
+        m.describe("run_process_exit_code", "gauge", "exit code of a collector process that has stopped")
+        m.collector("run", self.collect)
+
+    def watch(self, name: str, proc: subprocess.Popen):
+        self.procs[name] = proc
+
+    def data_flow(self, recs: list):
+        """
+        the foreground data flow of a sample, picked by its local port like the offline analysis does
+        (timeline.data_port). iperf3 only logs its ports when it exits, so the port is the first of our
+        sockets to fg_port that has acked DATA_FLOW_BYTES (the control connection never does), kept for
+        the whole run and saved as fg_data_port in the meta for the analysis to follow
+        """
+        if self.data_port is None:
+            busy = [r["sport"] for r in recs if r["dport"] == self.fg_port and r["bytes_acked"] >= DATA_FLOW_BYTES]
+            if busy:
+                self.data_port = min(busy)
+        return next((r for r in recs if r["sport"] == self.data_port), None)
+
+    def on_tcpinfo(self, t_ns: int, recs: list):
+        recs = [r for r in recs if self.fg_port in (r["sport"], r["dport"])]
+        self.on_flows(t_ns / 1e9, recs)
+
+    def on_ss(self, ts: float, text: str):
+        # socket line (local:port peer:port) followed by its info line, foreground ones only
+        recs = []
+        for sport, dport, info in re.findall(r"^\S+\s+\d+\s+\d+\s+\S+:(\d+)\s+\S+:(\d+).*\n(.*)$", text, re.M):
+            if self.fg_port not in (int(sport), int(dport)):
+                continue
+            acked, cwnd = re.search(r"bytes_acked:(\d+)", info), re.search(r"\bcwnd:(\d+)", info)
+            recs.append({"sport": int(sport), "dport": int(dport), "bytes_acked": int(acked.group(1)) if acked else 0,
+                         "cwnd": int(cwnd.group(1)) if cwnd else None})
+        self.on_flows(ts, recs)
+
+    def on_flows(self, ts: float, recs: list):
+        """one tcp_info or ss sample of the foreground flows ({sport, dport, bytes_acked, cwnd})"""
+        self.metrics.inc("run_ss_samples_total")
+        self.metrics.set("run_ss_flows", len(recs))
+        if not recs:
+            return
+        data = self.data_flow(recs)
+        if data is not None and data["cwnd"] is not None:
+            self.metrics.set("run_cwnd_segments", data["cwnd"])
+        acked = sum(r["bytes_acked"] for r in recs)
+        if self.last_acked and acked >= self.last_acked[1] and ts > self.last_acked[0]:
+            self.metrics.set("run_throughput_mbps", round((acked - self.last_acked[1]) * 8 / (ts - self.last_acked[0]) / 1e6, 3))
+        self.last_acked = (ts, acked)
+
+    def collect(self, m: Metrics):
+        # only the part of the ping log written since the last scrape
+        try:
+            with open(self.rtt_path) as f:
+                f.seek(self.rtt_pos)
+                new = f.read()
+        except OSError:
+            new = ""
+        done = new.rfind("\n") + 1  # a half written line is read again next time
+        self.rtt_pos += len(new[:done].encode())
+        if self.rtt_path.endswith(".csv"):
+            # seq,t_ns,rtt_ns,... rows, rtt_ns = -1 for a lost probe
+            rtts = [int(line.split(",")[2]) for line in new[:done].splitlines() if line[:1].isdigit()]
+            times = [r / 1e6 for r in rtts if r >= 0]
+            m.inc("run_rtt_lost_total", len(rtts) - len(times))
+        else:
+            times = [float(x) for x in re.findall(r"time=([\d.]+) ms", new[:done])]
+        self.rtts.extend(times)
+        m.inc("run_rtt_samples_total", len(times))
+        if self.rtts:
+            s = sorted(self.rtts)
+            for q in (0.5, 0.9, 0.95):
+                m.set("run_rtt_ms", s[min(len(s) - 1, int(q * len(s)))], quantile=q)
+        for name, proc in self.procs.items():
+            # subprocesses, or threads (rttprobe) that are simply up or done
+            rc = proc.poll() if hasattr(proc, "poll") else (None if proc.is_alive() else 0)
+            m.set("run_process_up", 1 if rc is None else 0, process=name)
+            if rc is not None:
+                m.set("run_process_exit_code", rc, process=name)
+
+
 
 def main():
     ap = argparse.ArgumentParser(description="run one iperf3 test using plan row from metadata.csv")
@@ -126,6 +271,19 @@ def main():
     ap.add_argument("--fg-port", type=int, default=5201, help="foreground iperf3 port")
     ap.add_argument("--bg-port", type=int, default=5203, help="background iperf3 port (fallback if row doesn't specify)")
     ap.add_argument("--bg-flows", type=int, default=8, help="default background parallel flows (fallback)")
+    ap.add_argument("--sampler", choices=["tcpinfo", "ss"], default="tcpinfo",
+                    help="cwnd sampling: tcpinfo (in-process netlink sock_diag, falls back to ss if unavailable) or ss")
+    ap.add_argument("--sample-hz", type=float, default=10, help="tcpinfo sampler rate, 10-1000 Hz")
+    ap.add_argument("--rtt", choices=["probe", "ping"], default="probe",
+                    help="RTT: probe (in-process icmp/udp echo, falls back to ping if no icmp socket is allowed) or ping")
+    ap.add_argument("--rtt-hz", type=float, default=100, help="probe only: echoes per second")
+    ap.add_argument("--rtt-port", type=int, default=None,
+                    help="probe only: udp echo to a reflector on this port (python3 ../shared/rttprobe.py --reflect) instead of icmp")
+    ap.add_argument("--traffic", choices=["iperf3", "native"], default="iperf3",
+                    help="native: built-in multi-process generator (../shared/trafgen.py -s on the receiver), no iperf3 needed")
+    ap.add_argument("--idle", type=float, default=0,
+                    help="seconds of RTT probing on the idle link before the traffic starts (baseline for RTT inflation)")
+    ap.add_argument("--metrics-port", type=int, default=0, help="serve live Prometheus metrics on 127.0.0.1:PORT, 0 = off")
     args = ap.parse_args()
 
     # STEP1: read run_id from args and find the run row from metadata.csv
@@ -155,12 +313,22 @@ def main():
 
     # hold the actual iperf log 
     iperf_json = os.path.join(args.outdir, f"{base_name}_iperf.json")
+    bg_json    = os.path.join(args.outdir, f"{base_name}_background.json")
 
-    # the ping delay calculation
+    # the ping delay calculation (ping text, or rttprobe records)
     rtt_txt   = os.path.join(args.outdir, f"{base_name}_rtt.txt")
+    rttprobe_csv = os.path.join(args.outdir, f"{base_name}_rttprobe.csv")
+    use_probe = args.rtt == "probe" and rttprobe.available(args.server, args.rtt_port)
+    if args.rtt == "probe" and not use_probe:
+        print(" in-process RTT probing unavailable (no icmp socket permission, see --rtt-port), falling back to ping")
+    rtt_out = rttprobe_csv if use_probe else rtt_txt
 
-    # the snapshots for cwnd 
+    # the snapshots for cwnd (ss text, or tcp_info records)
     cwnd_txt     = os.path.join(args.outdir, f"{base_name}_cwnd.txt")
+    tcpinfo_csv  = os.path.join(args.outdir, f"{base_name}_tcpinfo.csv")
+    use_tcpinfo = args.sampler == "tcpinfo" and tcpinfo.available()
+    if args.sampler == "tcpinfo" and not use_tcpinfo:
+        print(" tcp_info sampling unavailable (needs linux netlink sock_diag), falling back to ss")
 
     # to verify my actual environment is what it should be
     meta_txt   = os.path.join(args.outdir, f"{base_name}_meta.json")
@@ -178,8 +346,20 @@ def main():
         "bidir": "yes" if bidir_flag else "no",        
         "trial": trial,
         "duration": args.duration,
+        "cwnd_sampler": f"tcpinfo@{args.sample_hz:g}Hz" if use_tcpinfo else "ss@1Hz",
+        "rtt_prober": (f"rttprobe-{'udp' if args.rtt_port else 'icmp'}@{args.rtt_hz:g}Hz" if use_probe else "ping@5Hz"),
+        "traffic": "iperf3" if args.traffic == "iperf3" else "trafgen",
         "server_ip": args.server,
         "plan_file": os.path.abspath(args.file),
+        "idle": args.idle,
+        "fg_port": args.fg_port,
+        "bg_port": bg["port"] if bg["enabled"] else None,
+        "bg_flows": bg["flows"],
+        "bg_congestion": bg["cc"] or (active_cc() if bg["enabled"] else None),
+        # common epoch of the run, taken together: the collectors stamp CLOCK_MONOTONIC (or the
+        # wall clock for ping / ss) and analysis puts every signal on time since this instant
+        "epoch_mono_ns": time.monotonic_ns(),
+        "epoch_wall_ns": time.time_ns(),
     }
     with open(meta_txt, "w") as f:
         json.dump(meta, f, indent=2)
@@ -191,40 +371,79 @@ def main():
     print(f" Active kernel congestion control: {meta['tcp_flavor_active']} (claimed: {tcp_flavor})")
 
     # start our ping and iperf servers
-    rtt_p  = start_rtt(args.server, args.duration, rtt_txt)
-    iperf_p = start_iperf(args.server, args.duration, bidir_flag, iperf_json)
+    rtt_duration = args.duration + math.ceil(args.idle)
+    if use_probe:
+        rtt_p = rttprobe.start_rtt_probe(args.server, rtt_duration, rttprobe_csv, args.rtt_hz, args.rtt_port)
+    else:
+        rtt_p = start_rtt(args.server, rtt_duration, rtt_txt)
+    if args.idle > 0:
+        print(f" Idle baseline: {args.idle:g}s of RTT probing before the traffic")
+        time.sleep(args.idle)
+    native = args.traffic == "native"
+    meta["traffic_start_mono_ns"] = time.monotonic_ns()  # iperf3 only stamps whole seconds
+    iperf_p = start_iperf(args.server, args.duration, bidir_flag, iperf_json, args.fg_port, native)
+
+    live = None
+    if args.metrics_port:
+        metrics = Metrics()
+        live = LiveMetrics(metrics, rtt_out, args.fg_port)
+        live.watch("ping", rtt_p)
+        live.watch("iperf3", iperf_p)
+        metrics.serve(args.metrics_port)
+        print(f" Live metrics on http://127.0.0.1:{args.metrics_port}/metrics")
 
     # iperf can take a sec to establish connection
     time.sleep(1)
 
     bg_p = None
     if bg["enabled"]:
-        print(f" Background load: -P {bg['flows']} on port {bg['port']}" + (" --bidir" if bg["bidir"] else ""))
-        bg_p = start_background_tcp(args.server, args.duration, bg["port"], bg["flows"], bidir=bg["bidir"])
-
-
-    # cwnd sampling that runs in the background
-    sample_cwnd(args.server, args.duration, cwnd_txt)
+        print(f" Background load: -P {bg['flows']} on port {bg['port']}" + (" --bidir" if bg["bidir"] else "")
+              + (f" running {bg['cc']}" if bg["cc"] else ""))
+        meta["bg_start_mono_ns"] = time.monotonic_ns()
+        bg_p = start_background_tcp(args.server, args.duration, bg["port"], bg["flows"], bidir=bg["bidir"], native=native,
+                                    out_path=bg_json, congestion=bg["cc"])
+        if live:
+            live.watch("iperf3_background", bg_p)
+
+
+    # cwnd sampling of the foreground and background flows, runs until the duration is over
+    if use_tcpinfo:
+        ports = [args.fg_port] + ([bg["port"]] if bg["enabled"] else [])
+        tcpinfo.sample_tcpinfo(args.server, args.duration, tcpinfo_csv, ports, args.sample_hz,
+                               on_sample=live.on_tcpinfo if live else None)
+    else:
+        sample_cwnd(args.server, args.duration, cwnd_txt, args.fg_port, on_sample=live.on_ss if live else None,
+                    bg_port=bg["port"] if bg["enabled"] else None)
 
     # wait for iperf
     iperf_rc = iperf_p.wait()
 
-    # make sure the ping stopped
-    try:
-        rtt_p.terminate()
-    except Exception:
-        pass
+    # make sure the ping stopped (the prober stops on its own after the duration)
+    if use_probe:
+        rtt_p.join(timeout=5)
+    else:
+        try:
+            rtt_p.terminate()
+        except Exception:
+            pass
 
     if bg_p is not None:
-        try: bg_p.terminate()
-        except: pass
+        # it started a second later, let it finish so its JSON is complete
+        try: bg_p.wait(timeout=5)
+        except subprocess.TimeoutExpired: bg_p.terminate()
 
     # STEP5: save everything
-    
-    print(f"iperf3 exit code: {iperf_rc}")
+    if live and live.data_port is not None:
+        meta["fg_data_port"] = live.data_port  # the flow the live cwnd followed, analysis picks the same one
+    with open(meta_txt, "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"{args.traffic} exit code: {iperf_rc}")
     print("Saved:")
-    for p in (iperf_json, rtt_txt, cwnd_txt, meta_txt):
+    for p in (iperf_json, rtt_out, tcpinfo_csv if use_tcpinfo else cwnd_txt, meta_txt) + ((bg_json,) if bg_p else ()):
         print(f"    {p}")
+    # a failed iperf3 / trafgen client fails the run (campaign.py retries it)
+    sys.exit(iperf_rc)
 
 if __name__ == "__main__":
     main()
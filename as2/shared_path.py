@@ -0,0 +1,6 @@
+"""puts ../shared (the modules the assignments have in common) on sys.path, import it before them"""
+import os, sys
+
+SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared")
+if SHARED not in sys.path:
+    sys.path.insert(0, SHARED)
@@ -0,0 +1,184 @@
+"""
+local results store (one sqlite file, stdlib only) replacing results.csv and the per-run CSVs
+
+tables:
+  runs        run_id, the runs.csv labels, and the input signature analysis.py skips unchanged runs with
+  summary     run_id + the per-run summary metrics (the old results.csv columns, plus newer ones;
+              columns missing from an older store are added on connect)
+  throughput  time_s, throughput_mbps, retrans          per run
+  rtt         time_s, rtt_ms                            per run
+  cwnd        time_s, cwnd_bytes, rtt_ms                per run (bytes, segments * mss)
+  timeline    time_s, throughput_mbps, rtt_ms, cwnd_bytes, retrans
+                                                        per run, every signal on one grid (timeline.py)
+  flows       time_s, port, background, throughput_mbps, cwnd_bytes, rtt_ms
+                                                        per run, every foreground and background stream (flows.py)
+  results     view: runs + summary, same columns as results.csv
+
+the time series tables are clustered on (scenario, link_setup, tcp_flavor, run_id, i) (WITHOUT ROWID),
+so one scenario / link / flavor slice is a contiguous range read instead of a scan over every run
+
+nothing writes or reads the old per-run CSVs (logs/NN_throughput.csv, NN_rtt.csv, NN_cwnd.csv) any
+more, the store is the only copy. --series DIR exports them from it when a file is wanted
+
+how to use:
+  db = store.connect("results.db")
+  rows = store.query(db, "rtt", ["run_id", "time_s", "rtt_ms"], scenario="heavyBG", tcp_flavor="BBR")
+  df = store.frame(db, "results", link_setup="WiFi-WiFi")          # pandas, only when asked for
+  python3 store.py results.db --csv results.csv                   # export the results view
+  python3 store.py results.db --series logs                       # NN_throughput/rtt/cwnd.csv per run
+"""
+import argparse, csv, json, os, sqlite3
+
+DB = "results.db"
+PARTITION = ("scenario", "link_setup", "tcp_flavor")
+LABELS = ("scenario", "link_setup", "tcp_flavor", "background", "bidir", "trial")
+SUMMARY = ("mean_throughput_mbps", "p90_throughput_mbps", "p95_throughput_mbps",
+           "mean_rtt_ms", "p90_rtt_ms", "p95_rtt_ms",
+           "loss_percent", "median_cwnd_bytes", "p95_cwnd_bytes",
+           "mean_reverse_throughput_mbps",
+           "rtt_baseline_ms", "rtt_inflation_p50", "rtt_inflation_p95", "tput_cwnd_xcorr", "tput_cwnd_lag_s",
+           "flows_count", "jain_index", "jain_index_p10", "fg_share", "flavor_share")
+COUNTS = ("flows_count",)  # INTEGER summary columns, the rest are REAL
+SERIES = {
+    "throughput": ("time_s", "throughput_mbps", "retrans"),
+    "rtt": ("time_s", "rtt_ms"),
+    "cwnd": ("time_s", "cwnd_bytes", "rtt_ms"),
+    "timeline": ("time_s", "throughput_mbps", "rtt_ms", "cwnd_bytes", "retrans"),
+    "flows": ("time_s", "port", "background", "throughput_mbps", "cwnd_bytes", "rtt_ms"),
+}
+
+
+def summary_type(col: str) -> str:
+    return "INTEGER" if col in COUNTS else "REAL"
+
+
+def schema():
+    key = ", ".join(PARTITION)
+    out = [
+        "CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, "
+        + ", ".join(f"{c} TEXT" for c in LABELS) + ", signature TEXT)",
+        f"CREATE INDEX IF NOT EXISTS runs_partition ON runs ({key})",
+        "CREATE TABLE IF NOT EXISTS summary (run_id INTEGER PRIMARY KEY REFERENCES runs(run_id), "
+        + ", ".join(f"{c} {summary_type(c)}" for c in SUMMARY) + ")",
+        # the casts keep counts integers in stores made when every summary column was REAL
+        "CREATE VIEW IF NOT EXISTS results AS SELECT runs.run_id, "
+        + ", ".join(f"runs.{c}" for c in LABELS) + ", "
+        + ", ".join(f"CAST(summary.{c} AS INTEGER) AS {c}" if c in COUNTS else f"summary.{c}" for c in SUMMARY)
+        + " FROM runs JOIN summary USING (run_id)",
+    ]
+    for table, cols in SERIES.items():
+        out.append(f"CREATE TABLE IF NOT EXISTS {table} ({key}, run_id INTEGER, i INTEGER, "
+                   + ", ".join(f"{c} REAL" for c in cols)
+                   + f", PRIMARY KEY ({key}, run_id, i)) WITHOUT ROWID")
+    return out
+
+
+def connect(path: str = DB) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=30)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")  # readers (plots) don't block the analysis writing
+    db.execute("PRAGMA synchronous=NORMAL")
+    with db:
+        for stmt in schema():
+            db.execute(stmt)
+        # summary columns added after the store was created
+        have = {r["name"] for r in db.execute("PRAGMA table_info(summary)")}
+        missing = [c for c in SUMMARY if c not in have]
+        for c in missing:
+            db.execute(f"ALTER TABLE summary ADD COLUMN {c} {summary_type(c)}")
+        # a view from an older version (other columns or no casts) is made again
+        view = next(stmt for stmt in schema() if "VIEW" in stmt)
+        old = db.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'results'").fetchone()
+        if old["sql"] != view.replace(" IF NOT EXISTS", ""):
+            db.execute("DROP VIEW results")
+            db.execute(view)
+    return db
+
+
+def signature(db: sqlite3.Connection, run_id: int):
+    row = db.execute("SELECT signature FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    return json.loads(row["signature"]) if row and row["signature"] else None
+
+
+def put_run(db: sqlite3.Connection, meta: dict, summary: dict, series: dict, sig=None):
+    """replaces everything stored for meta["run_id"] in one transaction"""
+    run_id = int(meta["run_id"])
+    part = tuple(meta[c] for c in PARTITION)
+    with db:
+        old = db.execute(f"SELECT {', '.join(PARTITION)} FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if old:
+            for table in SERIES:
+                db.execute(f"DELETE FROM {table} WHERE " + " AND ".join(f"{c} = ?" for c in PARTITION)
+                           + " AND run_id = ?", (*tuple(old), run_id))
+        db.execute(f"INSERT OR REPLACE INTO runs (run_id, {', '.join(LABELS)}, signature) VALUES "
+                   f"({', '.join('?' * (len(LABELS) + 2))})",
+                   (run_id, *(meta[c] for c in LABELS), json.dumps(sig) if sig is not None else None))
+        db.execute(f"INSERT OR REPLACE INTO summary (run_id, {', '.join(SUMMARY)}) VALUES "
+                   f"({', '.join('?' * (len(SUMMARY) + 1))})",
+                   (run_id, *(summary.get(c) for c in SUMMARY)))
+        for table, cols in SERIES.items():
+            rows = series.get(table) or []
+            db.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * (len(PARTITION) + 2 + len(cols)))})",
+                           ((*part, run_id, i, *r[:len(cols)]) for i, r in enumerate(rows)))
+
+
+def select_sql(table: str, columns=None, **where):
+    """SELECT for one table/view with equality filters (a list/tuple value means IN), ordered by run"""
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM {table}"
+    clauses, params = [], []
+    for col, value in where.items():
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{col} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{col} = ?")
+            params.append(value)
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if table in SERIES:
+        sql += " ORDER BY run_id, i"
+    elif table in ("runs", "summary", "results"):
+        sql += " ORDER BY run_id"
+    return sql, params
+
+
+def query(db: sqlite3.Connection, table: str, columns=None, **where):
+    return db.execute(*select_sql(table, columns, **where)).fetchall()
+
+
+def frame(db: sqlite3.Connection, table: str, columns=None, **where):
+    import pandas as pd
+    sql, params = select_sql(table, columns, **where)
+    return pd.read_sql_query(sql, db, params=params)
+
+
+def export_csv(db: sqlite3.Connection, path: str, table: str = "results", columns=None, **where):
+    rows = db.execute(*select_sql(table, columns, **where))
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow([d[0] for d in rows.description])
+        w.writerows(rows)
+    os.replace(tmp, path)
+
+
+def export_series(db: sqlite3.Connection, out_dir: str, tables=("throughput", "rtt", "cwnd")):
+    """the per-run CSVs the analysis used to write, <run_id>_<table>.csv, from the store"""
+    for (run_id,) in db.execute("SELECT run_id FROM runs ORDER BY run_id").fetchall():
+        for table in tables:
+            export_csv(db, os.path.join(out_dir, f"{run_id:02d}_{table}.csv"), table, SERIES[table], run_id=run_id)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="inspect / export the results store")
+    ap.add_argument("db", nargs="?", default=DB)
+    ap.add_argument("--csv", help="write the results view to this CSV")
+    ap.add_argument("--series", metavar="DIR", help="write every run's throughput / rtt / cwnd series to DIR/NN_<table>.csv")
+    a = ap.parse_args()
+    db = connect(a.db)
+    if a.csv:
+        export_csv(db, a.csv)
+    if a.series:
+        export_series(db, a.series)
+    for table in ("runs", *SERIES):
+        print(f"{table}: {db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]} rows")
@@ -2,8 +2,9 @@ import os
 import re
 import pandas as pd
 import matplotlib.pyplot as plt
+import store
 
-IN_CSV = "results_agg.csv"
+DB = store.DB  # results_agg table, written by results_agg.py
 OUT_DIR = "plots"
 
 def sanitize(name: str) -> str:
@@ -25,8 +26,15 @@ def bar_plot(df, metric, background, link_setup):
     present = [f for f in order if f in subset["tcp_flavor"].unique().tolist()]
     subset = subset.set_index("tcp_flavor").loc[present].reset_index() if present else subset
 
+    # bootstrap CI of the mean over the trials (results_agg.py), when the table has it
+    lo, hi = f"{metric}_ci_lo", f"{metric}_ci_hi"
+    yerr = None
+    if lo in subset.columns and hi in subset.columns:
+        yerr = [(subset[metric] - subset[lo]).clip(lower=0).fillna(0).to_numpy(),
+                (subset[hi] - subset[metric]).clip(lower=0).fillna(0).to_numpy()]
+
     fig = plt.figure()
-    plt.bar(subset["tcp_flavor"], subset[metric])
+    plt.bar(subset["tcp_flavor"], subset[metric], yerr=yerr, capsize=4)
     plt.xlabel("TCP flavor")
     plt.ylabel(metric.replace('_', ' '))
     plt.title(f"{metric.replace('_',' ')} – {background} – {link_setup}")
@@ -69,36 +77,35 @@ def scatter_tradeoff(df):
     return out_path
 
 def main():
-    if not os.path.exists(IN_CSV):
-        raise SystemExit(f"Missing {IN_CSV} in the current directory.")
+    if not os.path.exists(DB):
+        raise SystemExit(f"Missing {DB} in the current directory.")
+    db = store.connect(DB)
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'results_agg'").fetchone():
+        raise SystemExit(f"No results_agg table in {DB}, run results_agg.py first.")
     os.makedirs(OUT_DIR, exist_ok=True)
 
-    df = pd.read_csv(IN_CSV)
-    num_cols = [
-        "mean_throughput_mbps","p90_throughput_mbps","p95_throughput_mbps",
-        "mean_rtt_ms","p90_rtt_ms","p95_rtt_ms",
-        "loss_percent","median_cwnd_bytes","p95_cwnd_bytes"
-    ]
-    ensure_numeric(df, num_cols)
-
-    required = ["scenario","link_setup","tcp_flavor","background","bidir"]
-    for c in required:
-        if c not in df.columns:
-            raise SystemExit(f"Missing required column: {c}")
-
+    num_cols = list(store.SUMMARY)
     outputs = []
 
-    backgrounds = sorted(df["background"].dropna().unique().tolist(), key=lambda x: str(x))
-    link_setups = sorted(df["link_setup"].dropna().unique().tolist(), key=lambda x: str(x))
+    backgrounds = sorted((r[0] for r in db.execute("SELECT DISTINCT background FROM results_agg") if r[0] is not None), key=str)
+    link_setups = sorted((r[0] for r in db.execute("SELECT DISTINCT link_setup FROM results_agg") if r[0] is not None), key=str)
 
     metrics = ["mean_throughput_mbps","mean_rtt_ms","loss_percent","median_cwnd_bytes"]
+    have = {r[1] for r in db.execute("PRAGMA table_info(results_agg)")}
+    ci_cols = [f"{m}_{s}" for m in metrics for s in ("ci_lo", "ci_hi") if f"{m}_{s}" in have]
     for bg in backgrounds:
         for ls in link_setups:
+            # only the rows of this panel
+            df = store.frame(db, "results_agg", ["tcp_flavor", "background", "link_setup"] + metrics + ci_cols,
+                             background=bg, link_setup=ls)
+            ensure_numeric(df, num_cols + ci_cols)
             for metric in metrics:
                 out = bar_plot(df, metric, bg, ls)
                 if out:
                     outputs.append(out)
 
+    df = store.frame(db, "results_agg", ["link_setup", "mean_rtt_ms", "mean_throughput_mbps"])
+    ensure_numeric(df, num_cols)
     out = scatter_tradeoff(df)
     if out:
         outputs.append(out)
@@ -0,0 +1,4 @@
+import os, sys
+
+# the as2 scripts import each other as top level modules (and ../shared through shared_path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
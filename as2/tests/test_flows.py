@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import analysis
+import flows
+import run_test
+import store
+import timeline
+from metrics import Metrics
+
+
+def test_jain_equal_flows_and_one_hog():
+    assert flows.jain(np.full(4, 25.0)) == pytest.approx(1.0)
+    for n in (2, 5, 10):
+        assert flows.jain(np.r_[100.0, np.zeros(n - 1)]) == pytest.approx(1 / n)
+
+
+def test_jain_skips_absent_flows():
+    X = np.array([[10.0, 10.0, np.nan], [30.0, np.nan, np.nan], [np.nan, np.nan, np.nan], [0.0, 0.0, 0.0]])
+    out = flows.jain(X, axis=1)
+    assert out[:2].tolist() == [1.0, 1.0]
+    assert np.isnan(out[2:]).all()
+
+
+def flow(port, mbps, start, end, background=False, flavor="bbr"):
+    s = np.arange(start, end, 1.0)
+    x = np.full(len(s), float(mbps))
+    return {"port": port, "background": background, "flavor": flavor, "start": s, "end": s + 1,
+            "bytes": x * 1e6 / 8, "throughput_mbps": x}
+
+
+def test_fairness_of_a_foreground_and_background_mix():
+    fl = {"complete": True, "flavor": "bbr",
+          "flows": [flow(40002, 60, 0, 10), flow(40010, 20, 0, 10, True, "cubic"), flow(40011, 20, 5, 10, True, "cubic")]}
+    f = flows.fairness(fl, np.arange(0, 10, 0.1))
+    assert f["flows_count"] == 3
+    assert f["fg_share"] == pytest.approx(600 / 900)
+    assert f["flavor_share"] == pytest.approx(600 / 900)
+    assert f["jain_index"] == pytest.approx(flows.jain(np.array([60.0, 20.0, 20.0])))
+    # the late flow is not a zero before it starts (that would be jain(60, 20, 0) = 0.53):
+    # 2 flows for the first half (0.8), 3 after (0.76)
+    assert f["jain_index_p10"] == pytest.approx(flows.jain(np.array([60.0, 20.0, 20.0])))
+
+
+def test_flows_count_stays_an_integer_in_the_store():
+    db = store.connect(":memory:")
+    meta = {"run_id": 1, "scenario": "heavyBG", "link_setup": "WiFi-WiFi", "tcp_flavor": "BBR",
+            "background": "", "bidir": "0", "trial": "0"}
+    store.put_run(db, meta, {"flows_count": 3, "jain_index": 0.5}, {})
+    row = db.execute("SELECT flows_count, jain_index FROM results").fetchone()
+    assert type(row["flows_count"]) is int and row["flows_count"] == 3 and row["jain_index"] == 0.5
+
+
+def test_fairness_needs_the_background_log():
+    f = flows.fairness({"complete": False, "flavor": "bbr", "flows": [flow(1, 5, 0, 3)]}, np.arange(3.0))
+    assert all(np.isnan(v) for v in f.values())
+
+
+TCPINFO = "t_ns,sport,dport,cwnd,srtt_us,snd_mss,bytes_acked,t_mono_ns\n"
+
+
+def tcpinfo_log(path):
+    """per sample: iperf3's control connection, the data flow, a heavy background flow, the loopback receiving end"""
+    lines = [TCPINFO]
+    for k in range(3):
+        t = 1_000_000_000 * (k + 1)
+        for sport, dport, cwnd, acked in ((40000, 5201, 10, 100), (40002, 5201, 50 + k, 10**6 * (k + 1)),
+                                          (40010, 5203, 900, 10**9), (5201, 40002, 10, 0)):
+            lines.append(f"{t},{sport},{dport},{cwnd},2000,1000,{acked},{t}\n")
+    path.write_text("".join(lines))
+
+
+def test_cwnd_follows_the_data_flows_local_port(tmp_path):
+    tcpinfo_log(tmp_path / "01_tcpinfo.csv")
+    base = str(tmp_path / "01")
+    cw = timeline.load_cwnd(base, timeline.Clock(0, 0), port=5201, local_port=40002)
+    assert cw["cwnd_bytes"].tolist() == [50_000.0, 51_000.0, 52_000.0]
+    rows, med, _ = analysis.parse_tcpinfo_csv(base + "_tcpinfo.csv", 5201, 40002)
+    assert [r[1] for r in rows] == [50_000, 51_000, 52_000] and med == 51_000
+    # with no port at all the heavy background flow wins, that is what the local port is for
+    assert timeline.load_cwnd(base, timeline.Clock(0, 0))["cwnd_bytes"].tolist() == [900_000.0] * 3
+    # a port the log does not have falls back to the busiest flow to/from fg_port
+    assert timeline.load_cwnd(base, timeline.Clock(0, 0), 5201, 1)["cwnd_bytes"].tolist() == [50_000.0, 51_000.0, 52_000.0]
+
+
+def test_live_cwnd_follows_the_same_flow(tmp_path):
+    tcpinfo_log(tmp_path / "01_tcpinfo.csv")
+    cols = timeline.read_columns(str(tmp_path / "01_tcpinfo.csv"), ("t_ns", "sport", "dport", "cwnd", "bytes_acked"))
+    m = Metrics()
+    live = run_test.LiveMetrics(m, str(tmp_path / "01_rtt.txt"), fg_port=5201)
+    seen = []
+    for t in np.unique(cols["t_ns"]):
+        at = cols["t_ns"] == t
+        live.on_tcpinfo(int(t), [{k: int(cols[k][i]) for k in ("sport", "dport", "cwnd", "bytes_acked")}
+                                 for i in np.flatnonzero(at)])
+        seen.append(m.values.get(("run_cwnd_segments", ())))
+    # no cwnd until the data flow has acked DATA_FLOW_BYTES, the control connection never gets there
+    # and the background flow is not even a candidate
+    assert live.data_port == 40002 and seen == [None, 51, 52]
+    assert timeline.data_port(None, {"fg_data_port": live.data_port}) == 40002
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+import results_agg
+
+
+def runs():
+    """three groups: 5 trials, 1 trial, 3 trials; only two metrics measured"""
+    rng = np.random.default_rng(7)
+    rows = []
+    for scenario, n, base in (("heavyBG", 5, 50.0), ("idle", 1, 90.0), ("lightBG", 3, 70.0)):
+        for trial in range(n):
+            rows.append({"scenario": scenario, "link_setup": "WiFi-WiFi", "tcp_flavor": "BBR",
+                         "background": "", "bidir": "0", "trial": trial,
+                         "mean_throughput_mbps": base + rng.normal(0, 5), "mean_rtt_ms": 10 + rng.normal(0, 1)})
+    return pd.DataFrame(rows).reindex(columns=[*rows[0], *(c for c in results_agg.num_cols if c not in rows[0])])
+
+
+def test_padded_layout():
+    X = np.arange(10, dtype=float).reshape(5, 2)
+    P, counts = results_agg.padded(X, np.array([1, 0, 1, 2, 1]), 3)
+    assert P.shape == (3, 3, 2)
+    assert list(counts) == [1, 3, 1]
+    assert P[1, :, 0].tolist() == [0.0, 4.0, 8.0]  # group 1 keeps its runs in order
+    assert np.isnan(P[0, 1:]).all() and np.isnan(P[2, 1:]).all()
+
+
+def test_bootstrap_means_shape_and_range():
+    X = np.array([[1.0, 10.0], [3.0, 30.0], [5.0, 50.0], [7.0, 70.0]])
+    P, counts = results_agg.padded(X, np.array([0, 0, 0, 1]), 2)
+    boot = results_agg.bootstrap_means(P, counts, 250, np.random.default_rng(0), batch=100)
+    assert boot.shape == (250, 2, 2)
+    assert (boot[:, 0, 0] >= 1).all() and (boot[:, 0, 0] <= 5).all()
+    assert (boot[:, 1] == [7.0, 70.0]).all()  # one trial, every resample is that trial
+    assert len(np.unique(boot[:, 0, 0])) > 1
+
+
+def test_ci_brackets_the_mean():
+    agg = results_agg.aggregate(runs(), resamples=2000, ci=95)
+    assert list(agg["runs_count"]) == [5, 1, 3]
+    for c in ("mean_throughput_mbps", "mean_rtt_ms"):
+        lo, mean, hi = agg[f"{c}_ci_lo"], agg[c], agg[f"{c}_ci_hi"]
+        assert (lo <= mean + 1e-9).all() and (mean <= hi + 1e-9).all()
+        assert (hi - lo)[agg["runs_count"] > 1].gt(0).all()
+        assert lo[1] == hi[1] == mean[1]  # a single trial has nothing to resample
+    assert agg["loss_percent_ci_lo"].isna().all()  # never measured stays NaN
+
+
+def test_wider_level_wider_interval_and_seeded():
+    df = runs()
+    a, b = results_agg.aggregate(df, 2000, 80, seed=3), results_agg.aggregate(df, 2000, 99, seed=3)
+    c = "mean_throughput_mbps"
+    assert ((b[f"{c}_ci_hi"] - b[f"{c}_ci_lo"]) >= (a[f"{c}_ci_hi"] - a[f"{c}_ci_lo"])).all()
+    pd.testing.assert_frame_equal(a, results_agg.aggregate(df, 2000, 80, seed=3))
+    assert results_agg.aggregate(df, 2000, 80, seed=3)[f"{c}_median"][0] == pytest.approx(
+        df[df.scenario == "heavyBG"][c].median())
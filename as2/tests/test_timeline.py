@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import timeline
+
+nan = np.nan
+
+
+def same(a, b):
+    np.testing.assert_allclose(np.asarray(a, dtype=float), np.asarray(b, dtype=float), equal_nan=True)
+
+
+def test_asof_takes_the_last_sample_unless_stale():
+    t = np.array([1.0, 2.0, 5.0])
+    v = np.array([10.0, 20.0, 50.0])
+    grid = np.array([0.5, 1.0, 1.9, 2.0, 3.5, 4.5, 5.0, 6.0])
+    same(timeline.asof(t, v, grid, max_age=2.0), [nan, 10, 10, 20, 20, nan, 50, 50])
+
+
+def test_interval_value_outside_and_between_intervals():
+    start, end = np.array([0.0, 1.0, 3.0]), np.array([1.0, 2.0, 4.0])
+    v = np.array([1.0, 2.0, 3.0])
+    same(timeline.interval_value(start, end, v, np.array([-0.1, 0.0, 0.99, 1.0, 2.5, 3.2, 4.0])),
+         [nan, 1, 1, 2, nan, 3, nan])
+
+
+def test_window_mean_matches_a_loop():
+    rng = np.random.default_rng(0)
+    t = np.sort(rng.uniform(0, 10, 300))
+    v = rng.normal(size=300)
+    grid = np.arange(0, 10.5, 0.1)
+    want = [v[(t > g - 0.25) & (t <= g)].mean() if ((t > g - 0.25) & (t <= g)).any() else nan for g in grid]
+    same(timeline.window_mean(t, v, grid, 0.25), want)
+
+
+@pytest.mark.parametrize("lag", [-4, 0, 3])
+def test_xcorr_finds_the_shift(lag):
+    rng = np.random.default_rng(1)
+    y = np.convolve(rng.normal(size=220), np.ones(5) / 5, mode="same")[10:210]
+    x = np.roll(y, lag)  # x[n + lag] = y[n]
+    r, k = timeline.xcorr(x, y, 10)
+    assert k == lag
+    assert r > 0.9
+
+
+def test_xcorr_constant_or_too_short_is_nan():
+    assert np.isnan(timeline.xcorr(np.ones(50), np.arange(50.0), 5)).all()
+    assert np.isnan(timeline.xcorr(np.array([1.0, nan, 2.0]), np.array([1.0, 2.0, nan]), 1)).all()
+
+
+def test_resample_puts_every_signal_on_one_grid():
+    src = {"iperf": {"start": np.array([1.0, 2.0]), "end": np.array([2.0, 3.0]),
+                     "throughput_mbps": np.array([100.0, 200.0]), "retrans": np.array([0.0, 4.0])},
+           "rtt": {"t": np.arange(0.0, 3.05, 0.1), "rtt_ms": np.full(31, 5.0)},
+           "cwnd": {"t": np.array([1.0, 1.5, 2.0, 2.5]), "cwnd_bytes": np.array([1e4, 2e4, 3e4, 4e4])}}
+    tl = timeline.resample(src, 0.5)
+    same(tl["time_s"], [0, 0.5, 1, 1.5, 2, 2.5, 3])
+    same(tl["throughput_mbps"], [nan, nan, 100, 100, 200, 200, nan])
+    same(tl["cwnd_bytes"], [nan, nan, 1e4, 2e4, 3e4, 4e4, 4e4])
+    same(tl["rtt_ms"], [5.0] * 7)
+    assert timeline.rows(tl)[0] == (0.0, None, 5.0, None, None)
+
+
+def test_derived_inflation_over_the_idle_baseline():
+    t = np.arange(0.0, 20.0, 0.1)
+    src = {"traffic": (5.0, 15.0), "rtt": {"t": t, "rtt_ms": np.where((t >= 5) & (t <= 15), 30.0, 10.0)}}
+    grid = np.arange(0.0, 20.0, 0.1)
+    tput = np.sin(grid)
+    tl = {"time_s": grid, "throughput_mbps": tput, "cwnd_bytes": np.roll(tput, -2)}
+    d = timeline.derived(tl, src)
+    assert d["rtt_baseline_ms"] == 10.0
+    assert d["rtt_inflation_p50"] == d["rtt_inflation_p95"] == 3.0
+    assert d["tput_cwnd_lag_s"] == pytest.approx(0.2)  # throughput follows cwnd by two steps
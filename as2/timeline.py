@@ -0,0 +1,335 @@
+"""
+one time axis for a run: every collector is put on seconds since the run's epoch (run_test.py
+stores epoch_mono_ns / epoch_wall_ns, taken together, in <run_id>_meta.json) and resampled onto
+one uniform grid, so throughput, RTT and cwnd of the same instant end up on the same row
+
+clocks, best first:
+  rttprobe / tcpinfo rows   t_mono_ns (CLOCK_MONOTONIC), else t_ns (wall clock)
+  iperf intervals           start.timestamp.monotonic_ns (trafgen), else the traffic_start_mono_ns
+                            run_test.py notes when it launches iperf3, else start.timestamp.timesecs
+  ping -D / ss              wall clock of the sample
+runs from before the epoch was recorded use iperf's timesecs as the epoch (whole seconds)
+
+resampling is vectorized (np.searchsorted over the sorted sample times, no loop over the grid):
+  throughput, retrans   the iperf interval the grid point falls in
+  cwnd                  of the foreground data flow, the socket whose local port is the first sending stream's
+                        in the iperf log (start.connected; background flows and iperf3's control connection
+                        are sampled too), as-of join: the last sample at or before the grid point, unless it
+                        is older than two sample periods. in bytes (cwnd * mss), like the cwnd table
+  rtt                   mean of the samples in the grid step ending at the grid point (cumsum windows)
+
+derived per run:
+  rtt_baseline_ms         median RTT before the traffic starts (run_test.py --idle), else the minimum RTT
+  rtt_inflation_p50/p95   RTT during the traffic over that baseline (ratio)
+  tput_cwnd_xcorr         peak normalized cross-correlation of throughput and cwnd within +-MAX_LAG s
+  tput_cwnd_lag_s         its lag, > 0 means throughput follows cwnd
+
+how to use:
+  src = timeline.load("logs/01"); tl = timeline.resample(src); timeline.derived(tl, src)
+  python3 timeline.py logs/01 --step 0.1 --csv 01_timeline.csv
+"""
+import argparse, csv, json, os, re, warnings
+import numpy as np
+import shared_path  # ../shared on sys.path
+import iperfstream
+
+STEP = 0.1          # grid spacing (s)
+MAX_LAG = 5.0       # cross-correlation lags searched (s)
+MIN_IDLE = 5        # idle RTT samples needed for a baseline, else the minimum RTT is used
+COLUMNS = ("time_s", "throughput_mbps", "rtt_ms", "cwnd_bytes", "retrans")
+
+
+class Clock:
+    """seconds since the run's epoch from CLOCK_MONOTONIC or wall clock nanoseconds"""
+    def __init__(self, mono_ns=None, wall_ns=0):
+        self.mono_ns = mono_ns
+        self.wall_ns = wall_ns
+
+    def mono(self, ns):
+        return (np.asarray(ns, dtype=float) - self.mono_ns) / 1e9
+
+    def wall(self, ns):
+        return (np.asarray(ns, dtype=float) - self.wall_ns) / 1e9
+
+
+def read_meta(base: str) -> dict:
+    """the <run_id>_meta.json run_test.py wrote ({} when missing)"""
+    try:
+        with open(base + "_meta.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_columns(path: str, names):
+    """the named integer columns of a CSV with a header, None for the ones it doesn't have"""
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), [])
+    idx = {c: i for i, c in enumerate(header)}
+    have = [c for c in names if c in idx]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # an empty log
+        a = np.loadtxt(path, delimiter=",", skiprows=1, dtype=np.int64, ndmin=2,
+                       usecols=[idx[c] for c in have]) if have else np.empty((0, 0), np.int64)
+    return {c: (a[:, have.index(c)] if c in have else None) for c in names}
+
+
+def times(cols: dict, clock: Clock):
+    """t_mono_ns when the log and the run have it, the wall clock t_ns otherwise"""
+    if cols.get("t_mono_ns") is not None and clock.mono_ns is not None:
+        return clock.mono(cols["t_mono_ns"])
+    return clock.wall(cols["t_ns"])
+
+
+def load_rtt(base: str, clock: Clock) -> dict:
+    probe = base + "_rttprobe.csv"
+    if os.path.exists(probe):
+        c = read_columns(probe, ("t_ns", "rtt_ns", "t_mono_ns"))
+        ok = c["rtt_ns"] >= 0  # lost probes
+        t, v = times(c, clock)[ok], c["rtt_ns"][ok] / 1e6
+    else:
+        pat = re.compile(r"^\[(\d+\.\d+)\].*time[=<]([\d\.]+)\s*ms")
+        pairs = []
+        with open(base + "_rtt.txt") as f:
+            for line in f:
+                m = pat.match(line)
+                if m:
+                    pairs.append((float(m.group(1)), float(m.group(2))))
+        a = np.array(pairs, dtype=float).reshape(-1, 2)
+        t, v = clock.wall(a[:, 0] * 1e9), a[:, 1]
+    order = np.argsort(t, kind="stable")
+    return {"t": t[order], "rtt_ms": v[order]}
+
+
+def data_port(ip, meta=None):
+    """
+    local port of the foreground data flow: the one run_test.py's live metrics followed (fg_data_port
+    in the meta) when it recorded one, else the first sending stream (iperf / trafgen start.connected),
+    None if neither is logged
+    """
+    if meta and meta.get("fg_data_port"):
+        return meta["fg_data_port"]
+    ports = {c.get("socket"): c.get("local_port") for c in ip.info.get("start", {}).get("connected", [])}
+    # without the streams (streams=False) every connected socket counts as sending
+    senders = sorted((s for s, ss in ip.streams.items() if ss.sender), key=str) if ip.streams else sorted(ports, key=str)
+    return next((ports[s] for s in senders if ports.get(s)), None)
+
+
+def load_cwnd(base: str, clock: Clock, port=None, local_port=None) -> dict:
+    """
+    the foreground data flow of every sample: the socket on `local_port` when the log has it,
+    else the flow with the most bytes acked to/from `port` (any when None), for runs without the port
+    """
+    path = base + "_tcpinfo.csv"
+    if os.path.exists(path):
+        c = read_columns(path, ("t_ns", "t_mono_ns", "sport", "dport", "cwnd", "snd_mss", "bytes_acked"))
+        t, sport, dport = times(c, clock), c["sport"], c["dport"]
+        acked, cwnd = c["bytes_acked"], c["cwnd"] * c["snd_mss"]
+    else:
+        t, sport, dport, acked, cwnd = ss_samples(base + "_cwnd.txt", clock)
+    if local_port is not None and np.any(sport == local_port):
+        fg = sport == local_port  # on loopback the receiving end has it as dport
+        t, acked, cwnd = t[fg], acked[fg], cwnd[fg]
+    elif port is not None:
+        fg = (sport == port) | (dport == port)  # the background flows are sampled too
+        t, acked, cwnd = t[fg], acked[fg], cwnd[fg]
+    # sorted by time then bytes_acked, the last row of every sample time is its data flow
+    order = np.lexsort((acked, t))
+    t, cwnd = t[order], cwnd[order]
+    last = np.flatnonzero(np.append(np.diff(t) != 0, True)) if len(t) else np.empty(0, np.intp)
+    return {"t": t[last], "cwnd_bytes": cwnd[last].astype(float)}
+
+
+SS_FLOW = re.compile(r"^\S+\s+\d+\s+\d+\s+\S+:(\d+)\s+\S+:(\d+)")  # ESTAB 0 0 local:port peer:port
+SS_TS = re.compile(r"^\d+(?:\.\d+)?$")
+SS_INFO = {k: re.compile(rf"\b{k}:(\d+)\b") for k in ("cwnd", "mss", "bytes_acked")}
+SS_RTT = re.compile(r"\brtt:([0-9]+(?:\.[0-9]+)?)")
+
+
+def ss_snapshots(path: str):
+    """
+    (wall time or None, [flow]) for every snapshot of the ss text, a snapshot being the lines up to
+    a blank line; flow = {sport, dport, cwnd (segments), mss, bytes_acked, rtt_ms}
+    """
+    flows, ts = [], None
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                yield ts, flows
+                flows, ts = [], None
+            elif SS_TS.match(line):
+                ts = float(line)  # written before the ss output (after it in older logs)
+            elif (m := SS_FLOW.match(line)):
+                flows.append({"sport": int(m.group(1)), "dport": int(m.group(2))})
+            elif flows and (m := SS_INFO["cwnd"].search(line)):
+                flow = flows[-1]  # the info line under its socket line
+                for k, p in SS_INFO.items():
+                    mk = p.search(line)
+                    flow[k] = int(mk.group(1)) if mk else 0
+                mr = SS_RTT.search(line)
+                flow["rtt_ms"] = float(mr.group(1)) if mr else None
+    if flows or ts is not None:
+        yield ts, flows
+
+
+def ss_samples(path: str, clock: Clock):
+    """(time, sport, dport, bytes_acked, cwnd bytes) per flow from the ss text"""
+    rows = [(ts, fl["sport"], fl["dport"], fl["bytes_acked"], fl["cwnd"] * fl["mss"])
+            for ts, flows in ss_snapshots(path) if ts is not None for fl in flows if "cwnd" in fl]
+    a = np.array(rows, dtype=float).reshape(-1, 5)
+    return clock.wall(a[:, 0] * 1e9), a[:, 1], a[:, 2], a[:, 3], a[:, 4]
+
+
+def stamp_of(ip) -> dict:
+    return ip.info.get("start", {}).get("timestamp", {})
+
+
+def run_clock(meta: dict, ip) -> Clock:
+    """the run's epoch, or the foreground iperf start for runs that did not record one"""
+    return Clock(meta.get("epoch_mono_ns"), meta.get("epoch_wall_ns", stamp_of(ip).get("timesecs", 0) * 10**9))
+
+
+def iperf_offset(ip, meta: dict, clock: Clock, launch_key: str = "traffic_start_mono_ns") -> float:
+    """when (on the run's clock) the intervals of an iperf / trafgen log start"""
+    stamp = stamp_of(ip)
+    if "monotonic_ns" in stamp and clock.mono_ns is not None:
+        return float(clock.mono(stamp["monotonic_ns"]))
+    if meta.get(launch_key) and clock.mono_ns is not None:
+        return float(clock.mono(meta[launch_key]))
+    return float(clock.wall(stamp.get("timesecs", 0) * 10**9))
+
+
+def load(base: str, ip=None) -> dict:
+    """every signal of one run (logs/<run_id> prefix) on seconds since the run's epoch"""
+    meta = read_meta(base)
+    if ip is None:
+        ip = iperfstream.load(base + "_iperf.json")
+    clock = run_clock(meta, ip)
+    offset = iperf_offset(ip, meta, clock)
+    start = np.asarray(ip.start) + offset
+    end = np.asarray(ip.end) + offset
+    iperf = {"start": start, "end": end, "throughput_mbps": np.asarray(ip.bps) / 1e6,
+             "retrans": np.asarray(ip.retransmits, dtype=float)}
+    traffic = (float(start[0]), float(end[-1])) if len(start) else (float("nan"), float("nan"))
+    return {"iperf": iperf, "rtt": load_rtt(base, clock), "cwnd": load_cwnd(base, clock, meta.get("fg_port"), data_port(ip, meta)),
+            "traffic": traffic, "meta": meta, "clock": clock}
+
+
+# ---------- resampling ----------
+def period(t) -> float:
+    """median sample spacing"""
+    return float(np.median(np.diff(t))) if len(t) > 1 else STEP
+
+
+def asof(t, v, grid, max_age):
+    """v of the last sample at or before every grid point, NaN before the first one or when it is stale"""
+    i = np.searchsorted(t, grid, side="right") - 1
+    out = np.full(len(grid), np.nan)
+    ok = i >= 0
+    ok[ok] = grid[ok] - t[i[ok]] <= max_age
+    out[ok] = v[i[ok]]
+    return out
+
+
+def interval_value(start, end, v, grid):
+    """v of the [start, end) interval every grid point falls in, NaN outside all of them"""
+    i = np.searchsorted(start, grid, side="right") - 1
+    out = np.full(len(grid), np.nan)
+    ok = i >= 0
+    ok[ok] = grid[ok] < end[i[ok]]
+    out[ok] = v[i[ok]]
+    return out
+
+
+def window_mean(t, v, grid, width):
+    """mean of the samples in (g - width, g] for every grid point g, NaN when there are none"""
+    c = np.concatenate(([0.0], np.cumsum(v)))
+    hi = np.searchsorted(t, grid, side="right")
+    lo = np.searchsorted(t, grid - width, side="right")
+    n = hi - lo
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (c[hi] - c[lo]) / n, np.nan)
+
+
+def resample(src: dict, step: float = STEP) -> dict:
+    """the aligned frame: one array per column of COLUMNS on a uniform grid from the epoch"""
+    ip, rtt, cw = src["iperf"], src["rtt"], src["cwnd"]
+    firsts = [a[0] for a in (ip["start"], rtt["t"], cw["t"]) if len(a)]
+    lasts = [a[-1] for a in (ip["end"], rtt["t"], cw["t"]) if len(a)]
+    if not lasts:
+        return {c: np.empty(0) for c in COLUMNS}
+    lo = step * np.floor(min(0.0, *firsts) / step)
+    grid = lo + step * np.arange(int(np.floor((max(lasts) - lo) / step)) + 1)
+    return {
+        "time_s": np.round(grid, 6),
+        "throughput_mbps": interval_value(ip["start"], ip["end"], ip["throughput_mbps"], grid),
+        "rtt_ms": window_mean(rtt["t"], rtt["rtt_ms"], grid, max(step, period(rtt["t"]))),
+        "cwnd_bytes": asof(cw["t"], cw["cwnd_bytes"], grid, 2 * period(cw["t"])),
+        "retrans": interval_value(ip["start"], ip["end"], ip["retrans"], grid),
+    }
+
+
+def rows(tl: dict):
+    """the frame as tuples for store.put_run, NaN as NULL"""
+    cols = [np.where(np.isnan(tl[c]), None, np.round(tl[c], 6)).tolist() for c in COLUMNS]
+    return list(zip(*cols))
+
+
+# ---------- derived metrics ----------
+def xcorr(x, y, max_lag: int):
+    """
+    normalized cross-correlation r(k) = corr(x[n + k], y[n]) for |k| <= max_lag (one FFT),
+    NaN entries count as the mean. returns (peak r, k)
+    """
+    ok = ~np.isnan(x) & ~np.isnan(y)
+    n = len(x)
+    if ok.sum() < 3 or np.std(x[ok]) == 0 or np.std(y[ok]) == 0:
+        return float("nan"), float("nan")
+    x = np.where(ok, (x - x[ok].mean()) / x[ok].std(), 0.0)
+    y = np.where(ok, (y - y[ok].mean()) / y[ok].std(), 0.0)
+    size = 1 << (2 * n - 1).bit_length()
+    c = np.fft.irfft(np.fft.rfft(x, size) * np.conj(np.fft.rfft(y, size)), size)
+    L = min(max_lag, n - 1)
+    lags = np.arange(-L, L + 1)
+    r = np.concatenate((c[size - L:], c[:L + 1])) if L else c[:1]
+    r = r / (n - np.abs(lags))
+    j = int(np.argmax(r))
+    return float(r[j]), int(lags[j])
+
+
+def derived(tl: dict, src: dict, max_lag: float = MAX_LAG) -> dict:
+    t0, t1 = src["traffic"]
+    rt, rv = src["rtt"]["t"], src["rtt"]["rtt_ms"]
+    idle = rv[rt < t0]
+    base = float(np.median(idle)) if len(idle) >= MIN_IDLE else (float(rv.min()) if len(rv) else float("nan"))
+    busy = rv[(rt >= t0) & (rt <= t1)]
+    if len(busy) and base > 0:
+        p50, p95 = (float(p) for p in np.percentile(busy / base, [50, 95]))
+    else:
+        p50 = p95 = float("nan")
+
+    t = tl["time_s"]
+    during = (t >= t0) & (t < t1)
+    step = float(t[1] - t[0]) if len(t) > 1 else STEP
+    r, k = xcorr(tl["throughput_mbps"][during], tl["cwnd_bytes"][during], int(round(max_lag / step)))
+    return {"rtt_baseline_ms": base, "rtt_inflation_p50": p50, "rtt_inflation_p95": p95,
+            "tput_cwnd_xcorr": r, "tput_cwnd_lag_s": k * step}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="align one run's collectors on its epoch and print the derived metrics")
+    ap.add_argument("base", help="log prefix, e.g. logs/01")
+    ap.add_argument("--step", type=float, default=STEP, help="grid spacing in seconds")
+    ap.add_argument("--csv", help="also write the aligned frame to this CSV")
+    a = ap.parse_args()
+    src = load(a.base)
+    tl = resample(src, a.step)
+    if a.csv:
+        with open(a.csv, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(COLUMNS)
+            w.writerows(rows(tl))
+    print(f"{len(tl['time_s'])} rows every {a.step:g}s, traffic {src['traffic'][0]:.3f}s to {src['traffic'][1]:.3f}s")
+    for name, value in derived(tl, src).items():
+        print(f"  {name}: {value:.4g}")
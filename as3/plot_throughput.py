@@ -1,7 +1,8 @@
-import json
 from pathlib import Path
 import matplotlib.pyplot as plt
 import numpy as np
+import shared_path  # ../shared on sys.path
+import iperfstream
 
 BASE_DIR = Path(__file__).resolve().parent
 LOGS_DIR = BASE_DIR / "logs"
@@ -11,21 +12,16 @@ WIRELESS_KEY = "wlo1"
 
 # ---------- helpers ----------
 def load_iperf(iperf_path: Path):
+    # streamed into typed arrays (see ../shared/iperfstream.py) instead of json.loads of the whole file
     try:
-        data = json.loads(iperf_path.read_text())
+        ip = iperfstream.load(str(iperf_path), streams=False)
     except Exception:
         return [], []
-    ts, gbps = [], []
-    for iv in data.get("intervals", []):
-        s = iv.get("sum") or iv["streams"][0]
-        mid = 0.5 * (float(s["start"]) + float(s["end"]))
-        ts.append(mid)
-        gbps.append(float(s["bits_per_second"]) / 1e9)
-    if not ts:
+    if not len(ip):
         return [], []
-    t0 = ts[0]
-    ts = [t - t0 for t in ts]
-    return np.array(ts), np.array(gbps)
+    ts = 0.5 * (np.frombuffer(ip.start) + np.frombuffer(ip.end))
+    gbps = np.frombuffer(ip.bps) / 1e9
+    return ts - ts[0], gbps
 
 def discover_runs():
     runs = []
@@ -1,6 +1,9 @@
-import json, re, csv, math
+import re, csv, math
 from pathlib import Path
 from statistics import mean
+import shared_path  # ../shared on sys.path
+from rttprobe import rtt_stats
+import iperfstream
 
 BASE_DIR  = Path(__file__).resolve().parent
 LOGS_DIR  = BASE_DIR / "logs"
@@ -10,23 +13,21 @@ OUT_CSV   = PLOTS_DIR / "summary.csv"
 PING_RE = re.compile(r"time=([\d\.]+)\s*ms")
 
 def iperf_stats(run_dir: Path):
-    ip = run_dir / "iperf.json"
+    # streamed, see ../shared/iperfstream.py
     try:
-        j = json.loads(ip.read_text())
+        ip = iperfstream.load(str(run_dir / "iperf.json"), streams=False)
     except Exception:
         return (None, None)
-    gbps = []
-    for iv in j.get("intervals", []):
-        s = iv.get("sum") or (iv.get("streams", [{}])[0])
-        bps = s.get("bits_per_second")
-        if bps is not None:
-            gbps.append(float(bps)/1e9)
+    gbps = [bps/1e9 for bps in ip.bps]
     return ((mean(gbps), max(gbps)) if gbps else (None, None))
 
 def ping_stats(run_dir: Path):
-    p = run_dir / "ping.txt"
-    txt = p.read_text(errors="ignore")
-    ms = [float(m.group(1)) for m in PING_RE.finditer(txt)]
+    probe = run_dir / "rttprobe.csv"
+    if probe.exists():
+        ms = [v for _, v in rtt_stats(str(probe))[0]]
+    else:
+        txt = (run_dir / "ping.txt").read_text(errors="ignore")
+        ms = [float(m.group(1)) for m in PING_RE.finditer(txt)]
     ms_sorted = sorted(ms)
 
     idx = max(0, math.ceil(0.95 * len(ms_sorted)) - 1)
@@ -3,12 +3,17 @@ runs all experiment rows in runs.csv
 - applies qdisc (pfifo) and txqueuelen
 - applies NIC ring sizes (ethtool -G) when supported
 - binds iperf3 client to the run's interface IP
-- runs iperf3 (JSON), parallel ping, and CWND snapshots (ss -ti)
+- runs iperf3 (JSON), parallel RTT probing (in-process icmp echo at --rtt-hz into rttprobe.csv,
+  see ../shared/rttprobe.py; ping into ping.txt when icmp sockets are not allowed), and CWND snapshots
+  (tcp_info via netlink at --sample-hz into tcpinfo.csv, see ../shared/tcpinfo.py; ss -ti once a second as fallback)
 - captures pre/post qdisc + NIC counter snapshots
+- --traffic native runs the built-in generator (../shared/trafgen.py, same iperf.json layout) instead of iperf3
 
 how to use:
   # receiver (mac):
   iperf3 -s
+  # or, for --traffic native:
+  python3 ../shared/trafgen.py -s -p 5201
 
   # sender (linux omen):
   sudo python3 test_runs.py
@@ -22,6 +27,10 @@ import time
 from pathlib import Path
 import threading
 import argparse
+import shared_path  # ../shared on sys.path
+import tcpinfo
+import rttprobe
+import trafgen
 
 
 # ---------- PARAMS  ----------
@@ -153,10 +162,26 @@ def start_rtt(server: str, out_file: str) -> subprocess.Popen:
     with open(out_file, "w") as f:
         return subprocess.Popen(shlex.split(cmd), stdout=f, stderr=subprocess.STDOUT)
 
-def start_iperf(server: str, bind_ip: str, out_file: str, port: int = 5201) -> subprocess.Popen:
+def start_rtt_sampler(server: str, outdir: Path, hz: float):
     """
-        starts iperf3 client in background for 60 secs
+        in-process echo probing at `hz` for 60 secs, falls back to ping (5 Hz) without icmp socket access
     """
+    if rttprobe.available(server):
+        return rttprobe.start_rtt_probe(server, 60, str(outdir / "rttprobe.csv"), hz)
+    return start_rtt(server, outdir / "ping.txt")
+
+def wait_rtt_sampler(p) -> None:
+    if isinstance(p, threading.Thread):
+        p.join()
+    else:
+        p.wait()
+
+def start_iperf(server: str, bind_ip: str, out_file: str, port: int = 5201, native: bool = False) -> subprocess.Popen:
+    """
+        starts iperf3 client (or trafgen with native) in background for 60 secs
+    """
+    if native:
+        return trafgen.start_client(server, 60, str(out_file), port, bind=bind_ip)
     cmd = f"iperf3 -J -c {server} -t 60 -B {bind_ip} -p {port}"
     with open(out_file, "w") as f:
         return subprocess.Popen(shlex.split(cmd), stdout=f, stderr=subprocess.STDOUT)
@@ -181,9 +206,29 @@ def sample_cwnd(dst_ip: str, out_file: str, fg_port: int = 5201) -> None:
             f.flush()
             time.sleep(1)
 
+def start_tcp_sampler(dst_ip: str, outdir: Path, hz: float, fg_port: int = 5201) -> threading.Thread:
+    """
+        tcp_info sampling at `hz` for 60 secs into tcpinfo.csv, ss_cwnd.txt snapshots if netlink is unavailable
+    """
+    if tcpinfo.available():
+        t = threading.Thread(
+            target=tcpinfo.sample_tcpinfo,
+            args=(dst_ip, 60, outdir / "tcpinfo.csv", fg_port, hz),
+            daemon=True,
+        )
+    else:
+        t = threading.Thread(
+            target=sample_cwnd,
+            args=(dst_ip, outdir / "ss_cwnd.txt"),
+            kwargs={"fg_port": fg_port},
+            daemon=True,
+        )
+    t.start()
+    return t
+
 
 
-def run_wired():
+def run_wired(hz: float = 10, rtt_hz: float = 100, native: bool = False):
     """
     runs all of the rows in wired.csv, makes changes to ring sizes
     """
@@ -222,19 +267,13 @@ def run_wired():
                 continue
 
             # STEP6: launch collectors
-            iperf_p = start_iperf(SERVER_IP, bind_ip, outdir / "iperf.json")
-            ping_p  = start_rtt(SERVER_IP, outdir / "ping.txt")
+            iperf_p = start_iperf(SERVER_IP, bind_ip, outdir / "iperf.json", native=native)
+            ping_p  = start_rtt_sampler(SERVER_IP, outdir, rtt_hz)
 
-            t_cwnd = threading.Thread(
-                target=sample_cwnd,
-                args=(SERVER_IP, outdir / "ss_cwnd.txt"),
-                kwargs={"fg_port": 5201},
-                daemon=True,
-            )
-            t_cwnd.start()
+            t_cwnd = start_tcp_sampler(SERVER_IP, outdir, hz, fg_port=5201)
 
             iperf_p.wait()
-            ping_p.wait()
+            wait_rtt_sampler(ping_p)
             if t_cwnd.is_alive():
                 t_cwnd.join(timeout=2)
 
@@ -243,7 +282,7 @@ def run_wired():
 
 
 
-def run_wireless():
+def run_wireless(hz: float = 10, rtt_hz: float = 100, native: bool = False):
     """
     runs all of the rows in wireless.csv, NO RINGS
     """
@@ -282,19 +321,13 @@ def run_wireless():
                 continue
 
             # STEP5: launch collectors
-            iperf_p = start_iperf(SERVER_IP, bind_ip, outdir / "iperf.json")
-            ping_p  = start_rtt(SERVER_IP, outdir / "ping.txt")
+            iperf_p = start_iperf(SERVER_IP, bind_ip, outdir / "iperf.json", native=native)
+            ping_p  = start_rtt_sampler(SERVER_IP, outdir, rtt_hz)
 
-            t_cwnd = threading.Thread(
-                target=sample_cwnd,
-                args=(SERVER_IP, outdir / "ss_cwnd.txt"),
-                kwargs={"fg_port": 5201},
-                daemon=True,
-            )
-            t_cwnd.start()
+            t_cwnd = start_tcp_sampler(SERVER_IP, outdir, hz, fg_port=5201)
 
             iperf_p.wait()
-            ping_p.wait()
+            wait_rtt_sampler(ping_p)
             if t_cwnd.is_alive():
                 t_cwnd.join(timeout=2)
 
@@ -305,13 +338,17 @@ def run_wireless():
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", choices=["wired", "wireless"], required=True)
+    parser.add_argument("--sample-hz", type=float, default=10, help="tcp_info sampling rate (10-1000)")
+    parser.add_argument("--rtt-hz", type=float, default=100, help="echo probes per second")
+    parser.add_argument("--traffic", choices=["iperf3", "native"], default="iperf3",
+                        help="native: built-in generator (../shared/trafgen.py -s on the receiver)")
     args = parser.parse_args()
 
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
     if args.mode == "wired":
-        run_wired()
+        run_wired(args.sample_hz, args.rtt_hz, args.traffic == "native")
     else:
-        run_wireless()
+        run_wireless(args.sample_hz, args.rtt_hz, args.traffic == "native")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+streaming reader for iperf3 -J output (and trafgen.py's), instead of json.load of the whole file
+
+the top level object is walked key by key: start / end are decoded as usual, the intervals array
+is decoded one element at a time from a sliding buffer, so memory stays at one interval plus the
+typed arrays it is folded into (a -P 64, -i 0.1 hour long run is hundreds of MB of JSON)
+
+per interval (stdlib arrays, numpy.asarray / np.frombuffer view them without a copy):
+  start, end, bytes, bps, retransmits    the "sum" record (streams[0] when there is no sum)
+  rev_bytes, rev_bps                     "sum_bidir_reverse" for --bidir runs, empty otherwise
+per stream (keyed by socket): sender, bytes, bps, retransmits, snd_cwnd, rtt (us), as long as the
+interval arrays (zeros where the stream was not reported), and first / last, the intervals it ran
+
+how to use:
+  ip = iperfstream.load("logs/01_iperf.json")
+  ip.bps, ip.retransmits, ip.streams[5].snd_cwnd, ip.info["end"]["sum_sent"]
+  python3 iperfstream.py logs/01_iperf.json
+"""
+import json
+from array import array
+
+CHUNK = 1 << 20
+_decoder = json.JSONDecoder()
+_WS = " \t\n\r"
+
+
+class _Scanner:
+    """raw_decode over a buffer that is refilled from the file when a value runs past its end"""
+    def __init__(self, f, chunk=CHUNK):
+        self.f = f
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError("unexpected end of iperf JSON")
+            self._fill(self.chunk)
+
+    def take(self, allowed: str) -> str:
+        c = self.peek()
+        if c not in allowed:
+            raise ValueError(f"iperf JSON: expected {allowed!r} at offset {self.pos}, got {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        size = self.chunk
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # a number can be cut by the buffer end and still decode, objects and strings can't
+                if end < len(self.buf) or self.eof or not isinstance(obj, (int, float)):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # the value is longer than what is buffered, read more (doubling keeps big values linear)
+            self._fill(size)
+            size = max(size, len(self.buf))
+
+
+def walk(path: str, on_interval, chunk: int = CHUNK) -> dict:
+    """calls on_interval(dict) for every element of "intervals", returns the other top level keys"""
+    top = {}
+    with open(path) as f:
+        s = _Scanner(f, chunk)
+        s.take("{")
+        if s.peek() == "}":
+            return top
+        while True:
+            key = s.value()
+            s.take(":")
+            if key == "intervals":
+                s.take("[")
+                if s.peek() == "]":
+                    s.pos += 1
+                else:
+                    while True:
+                        on_interval(s.value())
+                        if s.take(",]") == "]":
+                            break
+            else:
+                top[key] = s.value()
+            if s.take(",}") == "}":
+                return top
+
+
+class StreamSeries:
+    def __init__(self, sender: bool, first: int = 0):
+        self.sender = sender
+        self.first = first  # first and last interval this stream was reported in
+        self.last = first
+        self.bytes = array("q")
+        self.bps = array("d")
+        self.retransmits = array("q")
+        self.snd_cwnd = array("q")
+        self.rtt = array("q")
+
+    def add(self, s: dict):
+        self.bytes.append(int(s.get("bytes", 0)))
+        self.bps.append(float(s.get("bits_per_second", 0.0)))
+        self.retransmits.append(int(s.get("retransmits", 0) or 0))
+        self.snd_cwnd.append(int(s.get("snd_cwnd", 0) or 0))
+        self.rtt.append(int(s.get("rtt", 0) or 0))
+
+    def pad(self, n: int):
+        """zeros up to interval n, for the intervals this stream was not reported in"""
+        for a in (self.bytes, self.retransmits, self.snd_cwnd, self.rtt):
+            a.extend([0] * (n - len(a)))
+        self.bps.extend([0.0] * (n - len(self.bps)))
+
+
+class IperfSeries:
+    def __init__(self, streams: bool = True):
+        self.keep_streams = streams
+        self.start = array("d")
+        self.end = array("d")
+        self.bytes = array("q")
+        self.bps = array("d")
+        self.retransmits = array("q")
+        self.rev_bytes = array("q")
+        self.rev_bps = array("d")
+        self.streams = {}  # socket -> StreamSeries
+        self.info = {}     # the other top level keys (start, end, error)
+
+    def __len__(self):
+        return len(self.start)
+
+    def add(self, iv: dict):
+        streams = iv.get("streams") or []
+        s = iv.get("sum") or (streams[0] if streams else {})
+        n = len(self.start)
+        self.start.append(float(s.get("start", 0.0)))
+        self.end.append(float(s.get("end", 0.0)))
+        self.bytes.append(int(s.get("bytes", 0)))
+        self.bps.append(float(s.get("bits_per_second", 0.0) or 0.0))
+        self.retransmits.append(int(s.get("retransmits", 0) or 0))
+        rev = iv.get("sum_bidir_reverse")
+        if rev is not None:
+            self.rev_bytes.append(int(rev.get("bytes", 0)))
+            self.rev_bps.append(float(rev.get("bits_per_second", 0.0) or 0.0))
+        if self.keep_streams:
+            for st in streams:
+                ss = self.streams.get(st.get("socket"))
+                if ss is None:
+                    ss = self.streams[st.get("socket")] = StreamSeries(bool(st.get("sender", True)), n)
+                ss.pad(n)
+                ss.add(st)
+                ss.last = n
+
+    @property
+    def bidir(self) -> bool:
+        return len(self.rev_bps) > 0
+
+
+def load(path: str, streams: bool = True, chunk: int = CHUNK) -> IperfSeries:
+    """per interval (and per stream unless streams=False) arrays of one iperf3 JSON file"""
+    out = IperfSeries(streams)
+    out.info = walk(path, out.add, chunk)
+    for ss in out.streams.values():
+        ss.pad(len(out))  # streams that ended before the run did
+    return out
+
+
+if __name__ == "__main__":
+    import argparse, resource
+    ap = argparse.ArgumentParser(description="summarize an iperf3 JSON file without loading it whole")
+    ap.add_argument("path")
+    a = ap.parse_args()
+    ip = load(a.path)
+    n = len(ip)
+    mean = lambda xs: sum(xs) / len(xs) if len(xs) else float("nan")
+    print(f"{n} intervals, {len(ip.streams)} streams, bidir={ip.bidir}")
+    print(f"sum: mean {mean(ip.bps) / 1e6:.3f} Mbit/s, retransmits {sum(ip.retransmits)}")
+    if ip.bidir:
+        print(f"sum_bidir_reverse: mean {mean(ip.rev_bps) / 1e6:.3f} Mbit/s")
+    for sock, ss in sorted(ip.streams.items(), key=lambda kv: str(kv[0])):
+        rtts = [r for r in ss.rtt if r]
+        print(f"  socket {sock} ({'sender' if ss.sender else 'receiver'}): {mean(ss.bps) / 1e6:.3f} Mbit/s, "
+              f"retransmits {sum(ss.retransmits)}, max cwnd {max(ss.snd_cwnd, default=0)}, "
+              f"mean rtt {mean(rtts) / 1e3:.3f} ms")
+    print(f"peak rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
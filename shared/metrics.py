@@ -0,0 +1,79 @@
+"""
+opt-in live metrics in the Prometheus text format, served on localhost only
+  curl http://127.0.0.1:9108/metrics
+
+values are either set directly or filled in by collectors, functions that run on every scrape,
+so the measurement loops never pay for metrics nobody reads
+"""
+import math, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.kinds = {}       # name -> (type, help)
+        self.values = {}      # (name, labels) -> value
+        self.collectors = {}  # key -> fn(metrics)
+
+    def describe(self, name, kind, help_text):
+        self.kinds[name] = (kind, help_text)
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def collector(self, key, fn):
+        """registers (or replaces) the scrape time collector stored under key"""
+        with self.lock:
+            self.collectors[key] = fn
+
+    def render(self) -> str:
+        with self.lock:
+            collectors = list(self.collectors.values())
+        for fn in collectors:
+            fn(self)
+        with self.lock:
+            values = sorted(self.values.items())
+        out = []
+        last = None
+        for (name, labels), value in values:
+            if name != last and name in self.kinds:
+                kind, help_text = self.kinds[name]
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+            last = name
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                value = "NaN"
+            out.append(f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """starts the endpoint in a daemon thread, returns the server"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # no access log on stdout
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
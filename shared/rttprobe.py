@@ -0,0 +1,224 @@
+"""
+in-process RTT prober, replaces `ping -D -i 0.2` text capture
+
+sends one echo every 1/hz seconds on fixed monotonic slots and times the reply with
+time.monotonic_ns(), rates of hundreds of Hz are fine. transports, in order of preference:
+  icmp:  unprivileged ICMP datagram socket (needs net.ipv4.ping_group_range to include our gid),
+         or a raw ICMP socket when running as root
+  udp:   UDP echo to a reflector (--port), start one on the receiver with
+           python3 rttprobe.py --reflect --port 5300
+every probe gets exactly one CSV row, in seq order, once it is answered or times out:
+  seq,t_ns,rtt_ns,t_mono_ns   t_ns = wall clock send time, rtt_ns = -1 for a lost probe,
+                              t_mono_ns = the same send time on CLOCK_MONOTONIC (shared by every
+                              process of the host, analysis aligns the collectors on it)
+so loss comes from the sequence itself, not from a summary line
+
+how to use on its own:
+  python3 rttprobe.py --dst 192.168.100.57 --hz 200 --duration 60 --out rttprobe.csv
+"""
+import argparse, os, socket, struct, threading, time
+from array import array
+
+ICMP_ECHO, ICMP_ECHOREPLY = 8, 0
+ICMP = struct.Struct("!BBHHH")   # type, code, checksum, id, seq (16 bit)
+PROBE = struct.Struct("!Q")      # full 64 bit seq in the payload, the icmp seq wraps
+COLUMNS = ["seq", "t_ns", "rtt_ns", "t_mono_ns"]
+
+
+def checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(array("H", data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return socket.htons(~s & 0xFFFF)
+
+
+class EchoSocket:
+    """sends probe `seq` and returns the seq of the next reply (None on timeout)"""
+    def __init__(self, dst: str, port=None, size=56, timeout=0.2):
+        self.dst = dst
+        self.port = port
+        self.pad = b"\0" * max(0, size - PROBE.size)
+        self.raw = False
+        if port:
+            self.kind = "udp"
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect((dst, port))
+        else:
+            self.kind = "icmp"
+            try:
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            except PermissionError:
+                # no ping group access, root can still use a raw socket
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+                self.raw = True
+            self.ident = os.getpid() & 0xFFFF
+        self.sock.settimeout(timeout)
+
+    def send(self, seq: int):
+        body = PROBE.pack(seq) + self.pad
+        if self.kind == "udp":
+            self.sock.send(body)
+            return
+        # the kernel fills in id and checksum for datagram icmp sockets, raw ones need both
+        header = ICMP.pack(ICMP_ECHO, 0, 0, self.ident, seq & 0xFFFF)
+        pkt = ICMP.pack(ICMP_ECHO, 0, checksum(header + body), self.ident, seq & 0xFFFF) + body
+        self.sock.sendto(pkt, (self.dst, 0))
+
+    def recv(self):
+        while True:
+            try:
+                data = self.sock.recv(65535)
+            except socket.timeout:
+                return None
+            except ConnectionRefusedError:
+                continue  # udp: port unreachable for an earlier probe, it stays lost
+            if self.kind == "udp":
+                if len(data) >= PROBE.size:
+                    return PROBE.unpack_from(data)[0]
+                continue
+            if self.raw:
+                data = data[(data[0] & 0x0F) * 4:]  # skip the IP header
+            if len(data) < ICMP.size + PROBE.size:
+                continue
+            kind, _, _, ident, _ = ICMP.unpack_from(data)
+            if kind != ICMP_ECHOREPLY or (self.raw and ident != self.ident):
+                continue  # raw sockets see every icmp packet of the host
+            return PROBE.unpack_from(data, ICMP.size)[0]
+
+    def close(self):
+        self.sock.close()
+
+
+def available(dst: str = "127.0.0.1", port=None) -> bool:
+    try:
+        EchoSocket(dst, port).close()
+        return True
+    except OSError:
+        return False
+
+
+class RttProber:
+    """sender (caller's thread) + receiver thread, rows are written by the sender as probes settle"""
+    def __init__(self, dst: str, duration: float, out_path: str, hz: float = 100, port=None,
+                 size: int = 56, timeout: float = 1.0):
+        self.echo = EchoSocket(dst, port, size)
+        self.duration = duration
+        self.out_path = out_path
+        self.hz = hz
+        self.timeout_ns = int(timeout * 1e9)
+        n = int(duration * hz) + 1
+        self.t_mono = array("q", bytes(8 * n))
+        self.t_wall = array("q", bytes(8 * n))
+        self.rtt = array("q", [-1]) * n
+        self.sent = 0
+        self.flushed = 0
+        self.done = threading.Event()
+
+    def _receiver(self):
+        while True:
+            seq = self.echo.recv()
+            t = time.monotonic_ns()
+            if seq is None:
+                if self.done.is_set():
+                    return
+                continue
+            # a reply later than the timeout stays lost even if its probe has not been written yet
+            if seq < self.sent and self.rtt[seq] < 0 and t - self.t_mono[seq] <= self.timeout_ns:
+                self.rtt[seq] = t - self.t_mono[seq]
+
+    def _flush(self, f, final=False):
+        """writes every probe that is answered or timed out, in seq order"""
+        now = time.monotonic_ns()
+        while self.flushed < self.sent:
+            i = self.flushed
+            if self.rtt[i] < 0 and not final and now - self.t_mono[i] < self.timeout_ns:
+                break
+            f.write(f"{i},{self.t_wall[i]},{self.rtt[i]},{self.t_mono[i]}\n")
+            self.flushed += 1
+        f.flush()
+
+    def run(self):
+        rx = threading.Thread(target=self._receiver, daemon=True)
+        rx.start()
+        period = 1e9 / self.hz
+        start = time.monotonic_ns()
+        with open(self.out_path, "w") as f:
+            f.write(",".join(COLUMNS) + "\n")
+            for seq in range(len(self.t_mono)):
+                target = start + int(seq * period)
+                delay = target - time.monotonic_ns()
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+                self.t_wall[seq] = time.time_ns()
+                self.t_mono[seq] = time.monotonic_ns()
+                self.sent = seq + 1  # before the send, the reply can beat us back on loopback
+                try:
+                    self.echo.send(seq)
+                except OSError:
+                    pass  # e.g. no route for a moment, the probe counts as lost
+                if seq % max(1, int(self.hz // 10)) == 0:
+                    self._flush(f)
+            # the last probes get a full timeout to come back
+            deadline = time.monotonic_ns() + self.timeout_ns
+            while self.flushed < self.sent and time.monotonic_ns() < deadline:
+                time.sleep(0.01)
+                self._flush(f)
+            self.done.set()
+            self._flush(f, final=True)
+        rx.join()
+        self.echo.close()
+
+
+def reflect(port: int, host: str = "0.0.0.0"):
+    """UDP echo for the udp transport, run on the receiver"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind((host, port))
+        print(f"reflecting udp on {host}:{port}")
+        buf = bytearray(65535)
+        while True:
+            n, addr = s.recvfrom_into(buf)
+            s.sendto(memoryview(buf)[:n], addr)
+
+
+def start_rtt_probe(dst: str, duration: float, out_path: str, hz: float = 100, port=None) -> threading.Thread:
+    """runs an RttProber in a background thread"""
+    prober = RttProber(dst, duration, out_path, hz, port)
+    t = threading.Thread(target=prober.run, daemon=True)
+    t.start()
+    return t
+
+
+def rtt_stats(path: str):
+    """(rows of (time_s, rtt_ms) for answered probes, sent, lost) from a rttprobe CSV"""
+    rows, sent, lost, t0 = [], 0, 0, None
+    with open(path) as f:
+        next(f, None)
+        for line in f:
+            seq, t_ns, rtt_ns = (int(x) for x in line.split(",")[:3])
+            sent += 1
+            if t0 is None:
+                t0 = t_ns
+            if rtt_ns < 0:
+                lost += 1
+                continue
+            rows.append((round((t_ns - t0) / 1e9, 4), rtt_ns / 1e6))
+    return rows, sent, lost
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="RTT prober (icmp or udp echo) and udp reflector")
+    ap.add_argument("--dst")
+    ap.add_argument("--port", type=int, default=None, help="udp echo port, icmp when not given")
+    ap.add_argument("--hz", type=float, default=100)
+    ap.add_argument("--duration", type=float, default=60)
+    ap.add_argument("--out", default="rttprobe.csv")
+    ap.add_argument("--reflect", action="store_true", help="run the udp reflector on --port instead")
+    a = ap.parse_args()
+    if a.reflect:
+        reflect(a.port or 5300)
+    else:
+        if not a.dst:
+            ap.error("--dst is required")
+        RttProber(a.dst, a.duration, a.out, a.hz, a.port).run()
@@ -0,0 +1,172 @@
+"""
+in-process tcp_info sampler (linux), replaces forking `ss -tin` once per second
+
+every sample is one NETLINK_SOCK_DIAG dump of the established tcp sockets with the kernel's
+struct tcp_info attached (the same data ss prints), filtered to the flows talking to dst:port.
+one CSV row per flow per sample, written as it is taken:
+  t_ns,sport,dport,state,cwnd,srtt_us,rttvar_us,min_rtt_us,pacing_rate_bps,delivery_rate_bps,
+  rto_retransmits,total_retrans,lost,unacked,bytes_in_flight,bytes_acked,bytes_sent,snd_mss,t_mono_ns
+t_ns is the wall clock, t_mono_ns the same instant on CLOCK_MONOTONIC (what analysis aligns on)
+pacing_rate_bps / delivery_rate_bps are bits/s (tcp_info has bytes/s, ss prints bits/s too)
+rto_retransmits is tcpi_retransmits, the consecutive RTOs of the current loss episode (0 again once
+it recovers), total_retrans counts every retransmitted segment of the connection
+
+how to use on its own:
+  python3 tcpinfo.py --dst 192.168.100.57 --port 5201 --hz 100 --duration 60 --out tcpinfo.csv
+"""
+import argparse, socket, struct, time
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+INET_DIAG_INFO = 2
+TCP_ESTABLISHED = 1
+
+NLMSGHDR = struct.Struct("=IHHII")
+# inet_diag_req_v2: family, protocol, ext, pad, states, then inet_diag_sockid
+# (sport, dport, src[16], dst[16], if, cookie[2]), ports and addresses in network order
+DIAG_REQ = struct.Struct("=BBBxI" + "HH16s16sI8s")
+# inet_diag_msg: family, state, timer, retrans, sockid, expires, rqueue, wqueue, uid, inode
+DIAG_MSG = struct.Struct("=BBBB" + "2s2s16s16sI8s" + "IIIII")
+RTATTR = struct.Struct("=HH")
+
+# struct tcp_info from <linux/tcp.h>, byte offsets of the fields we keep
+TCP_INFO_FIELDS = {
+    "rto_retransmits": ("B", 2),  # tcpi_retransmits
+    "snd_mss": ("I", 16),
+    "unacked": ("I", 24), "sacked": ("I", 28), "lost": ("I", 32), "retrans_out": ("I", 36),
+    "srtt_us": ("I", 68), "rttvar_us": ("I", 72), "cwnd": ("I", 80),
+    "total_retrans": ("I", 100),
+    "pacing_rate_bps": ("Q", 104),  # the kernel's rates are bytes/s, turned into bits/s below
+    "bytes_acked": ("Q", 120),
+    "min_rtt_us": ("I", 148),
+    "delivery_rate_bps": ("Q", 160),
+    "bytes_sent": ("Q", 200),
+}
+
+COLUMNS = ["t_ns", "sport", "dport", "state", "cwnd", "srtt_us", "rttvar_us", "min_rtt_us",
+           "pacing_rate_bps", "delivery_rate_bps", "rto_retransmits", "total_retrans", "lost", "unacked",
+           "bytes_in_flight", "bytes_acked", "bytes_sent", "snd_mss", "t_mono_ns"]
+
+
+def parse_tcp_info(data: bytes) -> dict:
+    """the fields above, older kernels send a shorter struct and miss the later ones (0)"""
+    out = {}
+    for name, (fmt, off) in TCP_INFO_FIELDS.items():
+        size = struct.calcsize(fmt)
+        out[name] = struct.unpack_from("=" + fmt, data, off)[0] if off + size <= len(data) else 0
+    # packets in flight the way the kernel counts them (tcp_packets_in_flight)
+    in_flight = max(0, out["unacked"] - out["sacked"] - out["lost"] + out["retrans_out"])
+    out["bytes_in_flight"] = in_flight * out["snd_mss"]
+    out["pacing_rate_bps"] *= 8
+    out["delivery_rate_bps"] *= 8
+    return out
+
+
+class TcpInfoSampler:
+    """one netlink socket, reused for every dump"""
+    def __init__(self, dst_ip: str, port):
+        self.dst = socket.inet_aton(dst_ip)
+        self.ports = {port} if isinstance(port, int) else set(port)
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+        self.buf = bytearray(1 << 16)
+        self.seq = 0
+
+    def close(self):
+        self.sock.close()
+
+    def _request(self) -> bytes:
+        self.seq += 1
+        body = DIAG_REQ.pack(socket.AF_INET, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1),
+                             1 << TCP_ESTABLISHED, 0, 0, b"", b"", 0, b"")
+        return NLMSGHDR.pack(NLMSGHDR.size + len(body), SOCK_DIAG_BY_FAMILY,
+                             NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0) + body
+
+    def sample(self):
+        """[(sport, dport, state, tcp_info dict)] for the flows to/from dst:port (any of the ports)"""
+        self.sock.send(self._request())
+        flows = []
+        while True:
+            n = self.sock.recv_into(self.buf)
+            off = 0
+            while off + NLMSGHDR.size <= n:
+                length, kind, _, _, _ = NLMSGHDR.unpack_from(self.buf, off)
+                if kind == NLMSG_DONE:
+                    return flows
+                if kind == NLMSG_ERROR:
+                    (err,) = struct.unpack_from("=i", self.buf, off + NLMSGHDR.size)
+                    raise OSError(-err, "sock_diag dump failed")
+                flow = self._parse(off + NLMSGHDR.size, off + length)
+                if flow:
+                    flows.append(flow)
+                off += (length + 3) & ~3
+
+    def _parse(self, off, end):
+        _, state, _, _, sport, dport, _, dst, _, _, _, _, _, _, _ = DIAG_MSG.unpack_from(self.buf, off)
+        sport, dport = int.from_bytes(sport, "big"), int.from_bytes(dport, "big")
+        if dst[:4] != self.dst or (sport not in self.ports and dport not in self.ports):
+            return None
+        off += DIAG_MSG.size
+        while off + RTATTR.size <= end:
+            alen, atype = RTATTR.unpack_from(self.buf, off)
+            if alen < RTATTR.size:
+                break
+            if atype == INET_DIAG_INFO:
+                return sport, dport, state, parse_tcp_info(bytes(self.buf[off + RTATTR.size:off + alen]))
+            off += (alen + 3) & ~3
+        return None
+
+
+def sample_tcpinfo(dst_ip: str, duration: float, out_path: str, port: int = 5201, hz: float = 10,
+                   on_sample=None) -> None:
+    """
+    samples every flow to dst_ip:port (an int, or a list of ports) `hz` times a second for `duration` seconds into a CSV
+    on_sample(t_ns, records) is called after every sample (live metrics)
+    """
+    sampler = TcpInfoSampler(dst_ip, port)
+    period = 1e9 / hz
+    start = time.monotonic_ns()
+    end = start + int(duration * 1e9)
+    k = 0
+    try:
+        with open(out_path, "w") as f:
+            f.write(",".join(COLUMNS) + "\n")
+            while True:
+                now = time.monotonic_ns()
+                if now >= end:
+                    break
+                t_ns, t_mono_ns = time.time_ns(), time.monotonic_ns()
+                recs = [{"t_ns": t_ns, "t_mono_ns": t_mono_ns, "sport": sport, "dport": dport, "state": state, **info}
+                        for sport, dport, state, info in sampler.sample()]
+                for rec in recs:
+                    f.write(",".join(str(rec[c]) for c in COLUMNS) + "\n")
+                f.flush()
+                if on_sample:
+                    on_sample(t_ns, recs)
+                # fixed slots, a slow dump skips slots instead of drifting
+                k = max(k + 1, int((time.monotonic_ns() - start) // period) + 1)
+                delay = start + k * period - time.monotonic_ns()
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+    finally:
+        sampler.close()
+
+
+def available() -> bool:
+    try:
+        TcpInfoSampler("127.0.0.1", 0).close()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="sample tcp_info of the flows to dst:port")
+    ap.add_argument("--dst", required=True)
+    ap.add_argument("--port", type=int, nargs="+", default=[5201], help="one or more ports (foreground, background)")
+    ap.add_argument("--hz", type=float, default=10)
+    ap.add_argument("--duration", type=float, default=60)
+    ap.add_argument("--out", default="tcpinfo.csv")
+    a = ap.parse_args()
+    sample_tcpinfo(a.dst, a.duration, a.out, a.port, a.hz)
@@ -0,0 +1,4 @@
+import os, sys
+
+# the shared modules are imported as top level modules, like the assignments do through shared_path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
@@ -0,0 +1,58 @@
+import glob, json, os
+import pytest
+import iperfstream
+
+AS2_LOGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "as2", "logs")
+RUNS = sorted(glob.glob(os.path.join(AS2_LOGS, "*_iperf.json")))
+
+
+def expected(path):
+    """the same arrays the slow way"""
+    with open(path) as f:
+        d = json.load(f)
+    out = {"start": [], "bps": [], "retransmits": [], "rev_bps": [], "streams": {}}
+    for n, iv in enumerate(d["intervals"]):
+        s = iv.get("sum") or iv["streams"][0]
+        out["start"].append(float(s["start"]))
+        out["bps"].append(float(s["bits_per_second"]))
+        out["retransmits"].append(int(s.get("retransmits", 0)))
+        if "sum_bidir_reverse" in iv:
+            out["rev_bps"].append(float(iv["sum_bidir_reverse"]["bits_per_second"]))
+        for st in iv["streams"]:
+            cwnd = out["streams"].setdefault(st["socket"], [0] * len(d["intervals"]))
+            cwnd[n] = int(st.get("snd_cwnd", 0))
+    return d, out
+
+
+@pytest.mark.skipif(not RUNS, reason="no as2 runs checked in")
+@pytest.mark.parametrize("path", RUNS, ids=os.path.basename)
+def test_load_matches_json_load(path):
+    d, want = expected(path)
+    ip = iperfstream.load(path)
+    assert len(ip) == len(d["intervals"])
+    assert list(ip.start) == want["start"]
+    assert list(ip.bps) == want["bps"]
+    assert list(ip.retransmits) == want["retransmits"]
+    assert list(ip.rev_bps) == want["rev_bps"]
+    assert {s: list(ss.snd_cwnd) for s, ss in ip.streams.items()} == want["streams"]
+    assert ip.info == {k: v for k, v in d.items() if k != "intervals"}
+
+
+@pytest.mark.skipif(not RUNS, reason="no as2 runs checked in")
+def test_tiny_chunks_cut_every_value():
+    path = RUNS[-1]
+    big, small = iperfstream.load(path), iperfstream.load(path, chunk=7)
+    assert list(small.bps) == list(big.bps) and small.info == big.info
+
+
+def test_streams_padded_to_the_intervals_they_ran(tmp_path):
+    def iv(i, socks):
+        streams = [{"socket": s, "start": i, "end": i + 1, "bytes": 10, "bits_per_second": 80.0, "sender": True}
+                   for s in socks]
+        return {"streams": streams, "sum": {"start": i, "end": i + 1, "bytes": 10 * len(socks), "bits_per_second": 80.0}}
+    path = tmp_path / "run.json"
+    path.write_text(json.dumps({"start": {}, "intervals": [iv(0, [5]), iv(1, [5, 7]), iv(2, [7]), iv(3, [7])], "end": {}}))
+    ip = iperfstream.load(str(path))
+    assert [(s, ss.first, ss.last, list(ss.bytes)) for s, ss in sorted(ip.streams.items())] == [
+        (5, 0, 1, [10, 10, 0, 0]), (7, 1, 3, [0, 10, 10, 10])]
+    assert iperfstream.load(str(path), streams=False).streams == {}
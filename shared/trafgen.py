@@ -0,0 +1,416 @@
+"""
+built-in TCP traffic generator and sink, replaces `iperf3 -s` / `iperf3 -J -c`
+
+one process per flow on the client and SO_REUSEPORT worker processes on the server, so flows
+don't share a GIL. the sender pushes the same pages out over and over with sendfile() from an
+in-memory file (no copy from user space), the sink reads into one reused buffer.
+the client prints iperf3-shaped JSON (start / intervals[].streams + sum / end.sum_sent +
+sum_received, --bidir adds the *_bidir_reverse sums) so analysis.py / summary.py / the plot
+scripts read it unchanged
+
+how to use:
+  # receiver:
+  python3 trafgen.py -s -p 5201
+  # sender:
+  python3 trafgen.py -c 192.168.100.57 -p 5201 -t 60 -P 4 --bidir --congestion bbr > iperf.json
+"""
+import argparse, json, math, multiprocessing as mp, os, platform, socket, struct, subprocess, sys, threading, time
+import tcpinfo
+
+BLKSIZE = 128 * 1024           # same default block as iperf3 for tcp
+MODE_SINK, MODE_SOURCE = b"S", b"R"   # first byte of a connection: client sends / server sends
+COUNT = struct.Struct("!Q")    # bytes the sink received, sent back after the sender's FIN
+TIMEO = struct.Struct("ll")    # struct timeval for SO_SNDTIMEO / SO_RCVTIMEO
+TCP_INFO_LEN = 232
+
+
+def payload_fd(size: int):
+    """an in-memory file with `size` bytes for sendfile, None when memfd is missing"""
+    if not hasattr(os, "memfd_create") or not hasattr(os, "sendfile"):
+        return None
+    fd = os.memfd_create("trafgen")
+    os.write(fd, os.urandom(size))
+    return fd
+
+
+def set_timeout(sock: socket.socket, seconds: float):
+    """kernel side timeouts, the fd stays blocking so sendfile() can be used on it"""
+    tv = TIMEO.pack(int(seconds), int(seconds % 1 * 1e6))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, tv)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, tv)
+
+
+def parse_sockopt(text: str):
+    """LEVEL:NAME:VALUE, e.g. IPPROTO_TCP:TCP_NOTSENT_LOWAT:131072 or SOL_SOCKET:SO_PRIORITY:6"""
+    level, name, value = text.split(":")
+    return getattr(socket, level), getattr(socket, name), int(value)
+
+
+def apply_sockopts(sock: socket.socket, congestion=None, window=None, sockopts=()):
+    if congestion:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, congestion.encode())
+    if window:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, window)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, window)
+    for level, name, value in sockopts:
+        sock.setsockopt(level, name, value)
+
+
+# --------------- server ---------------
+def sink(conn: socket.socket, buf: bytearray) -> int:
+    total = 0
+    while True:
+        n = conn.recv_into(buf)
+        if not n:
+            return total
+        total += n
+
+
+def source(conn: socket.socket, fd, buf: bytearray):
+    """sends until the client goes away"""
+    try:
+        while True:
+            if fd is not None:
+                os.sendfile(conn.fileno(), fd, 0, len(buf))
+            else:
+                conn.send(buf)
+    except OSError:
+        pass
+
+
+def handle(conn: socket.socket, fd, blksize: int):
+    buf = bytearray(blksize)
+    with conn:
+        try:
+            mode = conn.recv(1)
+            if mode == MODE_SINK:
+                conn.sendall(COUNT.pack(sink(conn, buf)))
+            elif mode == MODE_SOURCE:
+                source(conn, fd, buf)
+        except OSError:
+            pass
+
+
+def serve_worker(host: str, port: int, blksize: int, congestion, window, sockopts):
+    lst = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    lst.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    lst.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    apply_sockopts(lst, congestion, window, sockopts)  # accepted sockets inherit them
+    lst.bind((host, port))
+    lst.listen(128)
+    fd = payload_fd(blksize)
+    while True:
+        conn, _ = lst.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # recv/sendfile release the GIL, a thread per flow is enough inside one worker
+        threading.Thread(target=handle, args=(conn, fd, blksize), daemon=True).start()
+
+
+def serve(port: int, host: str = "0.0.0.0", workers: int = 0, blksize: int = BLKSIZE,
+          congestion=None, window=None, sockopts=()):
+    """the kernel spreads incoming flows over `workers` processes (default: one per cpu)"""
+    workers = workers or os.cpu_count() or 1
+    procs = [mp.Process(target=serve_worker, args=(host, port, blksize, congestion, window, sockopts), daemon=True)
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    print(f"trafgen sink on {host}:{port}, {workers} workers")
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+
+
+# --------------- client ---------------
+class Shared:
+    """per stream, per interval counters the flow processes fill in (cumulative at each boundary)"""
+    FIELDS = ("bytes", "retrans", "cwnd", "rtt", "rttvar")
+
+    def __init__(self, streams: int, intervals: int):
+        self.n = intervals
+        for name in self.FIELDS:
+            setattr(self, name, mp.RawArray("q", streams * intervals))
+        self.received = mp.RawArray("q", streams)  # what the other end got, -1 unknown
+        self.sock_info = mp.RawArray("q", streams * 3)  # local port, mss, path mtu
+        self.start = mp.RawValue("d", 0.0)
+
+
+def stamp(shared: Shared, i: int, k: int, sock: socket.socket, total: int):
+    shared.bytes[i * shared.n + k] = total
+    try:
+        info = tcpinfo.parse_tcp_info(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_LEN))
+    except OSError:
+        return
+    shared.retrans[i * shared.n + k] = info["total_retrans"]
+    shared.cwnd[i * shared.n + k] = info["cwnd"] * info["snd_mss"]
+    shared.rtt[i * shared.n + k] = info["srtt_us"]
+    shared.rttvar[i * shared.n + k] = info["rttvar_us"]
+
+
+def flow(i: int, send: bool, opts: dict, shared: Shared, ready, go):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        apply_sockopts(sock, opts["congestion"], opts["window"], opts["sockopts"])
+        if opts["bind"]:
+            sock.bind((opts["bind"], 0))
+        sock.connect((opts["host"], opts["port"]))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(MODE_SINK if send else MODE_SOURCE)
+    except OSError as e:
+        ready.abort()  # the parent stops waiting for the others
+        sys.exit(f"flow {i}: {e}")
+    set_timeout(sock, min(0.1, opts["interval"] / 4))  # wake up for the interval boundaries
+    shared.sock_info[3 * i] = sock.getsockname()[1]
+    shared.sock_info[3 * i + 1] = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG)
+    shared.sock_info[3 * i + 2] = sock.getsockopt(socket.IPPROTO_IP, getattr(socket, "IP_MTU", 14))
+
+    blksize = opts["blksize"]
+    fd = payload_fd(blksize) if send and opts["zerocopy"] else None
+    buf = bytearray(blksize)
+    ready.wait()
+    go.wait()
+    start = shared.start.value
+    step = opts["interval"]
+    end = start + opts["duration"]
+    k, total = 0, 0
+    boundary = min(start + step, end)
+    while True:
+        now = time.monotonic()
+        while now >= boundary and k < shared.n:
+            stamp(shared, i, k, sock, total)
+            k += 1
+            boundary = min(start + (k + 1) * step, end)
+        if now >= end:
+            break
+        try:
+            if not send:
+                n = sock.recv_into(buf)
+                if not n:
+                    break
+            elif fd is not None:
+                n = os.sendfile(sock.fileno(), fd, 0, blksize)
+            else:
+                n = sock.send(buf)
+            total += n
+        except (BlockingIOError, socket.timeout):
+            continue
+        except OSError:
+            break
+    while k < shared.n:
+        stamp(shared, i, k, sock, total)
+        k += 1
+
+    shared.received[i] = -1
+    try:
+        if send:
+            # FIN, then the sink tells us how much it got
+            sock.shutdown(socket.SHUT_WR)
+            set_timeout(sock, 5)
+            got = b""
+            while len(got) < COUNT.size:
+                chunk = sock.recv(COUNT.size - len(got))
+                if not chunk:
+                    break
+                got += chunk
+            if len(got) == COUNT.size:
+                shared.received[i] = COUNT.unpack(got)[0]
+        else:
+            shared.received[i] = total
+    except OSError:
+        pass
+    sock.close()
+
+
+def rate(bytes_, seconds):
+    return bytes_ * 8 / seconds if seconds > 0 else 0.0
+
+
+def summed(streams, sender):
+    s = {"start": streams[0]["start"], "end": streams[0]["end"], "seconds": streams[0]["seconds"],
+         "bytes": sum(x["bytes"] for x in streams)}
+    s["bits_per_second"] = rate(s["bytes"], s["seconds"])
+    if sender:
+        s["retransmits"] = sum(x.get("retransmits", 0) for x in streams)
+    s["omitted"] = False
+    s["sender"] = sender
+    return s
+
+
+def report(opts: dict, directions, shared: Shared, elapsed: float, cpu: dict, connected: list) -> dict:
+    """iperf3 -J layout from the shared counters"""
+    n, step, duration = shared.n, opts["interval"], opts["duration"]
+    bounds = [min((k + 1) * step, duration) for k in range(n)]
+    intervals = []
+    for k in range(n):
+        t0 = bounds[k - 1] if k else 0.0
+        streams = []
+        for i, send in enumerate(directions):
+            j = i * shared.n + k
+            prev = shared.bytes[j - 1] if k else 0
+            s = {"socket": i + 5, "start": round(t0, 6), "end": round(bounds[k], 6),
+                 "seconds": bounds[k] - t0, "bytes": shared.bytes[j] - prev}
+            s["bits_per_second"] = rate(s["bytes"], s["seconds"])
+            if send:
+                s["retransmits"] = shared.retrans[j] - (shared.retrans[j - 1] if k else 0)
+                s["snd_cwnd"] = shared.cwnd[j]
+                s["rtt"] = shared.rtt[j]
+                s["rttvar"] = shared.rttvar[j]
+                s["pmtu"] = shared.sock_info[3 * i + 2]
+            s["omitted"] = False
+            s["sender"] = send
+            streams.append(s)
+        iv = {"streams": streams, "sum": summed([s for s in streams if s["sender"]], True)}
+        if opts["bidir"]:
+            iv["sum_bidir_reverse"] = summed([s for s in streams if not s["sender"]], False)
+        intervals.append(iv)
+
+    end = {"streams": []}
+    for i, send in enumerate(directions):
+        last = i * shared.n + n - 1
+        sent = shared.bytes[last]
+        got = shared.received[i] if shared.received[i] >= 0 else sent
+        rtts = [shared.rtt[i * shared.n + k] for k in range(n) if shared.rtt[i * shared.n + k]]
+        sender = {"socket": i + 5, "start": 0, "end": duration, "seconds": duration,
+                  "bytes": sent, "bits_per_second": rate(sent, duration), "sender": send}
+        if send:
+            sender.update({"retransmits": shared.retrans[last],
+                           "max_snd_cwnd": max(shared.cwnd[i * shared.n:(i + 1) * shared.n]),
+                           "max_rtt": max(rtts, default=0), "min_rtt": min(rtts, default=0),
+                           "mean_rtt": int(sum(rtts) / len(rtts)) if rtts else 0})
+        receiver = {"socket": i + 5, "start": 0, "end": elapsed, "seconds": elapsed,
+                    "bytes": got, "bits_per_second": rate(got, elapsed), "sender": send}
+        end["streams"].append({"sender": sender, "receiver": receiver})
+
+    def totals(send, suffix):
+        ends = [e for e, d in zip(end["streams"], directions) if d == send]
+        if not ends:
+            return
+        sent = sum(e["sender"]["bytes"] for e in ends)
+        got = sum(e["receiver"]["bytes"] for e in ends)
+        end["sum_sent" + suffix] = {"start": 0, "end": duration, "seconds": duration, "bytes": sent,
+                                    "bits_per_second": rate(sent, duration), "sender": send}
+        if send:
+            end["sum_sent" + suffix]["retransmits"] = sum(e["sender"]["retransmits"] for e in ends)
+        end["sum_received" + suffix] = {"start": 0, "end": elapsed, "seconds": elapsed, "bytes": got,
+                                        "bits_per_second": rate(got, elapsed), "sender": send}
+
+    totals(True, "")
+    if opts["bidir"]:
+        totals(False, "_bidir_reverse")
+    end["cpu_utilization_percent"] = cpu
+    end["sender_tcp_congestion"] = opts["congestion"] or active_congestion()
+
+    return {
+        "start": {
+            "connected": connected,
+            "version": "trafgen 1.0",
+            "system_info": " ".join(platform.uname()),
+            "timestamp": {"time": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(opts["t_start"])),
+                          "timesecs": int(opts["t_start"]),
+                          # interval times are relative to this instant on CLOCK_MONOTONIC
+                          "monotonic_ns": int(opts["mono_start"] * 1e9)},
+            "connecting_to": {"host": opts["host"], "port": opts["port"]},
+            "tcp_mss_default": shared.sock_info[1],
+            "sock_bufsize": opts["window"] or 0,
+            "test_start": {"protocol": "TCP", "num_streams": opts["flows"], "blksize": opts["blksize"],
+                           "omit": 0, "duration": duration, "bytes": 0, "blocks": 0, "reverse": 0,
+                           "tos": 0, "bidir": int(opts["bidir"]), "zerocopy": int(opts["zerocopy"])},
+        },
+        "intervals": intervals,
+        "end": end,
+    }
+
+
+def active_congestion() -> str:
+    try:
+        with open("/proc/sys/net/ipv4/tcp_congestion_control") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def run_client(host: str, port: int = 5201, duration: float = 10, flows: int = 1, interval: float = 1.0,
+               bidir: bool = False, bind=None, congestion=None, window=None, sockopts=(),
+               blksize: int = BLKSIZE, zerocopy: bool = True) -> dict:
+    """runs the flows for `duration` seconds and returns the iperf3-shaped result"""
+    opts = {"host": host, "port": port, "duration": duration, "flows": flows, "interval": interval,
+            "bidir": bidir, "bind": bind, "congestion": congestion, "window": window,
+            "sockopts": list(sockopts), "blksize": blksize, "zerocopy": zerocopy}
+    directions = [True] * flows + ([False] * flows if bidir else [])
+    shared = Shared(len(directions), max(1, math.ceil(duration / interval - 1e-9)))
+    ready = mp.Barrier(len(directions) + 1)
+    go = mp.Event()
+    procs = [mp.Process(target=flow, args=(i, send, opts, shared, ready, go), daemon=True)
+             for i, send in enumerate(directions)]
+    for p in procs:
+        p.start()
+    try:
+        ready.wait(timeout=10)  # every flow connected
+    except threading.BrokenBarrierError:
+        for p in procs:
+            p.terminate()
+        raise ConnectionError(f"not every flow could connect to {host}:{port}")
+    opts["t_start"] = time.time()
+    cpu0 = os.times()
+    shared.start.value = opts["mono_start"] = time.monotonic()
+    go.set()
+    for p in procs:
+        p.join()
+    elapsed = time.monotonic() - shared.start.value
+    cpu1 = os.times()
+    user = (cpu1.children_user - cpu0.children_user) / elapsed * 100
+    system = (cpu1.children_system - cpu0.children_system) / elapsed * 100
+    cpu = {"host_total": user + system, "host_user": user, "host_system": system}
+    connected = [{"socket": i + 5, "local_host": bind or "", "local_port": shared.sock_info[3 * i],
+                  "remote_host": host, "remote_port": port} for i in range(len(directions))]
+    return report(opts, directions, shared, elapsed, cpu, connected)
+
+
+def start_client(host: str, duration: float, out_path: str, port: int = 5201, flows: int = 1,
+                 bidir: bool = False, bind=None, congestion=None):
+    """runs the client as a subprocess writing its JSON to out_path (same handle as an iperf3 Popen)"""
+    cmd = [sys.executable, os.path.abspath(__file__), "-c", host, "-p", str(port), "-t", str(duration),
+           "-P", str(flows)]
+    if bidir:
+        cmd.append("--bidir")
+    if bind:
+        cmd += ["-B", bind]
+    if congestion:
+        cmd += ["--congestion", congestion]
+    if not out_path:
+        return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(out_path, "w") as f:
+        return subprocess.Popen(cmd, stdout=f, stderr=subprocess.STDOUT)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="TCP traffic generator (-c) and sink (-s) with iperf3-style JSON")
+    ap.add_argument("-s", "--server", action="store_true", help="run the sink")
+    ap.add_argument("-c", "--client", metavar="HOST", help="send to HOST")
+    ap.add_argument("-p", "--port", type=int, default=5201)
+    ap.add_argument("-t", "--time", type=float, default=10, help="seconds")
+    ap.add_argument("-P", "--parallel", type=int, default=1, help="flows (one process each)")
+    ap.add_argument("-i", "--interval", type=float, default=1.0, help="seconds per interval record")
+    ap.add_argument("-B", "--bind", default=None, help="local address for the client flows, or listen address for -s")
+    ap.add_argument("--bidir", action="store_true", help="the server also sends -P flows back")
+    ap.add_argument("-l", "--length", type=int, default=BLKSIZE, help="block size per send")
+    ap.add_argument("-w", "--window", type=int, default=None, help="SO_SNDBUF/SO_RCVBUF in bytes")
+    ap.add_argument("-C", "--congestion", default=None, help="TCP_CONGESTION for every flow")
+    ap.add_argument("--sockopt", action="append", default=[], type=parse_sockopt, metavar="LEVEL:NAME:VALUE",
+                    help="extra setsockopt (repeatable), e.g. IPPROTO_TCP:TCP_NOTSENT_LOWAT:131072")
+    ap.add_argument("--workers", type=int, default=0, help="-s only: sink processes, default one per cpu")
+    ap.add_argument("--no-zerocopy", action="store_true", help="send() from a buffer instead of sendfile()")
+    a = ap.parse_args()
+    if a.server:
+        serve(a.port, a.bind or "0.0.0.0", a.workers, a.length, a.congestion, a.window, a.sockopt)
+    elif a.client:
+        try:
+            result = run_client(a.client, a.port, a.time, a.parallel, a.interval, a.bidir, a.bind,
+                                a.congestion, a.window, a.sockopt, a.length, not a.no_zerocopy)
+        except (ConnectionError, OSError) as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+        print(json.dumps(result, indent=2))
+    else:
+        ap.error("one of -s or -c is required")